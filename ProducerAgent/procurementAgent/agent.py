@@ -2,25 +2,37 @@ from typing import Dict, List, Any, Optional
 from google.adk.agents import Agent
 
 from .db import (
-  init_db_if_needed,
-  list_items,
+  DEFAULT_PAGE_SIZE,
+  to_columnar,
+  list_items_page,
   get_item_by_name_or_sku,
+  get_items_by_name_or_sku,
+  search_items,
   list_low_stock,
-  recommend_order_quantities,
   create_purchase_order,
+  create_purchase_orders,
+  split_recommendations_by_supplier,
   get_purchase_order,
   receive_purchase_order,
-  list_purchase_orders,
-  list_open_purchase_orders,
-  list_received_purchase_orders,
+  receive_purchase_orders,
+  list_purchase_orders_page,
+  changes_since,
+  stock_history,
 )
+from .forecast import POLICIES, recommend
+from .analytics import lead_time_accuracy, open_po_aging, spend_by_supplier
+from .async_db import to_async
+from . import fast_path, history
+from .metrics import instrument_tool
+from .ui_tables import build_table
 
-# Ensure DB exists + seeded when agent loads
-init_db_if_needed()
+# The DB is created / restored / migrated lazily by the first tool call that
+# opens a connection (db._ensure_initialized), not at import.
 
 # ---- Tools exposed to the agent ----
 
 
+@instrument_tool
 def tool_emit_ui(event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
   """
   Emit a structured UI event for an external frontend.
@@ -28,10 +40,43 @@ def tool_emit_ui(event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
   """
   return {"status": "success", "event_type": event_type, "payload": payload}
 
-def tool_list_items() -> Dict[str, Any]:
-  """List all catalog items with inventory."""
-  return {"status": "success", "items": list_items()}
+@instrument_tool
+def tool_emit_table(
+  query_name: str,
+  status: Optional[str] = None,
+  policy: str = "mvp",
+  po_id: Optional[int] = None,
+  limit: int = DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  supplier_name: Optional[str] = None,
+) -> Dict[str, Any]:
+  """
+  Emit a UI table straight from a named query, without copying rows by hand.
+  query_name: items, low_stock, recommendations (policy), purchase_orders (status),
+  open_purchase_orders, received_purchase_orders, po_lines (po_id),
+  spend_by_supplier, open_po_aging, lead_time_accuracy (supplier_name).
+  Rows are arrays in payload.columns order; paging info is in payload.meta.
+  """
+  return build_table(
+    query_name, status=status, policy=policy, po_id=po_id, limit=limit, after_id=after_id, supplier_name=supplier_name,
+  )
+
+@instrument_tool
+def tool_list_items(
+  limit: int = DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+  """
+  List catalog items with inventory, one page at a time (ordered by id).
+  To get the next page pass after_id=next_after_id from the previous result;
+  next_after_id is null on the last page. total_hint is the exact item count.
+  fields optionally limits the columns, e.g. ["sku", "name", "on_hand"].
+  Rows are arrays in the order of "columns".
+  """
+  return list_items_page(limit=limit, after_id=after_id, fields=fields, columnar=True)
 
+@instrument_tool
 def tool_get_item(name_or_sku: str) -> Dict[str, Any]:
   """Get a single item by exact SKU or exact name."""
   item = get_item_by_name_or_sku(name_or_sku)
@@ -39,14 +84,58 @@ def tool_get_item(name_or_sku: str) -> Dict[str, Any]:
     return {"status": "error", "error_message": f"Item '{name_or_sku}' not found."}
   return {"status": "success", "item": item}
 
-def tool_list_low_stock() -> Dict[str, Any]:
-  """List items where on_hand <= reorder_point."""
-  return {"status": "success", "items": list_low_stock()}
+@instrument_tool
+def tool_get_items(names_or_skus: List[str]) -> Dict[str, Any]:
+  """
+  Get many items at once by exact SKU or exact name, e.g. every line of a draft order.
+  Returns the found items (each with the "key" it matched) and the unresolved keys,
+  with up to 3 search suggestions per unresolved key.
+  """
+  result = get_items_by_name_or_sku(names_or_skus)
+  suggestions = {k: [i["sku"] for i in search_items(k, 3)] for k in result["unresolved"]}
+  return {"status": "success", **result, "suggestions": suggestions}
+
+@instrument_tool
+def tool_search_items(query: str, k: int = 10) -> Dict[str, Any]:
+  """
+  Fuzzy search items by partial SKU or name (English or Hebrew), best match first.
+  Use when tool_get_item finds nothing, e.g. "coffee" or "tuna cans". k = max results.
+  """
+  items = search_items(query, k)
+  return {"status": "success", "query": query, "items": items}
 
-def tool_recommend_orders() -> Dict[str, Any]:
-  """Recommend PO lines for low-stock items (simple MVP policy)."""
-  return {"status": "success", "recommendations": recommend_order_quantities()}
+@instrument_tool
+def tool_list_low_stock() -> Dict[str, Any]:
+  """
+  List items whose available stock (on_hand - reserved + on_order) is <= reorder_point.
+  Rows are arrays in the order of "columns".
+  """
+  table = to_columnar(list_low_stock())
+  return {"status": "success", "columns": table["columns"], "items": table["rows"]}
 
+@instrument_tool
+def tool_recommend_orders(policy: str = "mvp") -> Dict[str, Any]:
+  """
+  Recommend PO lines for items that need reordering.
+  policy: "mvp" (reorder_point + min_level rule, default), "moving_average" or
+  "exp_smoothing" (forecast demand from stock-move history, with safety stock and EOQ).
+  draft_orders groups them into one order per preferred supplier, ready for tool_create_pos.
+  recommendations rows are arrays in the order of "columns".
+  """
+  if policy not in POLICIES:
+    return {"status": "error", "error_message": f"Unknown policy '{policy}'. Use one of: {', '.join(POLICIES)}."}
+  recs = recommend(policy)
+  split = split_recommendations_by_supplier(recs)
+  table = to_columnar(recs)
+  return {
+    "status": "success",
+    "columns": table["columns"],
+    "recommendations": table["rows"],
+    "draft_orders": split["orders"],
+    "unassigned_skus": split["unassigned_skus"],
+  }
+
+@instrument_tool
 def tool_create_po(supplier_name: str, lines: List[Dict[str, Any]], notes: str = "") -> Dict[str, Any]:
   """
   Create and place a purchase order.
@@ -55,18 +144,47 @@ def tool_create_po(supplier_name: str, lines: List[Dict[str, Any]], notes: str =
   """
   return create_purchase_order(supplier_name=supplier_name, lines=lines, notes=notes)
 
+@instrument_tool
+def tool_create_pos(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  Create and place several purchase orders at once (e.g. one per supplier).
+  Either every order is created or none is.
+  orders format:
+    [{"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 11}], "notes": ""}, ...]
+  """
+  return create_purchase_orders(orders)
+
+@instrument_tool
 def tool_get_po(po_id: int) -> Dict[str, Any]:
   """Fetch a purchase order and its lines."""
   return get_purchase_order(po_id)
 
+@instrument_tool
 def tool_receive_po(po_id: int) -> Dict[str, Any]:
   """Mark PO received and update inventory."""
   return receive_purchase_order(po_id)
 
-def tool_list_purchase_orders(status: Optional[str] = None) -> Dict[str, Any]:
+@instrument_tool
+def tool_receive_pos(receipts: List[Dict[str, Any]]) -> Dict[str, Any]:
   """
-  List purchase orders (headers). Optionally filter by status:
+  Receive several POs at once, optionally with short-shipped quantities.
+  receipts format:
+    [{"po_id": 12}, {"po_id": 13, "lines": [{"sku_or_name": "TUN-001", "qty": 10}]}]
+  A PO without "lines" is received in full. Either all receipts apply or none do.
+  """
+  return receive_purchase_orders(receipts)
+
+@instrument_tool
+def tool_list_purchase_orders(
+  status: Optional[str] = None,
+  limit: int = DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+  """
+  List purchase orders (headers), newest first. Optionally filter by status:
   DRAFT, PLACED, RECEIVED, CANCELLED (or omit for all).
+  Paged like tool_list_items: pass after_id=next_after_id for the next page.
   """
   valid = {None, "DRAFT", "PLACED", "RECEIVED", "CANCELLED"}
   if status not in valid:
@@ -74,15 +192,69 @@ def tool_list_purchase_orders(status: Optional[str] = None) -> Dict[str, Any]:
       "status": "error",
       "error_message": "Invalid status. Use one of: DRAFT, PLACED, RECEIVED, CANCELLED (or omit)."
     }
-  return {"status": "success", "purchase_orders": list_purchase_orders(status)}
+  return list_purchase_orders_page([status] if status else None, limit=limit, after_id=after_id, fields=fields, columnar=True)
+
+@instrument_tool
+def tool_list_open_purchase_orders(limit: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None) -> Dict[str, Any]:
+  """List open (not yet received) purchase orders: DRAFT and PLACED. Paged like tool_list_purchase_orders."""
+  return list_purchase_orders_page(["DRAFT", "PLACED"], limit=limit, after_id=after_id, columnar=True)
 
-def tool_list_open_purchase_orders() -> Dict[str, Any]:
-  """List open (not yet received) purchase orders: DRAFT and PLACED."""
-  return {"status": "success", "purchase_orders": list_open_purchase_orders()}
+@instrument_tool
+def tool_list_received_purchase_orders(limit: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None) -> Dict[str, Any]:
+  """List received (completed) purchase orders. Paged like tool_list_purchase_orders."""
+  return list_purchase_orders_page(["RECEIVED"], limit=limit, after_id=after_id, columnar=True)
 
-def tool_list_received_purchase_orders() -> Dict[str, Any]:
-  """List received (completed) purchase orders."""
-  return {"status": "success", "purchase_orders": list_received_purchase_orders()}
+@instrument_tool
+def tool_spend_report(months: int = 12, supplier_name: Optional[str] = None) -> Dict[str, Any]:
+  """
+  Ordered and received quantity / amount per supplier and month (newest first)
+  for the last `months` months, optionally for one supplier, plus totals.
+  Cancelled POs are excluded. Rows are arrays in the order of "columns".
+  """
+  return spend_by_supplier(months=months, supplier_name=supplier_name)
+
+@instrument_tool
+def tool_open_po_aging(supplier_name: Optional[str] = None) -> Dict[str, Any]:
+  """
+  Open (DRAFT/PLACED) purchase orders per supplier: count, outstanding qty and
+  amount, counts by age since creation (0-7 / 8-30 / 31-90 / 90+ days) and how
+  many are past their expected date. Rows are arrays in the order of "columns".
+  """
+  return open_po_aging(supplier_name=supplier_name)
+
+@instrument_tool
+def tool_lead_time_accuracy(supplier_name: Optional[str] = None, by_item: bool = False) -> Dict[str, Any]:
+  """
+  Actual delivery lead time vs. the items' promised lead_time_days, per supplier
+  (or per supplier and item with by_item=True, worst first): receipts, average
+  actual and promised days, mean absolute error and % delivered late.
+  """
+  return lead_time_accuracy(supplier_name=supplier_name, by_item=by_item)
+
+@instrument_tool
+def tool_changes_since(seq: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+  """
+  Inventory and purchase-order changes after change number `seq`, oldest first,
+  for refreshing dashboards without re-listing everything. Each change carries
+  the new state (data). Pass next_seq as seq next time; reset=true means the
+  gap is too old: reload the full lists instead.
+  """
+  return changes_since(seq, limit)
+
+@instrument_tool
+def tool_stock_history(
+  names_or_skus: List[str],
+  start_date: str,
+  end_date: Optional[str] = None,
+  step_days: int = 1,
+) -> Dict[str, Any]:
+  """
+  Past on-hand levels: for each item, on hand at the end of every step_days-th
+  day from start_date to end_date (YYYY-MM-DD; end_date defaults to today).
+  For "how much X did we have on D", pass start_date = end_date = D.
+  Returns dates plus one on_hand series per item, and the unresolved keys.
+  """
+  return stock_history(names_or_skus, start_date, end_date, step_days)
 
 # ---- Agent ----
 SYSTEM_INSTRUCTION = """
@@ -96,35 +268,55 @@ Help the user manage inventory and procurement in natural language:
 - Create purchase orders (POs) only after explicit user approval.
 - Receive deliveries and update inventory.
 - Provide full visibility into purchase orders and their statuses.
+- Report spend per supplier, aging of open orders and supplier lead-time accuracy.
 - Keep responses concise but complete, always backed by DB reads via tools.
 
 
 EXTERNAL UI INTEGRATION (IMPORTANT)
 - An external UI will render tables and dashboards. Therefore:
-  - Whenever you return a LIST of items / recommendations / purchase orders, you MUST emit a UI event
-    by calling tool_emit_ui("table", payload).
-  - payload format:
+  - Whenever you return a LIST of items / recommendations / purchase orders, you MUST emit a UI event.
+  - For the standard lists call tool_emit_table(query_name, ...): it runs the query and emits the table
+    itself, and its result also gives you the rows to summarize. Do NOT re-type those rows anywhere.
+    query_name: items, low_stock, recommendations, purchase_orders, open_purchase_orders,
+    received_purchase_orders, po_lines, spend_by_supplier, open_po_aging, lead_time_accuracy.
+  - For any other table (e.g. a Draft Order Proposal) call tool_emit_ui("table", payload) with:
     {
       "title": "...",
       "columns": [{"key":"...","label":"..."}, ...],
-      "rows": [ { ... }, { ... } ],
-      "meta": { ... }
+      "rows": [ [...], [...] ],
+      "meta": { "row_format": "columnar", ... }
     }
+    where each row is an array of values in the order of "columns".
 - The UI will rely on the emitted payload, not on text formatting.
 - After emitting a table event, also provide a short textual summary (1-3 lines).
 
 OPERATING ENVIRONMENT
 - You have access ONLY to the following tools (functions). You MUST use them to read/write data:
-  1) tool_list_items()
+  1) tool_list_items(limit=50, after_id=None, fields=None)
   2) tool_get_item(name_or_sku)
   3) tool_list_low_stock()
-  4) tool_recommend_orders()
+  4) tool_recommend_orders(policy="mvp")
   5) tool_create_po(supplier_name, lines, notes="")
-  6) tool_get_po(po_id)
-  7) tool_receive_po(po_id)
-  8) tool_list_purchase_orders(status=None)
-  9) tool_list_open_purchase_orders()
-  10) tool_list_received_purchase_orders()
+  6) tool_create_pos(orders)
+  7) tool_get_po(po_id)
+  8) tool_receive_po(po_id)
+  9) tool_receive_pos(receipts)
+  10) tool_list_purchase_orders(status=None, limit=50, after_id=None, fields=None)
+  11) tool_list_open_purchase_orders(limit=50, after_id=None)
+  12) tool_list_received_purchase_orders(limit=50, after_id=None)
+  13) tool_emit_table(query_name, status=None, policy="mvp", po_id=None, limit=50, after_id=None, supplier_name=None)
+  14) tool_search_items(query, k=10)
+  15) tool_get_items(names_or_skus)
+  16) tool_spend_report(months=12, supplier_name=None)
+  17) tool_open_po_aging(supplier_name=None)
+  18) tool_lead_time_accuracy(supplier_name=None, by_item=False)
+  19) tool_changes_since(seq=0, limit=50)
+  20) tool_stock_history(names_or_skus, start_date, end_date=None, step_days=1)
+
+- List tools are paged. Each result carries next_after_id (null on the last page) and total_hint.
+  Fetch the next page only when the user asks for more, by passing after_id=next_after_id.
+  Use fields to request only the columns you need.
+  List results are columnar: "columns" names the fields once and each row is an array in that order.
 
 - The source of truth is SQLite. Never “guess” inventory numbers, suppliers, POs, or IDs.
 - If the user requests information that exists in the DB, call the relevant tool first.
@@ -158,15 +350,15 @@ COMMUNICATION STYLE
 - Output format:
   - Use structured bullet points and mini-tables (text tables) where useful.
   - Always show SKU + item name + unit + on_hand + reorder_point when discussing stock.
-  - When recommending an order: show current on_hand, reorder_point, min_level, recommended_qty, supplier (if known), lead_time_days.
+  - When recommending an order: show current on_hand, available, reorder_point, min_level, recommended_qty, supplier (if known), lead_time_days.
 
 CONVERSATION WORKFLOWS
 
 A) “Show me all products / inventory”
-- Call tool_list_items()
+- Call tool_emit_table("items") (next page: tool_emit_table("items", after_id=meta.next_after_id))
 - Present a clean list sorted by item id:
   - SKU | Name | Unit | On hand | Reorder point | Min level | Supplier | Lead time (days)
-- If list is long, show top items and offer: “Want the full list?”
+- If next_after_id is set, say how many items exist (total_hint, exact) and offer: “Want the next page?”
 
 B) “How many do we have of X?” / “Stock for X”
 - Call tool_get_item(name_or_sku)
@@ -175,34 +367,44 @@ B) “How many do we have of X?” / “Stock for X”
   - On hand, Reserved (if present)
   - Reorder point, Min level
   - Supplier (if present), Lead time
-- If not found:
-  - Say it wasn’t found.
-  - Ask the user for an exact SKU or exact item name.
-  - Offer to show all items.
+- If not found (partial name, plural, Hebrew name, typo in the SKU):
+  - Call tool_search_items(name_or_sku) - do NOT list the whole catalog to look for it.
+  - One clear match: answer with it. Several: show the top candidates and ask which one.
+  - No match: say it wasn’t found and ask for an exact SKU or item name.
 
 C) “What is low / running out?”
-- Call tool_list_low_stock()
-- Present the list of items where on_hand <= reorder_point.
-- Emphasize the most critical items first (largest reorder_point - on_hand).
+- Call tool_emit_table("low_stock")
+- Present the list of items where available <= reorder_point
+  (available = on_hand - reserved + on_order: stock held for outgoing orders does not count,
+  quantity already on open POs does).
+- Emphasize the most critical items first (largest reorder_point - available).
 - Then ask: “Do you want reorder recommendations?”
 
 D) “Recommend what to order”
-- Call tool_recommend_orders()
+- Call tool_emit_table("recommendations") to show them; call tool_recommend_orders() when you also
+  need draft_orders (e.g. to propose POs)
 - Present recommendations using the MVP reorder policy:
   - target = reorder_point + min_level
-  - recommended_qty = max(0, target - on_hand)
+  - recommended_qty = max(0, target - available)
 - If no recommendations, state: “No items currently below reorder point.”
+- If the user asks for demand-based / forecast recommendations, call
+  tool_emit_table("recommendations", policy="moving_average") or policy="exp_smoothing"
+  (same policy argument on tool_recommend_orders).
+  There reorder_point is the forecast reorder point (lead-time demand + safety stock) and
+  recommended_qty is at least the economic order quantity.
 
 E) “Create an order” / “Order these items”
 This is a two-step process:
 
 STEP 1 — Draft Order Proposal (NO DB write)
 - Identify what the user wants to order:
-  - If they gave a list: validate each item with tool_get_item.
+  - If they gave a list: validate ALL items with ONE tool_get_items([...]) call (never one tool_get_item per line).
+    For each unresolved key, offer its suggestions or ask for the exact SKU.
   - If they said “order what you recommend”: call tool_recommend_orders().
 - Determine supplier:
   - If recommendations include a supplier, use that supplier.
-  - If multiple suppliers appear, propose splitting POs or ask which supplier to use.
+  - If multiple suppliers appear, propose splitting POs (tool_recommend_orders returns draft_orders,
+    already split one per supplier) or ask which supplier to use.
   - If supplier is missing/unknown, ask: “Which supplier should we use?”
 - Produce a “Draft Order Proposal” section:
   - Supplier:
@@ -215,15 +417,16 @@ STEP 1 — Draft Order Proposal (NO DB write)
 
 STEP 2 — On explicit approval
 - If user explicitly approves:
-  - Call tool_create_po(supplier_name, lines, notes)
-  - Return: PO id + expected_at + summary
+  - Single supplier: call tool_create_po(supplier_name, lines, notes)
+  - Several suppliers: call tool_create_pos(orders) ONCE with every approved order (all-or-nothing)
+  - Return: PO id(s) + expected_at + summary
 - If user modifies the order:
   - Update the draft, re-ask approval.
 - If user rejects:
   - Ask what to change (supplier / qty / items).
 
 F) “Show PO N”
-- Call tool_get_po(N)
+- Call tool_get_po(N), and tool_emit_table("po_lines", po_id=N) to show its lines
 - Present:
   - Supplier, status, created_at, expected_at, notes
   - Lines (SKU, Name, qty, unit_price)
@@ -231,19 +434,44 @@ F) “Show PO N”
 G) “We received PO N”
 - Call tool_receive_po(N)
 - Confirm inventory update.
+- Several POs at once, or a short shipment (“PO 12 arrived with only 10 tuna”):
+  call tool_receive_pos once with every PO; give "lines" only for POs that were short.
+  Report PARTIAL POs with their outstanding quantities.
 
 H) “Show orders” / “List purchase orders” / “Orders by status”
-- If the user asks for all orders: call tool_list_purchase_orders()
-- If the user asks for open/pending/not-yet-received orders: call tool_list_open_purchase_orders()
-- If the user asks for received/completed orders: call tool_list_received_purchase_orders()
-- If the user asks for a specific status (DRAFT/PLACED/RECEIVED/CANCELLED): call tool_list_purchase_orders(status)
+- If the user asks for all orders: call tool_emit_table("purchase_orders")
+- If the user asks for open/pending/not-yet-received orders: call tool_emit_table("open_purchase_orders")
+- If the user asks for received/completed orders: call tool_emit_table("received_purchase_orders")
+- If the user asks for a specific status (DRAFT/PLACED/RECEIVED/CANCELLED): call tool_emit_table("purchase_orders", status=...)
+- Use the tool_list_*purchase_orders tools when you need the data without showing a table.
 
-Display a table:
+The emitted table shows:
 PO ID | Supplier | Status | Created | Expected | #Lines
 
 Then ask:
 “Do you want to view a specific PO? (provide PO ID)”
 
+I) Reports: “How much did we spend with X?” / “Which orders are overdue?” / “Are suppliers on time?”
+- Spend per supplier / month: tool_emit_table("spend_by_supplier", supplier_name=...) to show it,
+  tool_spend_report(months, supplier_name) for a different window or just the totals.
+- Aging of open orders, overdue orders: tool_emit_table("open_po_aging") / tool_open_po_aging().
+- Lead-time accuracy (actual vs. promised lead time, % late): tool_emit_table("lead_time_accuracy"),
+  or tool_lead_time_accuracy(supplier_name, by_item=True) for the worst items of a supplier.
+- Summarize the key numbers (totals, most overdue supplier, least punctual supplier) in 1-3 lines.
+
+J) “What changed?” / “Anything new since last time?” / dashboard refresh requests with a change number
+- Call tool_changes_since(seq) with the last next_seq you (or the UI) saw, 0 if none.
+- Summarize the stock levels and PO statuses that changed; keep next_seq for the next refresh.
+- If reset is true, say the view is out of date and re-list with tool_emit_table.
+
+K) “How much X did we have on <date>?” / “Show the stock trend of X and Y over the last 3 months”
+- Call tool_stock_history with the SKUs or names; one date: start_date = end_date = that date,
+  a trend: the range, with step_days=7 for periods longer than ~3 months.
+- For a trend, emit the series with tool_emit_ui("chart", ...) so the UI can plot it; summarize
+  the lowest / highest levels and the current one in 1-3 lines.
+- Resolve relative dates (“last Monday”, “start of the year”) to YYYY-MM-DD yourself.
+- For unresolved keys, use tool_search_items and ask which item was meant.
+
 FINAL REMINDER
 You are a procurement/inventory agent. Always ground outputs in tool results.
 Never create or receive POs without explicit confirmation and a valid identifier.
@@ -254,17 +482,31 @@ root_agent = Agent(
   model="gemini-2.5-flash",
   description="Single-agent MVP for inventory + procurement using SQLite",
   instruction=SYSTEM_INSTRUCTION,
+  # Common read-only questions are answered from the tools without a model round trip;
+  # everything else goes to the model with old turns dropped and old bulky tool results summarized.
+  before_model_callback=[fast_path.before_model_callback, history.before_model_callback],
+  # DB-backed tools run on the DB thread pool so SQLite never blocks the server's event loop.
   tools=[
-    tool_list_items,
-    tool_get_item,
-    tool_list_low_stock,
-    tool_recommend_orders,
-    tool_create_po,
-    tool_get_po,
-    tool_receive_po,
-    tool_list_purchase_orders,
-    tool_list_open_purchase_orders,
-    tool_list_received_purchase_orders,
-     tool_emit_ui,
+    to_async(tool_list_items),
+    to_async(tool_get_item),
+    to_async(tool_get_items),
+    to_async(tool_search_items),
+    to_async(tool_list_low_stock),
+    to_async(tool_recommend_orders),
+    to_async(tool_create_po),
+    to_async(tool_create_pos),
+    to_async(tool_get_po),
+    to_async(tool_receive_po),
+    to_async(tool_receive_pos),
+    to_async(tool_list_purchase_orders),
+    to_async(tool_list_open_purchase_orders),
+    to_async(tool_list_received_purchase_orders),
+    to_async(tool_emit_table),
+    to_async(tool_spend_report),
+    to_async(tool_open_po_aging),
+    to_async(tool_lead_time_accuracy),
+    to_async(tool_changes_since),
+    to_async(tool_stock_history),
+    tool_emit_ui,
   ],
 )
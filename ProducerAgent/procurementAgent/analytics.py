@@ -0,0 +1,137 @@
+"""
+Procurement reports read from the rollups in db.ANALYTICS_SQL.
+
+  spend_by_supplier    ordered / received quantity and amount per supplier and month
+  open_po_aging        open (DRAFT/PLACED) POs per supplier in age buckets, plus overdue
+  lead_time_accuracy   actual vs. promised (items.lead_time_days) lead time
+
+Triggers keep the rollups in step with purchase_orders / purchase_order_lines,
+so a report reads one row per supplier and month (or day, or item) and never
+scans the PO tables. db.rebuild_analytics() recomputes them after a backfill.
+Results are columnar: "columns" once, then each row as an array.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db import MAX_PAGE_SIZE, get_conn, to_columnar
+
+SPEND_COLUMNS = ["supplier", "month", "po_count", "ordered_qty", "ordered_amount", "received_qty", "received_amount"]
+
+# (column, lowest age in days, highest age or None)
+AGE_BUCKETS: List[Tuple[str, int, Optional[int]]] = [
+  ("age_0_7d", 0, 7), ("age_8_30d", 8, 30), ("age_31_90d", 31, 90), ("age_over_90d", 91, None),
+]
+AGING_COLUMNS = ["supplier", "open_pos", "outstanding_qty", "outstanding_amount",
+                 *[b[0] for b in AGE_BUCKETS], "overdue_pos", "oldest_created"]
+
+LEAD_TIME_COLUMNS = ["supplier", "receipts", "avg_actual_days", "avg_promised_days", "mean_abs_error_days", "late_pct"]
+LEAD_TIME_ITEM_COLUMNS = ["supplier", "sku", "name", *LEAD_TIME_COLUMNS[1:]]
+
+def _supplier_id(conn, supplier_name: Optional[str]) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+  """(id, None), or (None, error dict) when a name was given but does not exist."""
+  if not supplier_name:
+    return None, None
+  row = conn.execute("SELECT id FROM suppliers WHERE name = ? COLLATE NOCASE", (supplier_name,)).fetchone()
+  if row is None:
+    return None, {"status": "error", "error_message": f"Supplier '{supplier_name}' not found."}
+  return row[0], None
+
+def _first_month(months: int, today: Optional[date] = None) -> str:
+  """'YYYY-MM' of the earliest month in a window of `months` ending this month."""
+  today = today or date.today()
+  index = today.year * 12 + today.month - 1 - (max(1, int(months)) - 1)
+  return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def spend_by_supplier(months: int = 12, supplier_name: Optional[str] = None) -> Dict[str, Any]:
+  """Spend per supplier and month (newest first) over the last `months` months."""
+  with get_conn() as conn:
+    supplier_id, error = _supplier_id(conn, supplier_name)
+    if error:
+      return error
+    rows = conn.execute("""
+      SELECT s.name AS supplier, sm.month, sm.po_count, sm.ordered_qty, ROUND(sm.ordered_amount, 2) AS ordered_amount,
+             sm.received_qty, ROUND(sm.received_amount, 2) AS received_amount
+      FROM spend_monthly sm
+      JOIN suppliers s ON s.id = sm.supplier_id
+      WHERE sm.month >= ? AND (? IS NULL OR sm.supplier_id = ?) AND sm.po_count > 0
+      ORDER BY sm.month DESC, sm.ordered_amount DESC
+    """, (_first_month(months), supplier_id, supplier_id)).fetchall()
+  return {
+    "status": "success",
+    **to_columnar(rows, SPEND_COLUMNS),
+    "totals": {
+      "po_count": sum(r["po_count"] for r in rows),
+      "ordered_amount": round(sum(r["ordered_amount"] for r in rows), 2),
+      "received_amount": round(sum(r["received_amount"] for r in rows), 2),
+    },
+  }
+
+def open_po_aging(supplier_name: Optional[str] = None, as_of: Optional[str] = None) -> Dict[str, Any]:
+  """
+  Open POs per supplier by age (days since creation, as of today or as_of
+  'YYYY-MM-DD'), largest outstanding amount first. Overdue = expected date passed.
+  """
+  as_of = as_of or date.today().isoformat()
+  buckets = ",\n".join(
+    f"SUM(CASE WHEN age >= {lo}{'' if hi is None else f' AND age <= {hi}'} THEN po_count ELSE 0 END) AS {name}"
+    for name, lo, hi in AGE_BUCKETS
+  )
+  with get_conn() as conn:
+    supplier_id, error = _supplier_id(conn, supplier_name)
+    if error:
+      return error
+    rows = conn.execute(f"""
+      SELECT s.name AS supplier, SUM(a.po_count) AS open_pos, SUM(a.outstanding_qty) AS outstanding_qty,
+             ROUND(SUM(a.outstanding_amount), 2) AS outstanding_amount,
+             {buckets},
+             SUM(CASE WHEN a.expected_day != '' AND a.expected_day < :as_of THEN a.po_count ELSE 0 END) AS overdue_pos,
+             MIN(a.created_day) AS oldest_created
+      FROM (
+        SELECT *, CAST(julianday(:as_of) - julianday(created_day) AS INTEGER) AS age
+        FROM open_po_aging WHERE po_count > 0 AND (:supplier_id IS NULL OR supplier_id = :supplier_id)
+      ) a
+      JOIN suppliers s ON s.id = a.supplier_id
+      GROUP BY a.supplier_id
+      ORDER BY outstanding_amount DESC, open_pos DESC
+    """, {"as_of": as_of, "supplier_id": supplier_id}).fetchall()
+  return {
+    "status": "success",
+    "as_of": as_of,
+    **to_columnar(rows, AGING_COLUMNS),
+    "totals": {
+      "open_pos": sum(r["open_pos"] for r in rows),
+      "overdue_pos": sum(r["overdue_pos"] for r in rows),
+      "outstanding_amount": round(sum(r["outstanding_amount"] for r in rows), 2),
+    },
+  }
+
+def lead_time_accuracy(supplier_name: Optional[str] = None, by_item: bool = False, limit: int = 50) -> Dict[str, Any]:
+  """
+  Received lead time vs. items.lead_time_days per supplier (or per supplier
+  and item, worst first, at most `limit` rows). late_pct = share of receipts
+  that took longer than promised.
+  """
+  limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+  group = "lt.supplier_id, lt.item_id" if by_item else "lt.supplier_id"
+  item_cols = "i.sku, i.name," if by_item else ""
+  item_join = "JOIN items i ON i.id = lt.item_id" if by_item else ""
+  with get_conn() as conn:
+    supplier_id, error = _supplier_id(conn, supplier_name)
+    if error:
+      return error
+    rows = conn.execute(f"""
+      SELECT s.name AS supplier, {item_cols}
+             SUM(lt.receipts) AS receipts,
+             ROUND(SUM(lt.actual_days_sum) / SUM(lt.receipts), 2) AS avg_actual_days,
+             ROUND(SUM(lt.promised_days_sum) / SUM(lt.receipts), 2) AS avg_promised_days,
+             ROUND(SUM(lt.abs_error_days_sum) / SUM(lt.receipts), 2) AS mean_abs_error_days,
+             ROUND(100.0 * SUM(lt.late) / SUM(lt.receipts), 1) AS late_pct
+      FROM lead_time_stats lt
+      JOIN suppliers s ON s.id = lt.supplier_id
+      {item_join}
+      WHERE lt.receipts > 0 AND (? IS NULL OR lt.supplier_id = ?)
+      GROUP BY {group}
+      ORDER BY late_pct DESC, receipts DESC
+      LIMIT ?
+    """, (supplier_id, supplier_id, limit)).fetchall()
+  return {"status": "success", **to_columnar(rows, LEAD_TIME_ITEM_COLUMNS if by_item else LEAD_TIME_COLUMNS)}
@@ -0,0 +1,77 @@
+"""
+Async access to the db.py API, for callers running on an event loop (the
+ADK server). sqlite3 calls block, so each call runs on a bounded thread pool
+instead of the loop thread; every worker keeps its own pooled connection
+(see db.get_conn). PROCUREMENT_DB_MAX_WORKERS caps how many DB calls run at
+once; further calls wait in the executor queue without blocking the loop.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from . import db
+
+T = TypeVar("T")
+
+DB_MAX_WORKERS = int(os.getenv("PROCUREMENT_DB_MAX_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+  global _executor
+  if _executor is None:
+    with _executor_lock:
+      if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="procurement-db")
+  return _executor
+
+def configure(max_workers: int) -> None:
+  """Resize the DB thread pool. Calls already queued finish on the old pool."""
+  global _executor, DB_MAX_WORKERS
+  with _executor_lock:
+    old, _executor = _executor, None
+    DB_MAX_WORKERS = max(1, int(max_workers))
+  if old is not None:
+    old.shutdown(wait=False)
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+  """Run a blocking db call on the DB thread pool and await its result."""
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+def to_async(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+  """
+  Async wrapper around a blocking function. functools.wraps keeps the name,
+  docstring and signature, which ADK reads to build the tool declaration.
+  """
+  @functools.wraps(fn)
+  async def wrapper(*args: Any, **kwargs: Any) -> T:
+    return await run_db(fn, *args, **kwargs)
+  return wrapper
+
+# Async variants of the public db.py API.
+alist_items = to_async(db.list_items)
+alist_items_page = to_async(db.list_items_page)
+aget_item_by_name_or_sku = to_async(db.get_item_by_name_or_sku)
+aget_items_by_name_or_sku = to_async(db.get_items_by_name_or_sku)
+asearch_items = to_async(db.search_items)
+alist_low_stock = to_async(db.list_low_stock)
+arecommend_order_quantities = to_async(db.recommend_order_quantities)
+alist_purchase_orders = to_async(db.list_purchase_orders)
+alist_open_purchase_orders = to_async(db.list_open_purchase_orders)
+alist_received_purchase_orders = to_async(db.list_received_purchase_orders)
+alist_purchase_orders_page = to_async(db.list_purchase_orders_page)
+acreate_purchase_order = to_async(db.create_purchase_order)
+acreate_purchase_orders = to_async(db.create_purchase_orders)
+aget_purchase_order = to_async(db.get_purchase_order)
+areceive_purchase_order = to_async(db.receive_purchase_order)
+areceive_purchase_orders = to_async(db.receive_purchase_orders)
+achanges_since = to_async(db.changes_since)
+areserve_stock = to_async(db.reserve_stock)
+arelease_reservations = to_async(db.release_reservations)
+astock_at = to_async(db.stock_at)
+astock_history = to_async(db.stock_history)
@@ -0,0 +1,319 @@
+"""
+Latency and memory benchmark for every public db.py function and agent tool.
+
+  python -m procurementAgent.benchmark --scales 1k 100k --out bench.json
+  python -m procurementAgent.benchmark --scales 1k --baseline bench.json
+
+For each scale a fresh database is generated with datagen, then every case
+in CASES runs --repeat times (p50/p95/mean/max in ms) plus once more under
+tracemalloc (peak KiB). Results are written as JSON; with --baseline, any
+case whose p50 grew by more than --threshold is reported and the exit code is 1.
+Public functions or tools without a case are listed under "uncovered".
+"""
+import argparse
+import inspect
+import json
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import datagen, db, locations
+
+# Context managers and connection plumbing: not meaningful to time as a call.
+EXCLUDED = {"get_conn", "write_txn", "reset_connections"}
+
+Call = Tuple[Callable[..., Any], tuple, Dict[str, Any]]
+
+class _Context:
+  """Sample keys drawn from the generated data, handed to each case."""
+
+  def __init__(self, agent):
+    self.agent = agent
+    with db.get_conn() as conn:
+      self.skus = [r[0] for r in conn.execute("SELECT sku FROM items ORDER BY id LIMIT 1000")]
+      self.names = [r[0] for r in conn.execute("SELECT name FROM items ORDER BY id DESC LIMIT 1000")]
+      self.po_ids = [r[0] for r in conn.execute("SELECT id FROM purchase_orders ORDER BY id DESC LIMIT 1000")]
+      self.supplier = conn.execute(
+        "SELECT s.name FROM suppliers s JOIN items i ON i.preferred_supplier_id = s.id ORDER BY i.id LIMIT 1"
+      ).fetchone()[0]
+      self.page_after = conn.execute("SELECT id FROM items ORDER BY id LIMIT 1 OFFSET ?", (db.DEFAULT_PAGE_SIZE * 10,)).fetchone()
+    self.recs = db.recommend_order_quantities()
+    self.n = 0
+
+  def tick(self) -> int:
+    self.n += 1
+    return self.n
+
+  def sku(self) -> str:
+    return self.skus[self.tick() % len(self.skus)]
+
+  def po_id(self) -> int:
+    return self.po_ids[self.tick() % len(self.po_ids)]
+
+  def lines(self, n: int = 3) -> List[Dict[str, Any]]:
+    return [{"sku_or_name": self.sku(), "qty": 5, "unit_price": 1.5} for _ in range(n)]
+
+  def open_po(self) -> int:
+    """A freshly placed PO, so each receive call has something to receive."""
+    return db.create_purchase_order(self.supplier, self.lines(), notes="benchmark")["po_id"]
+
+def _db(name: str, *args: Any, **kwargs: Any) -> Callable[["_Context"], Call]:
+  return lambda ctx: (getattr(db, name), args, kwargs)
+
+def _tool(name: str, *args: Any, **kwargs: Any) -> Callable[["_Context"], Call]:
+  return lambda ctx: (getattr(ctx.agent, name), args, kwargs)
+
+def _days_ago(days: int) -> str:
+  return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+def _fast(text: str) -> Callable[["_Context"], Call]:
+  """A question answered end to end by fast_path (match, tool calls, summary)."""
+  def factory(ctx: "_Context") -> Call:
+    from . import fast_path
+    tools = {n: getattr(ctx.agent, n) for n in ("tool_emit_table", "tool_get_item", "tool_get_po")}
+    return fast_path.answer, (text.replace("{sku}", ctx.sku()).replace("{po}", str(ctx.po_id())),), {"tools": tools}
+  return factory
+
+def _history(turns: int) -> Callable[["_Context"], Call]:
+  """history.trim over a synthetic chat of `turns` inventory-table lookups."""
+  def factory(ctx: "_Context") -> Call:
+    from google.genai import types
+    from . import history
+    page = ctx.agent.tool_emit_table("items")
+    contents = []
+    for t in range(turns):
+      call = types.FunctionCall(id=f"bench-{t}", name="tool_emit_table", args={"query_name": "items"})
+      contents += [
+        types.Content(role="user", parts=[types.Part.from_text(text="show all products")]),
+        types.Content(role="model", parts=[types.Part(function_call=call)]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+          id=call.id, name=call.name, response=page,
+        ))]),
+        types.Content(role="model", parts=[types.Part.from_text(text="Here is the inventory.")]),
+      ]
+    return history.trim, (contents,), {}
+  return factory
+
+CASES: Dict[str, Callable[[_Context], Call]] = {
+  "db.check_db_health": _db("check_db_health"),
+  "db.init_db_if_needed": _db("init_db_if_needed"),
+  "db.backup_to": lambda ctx: (db.backup_to, (f"{db.DB_PATH}.bak",), {}),
+  "db.restore_from": lambda ctx: (db.restore_from, (f"{db.DB_PATH}.bak",), {}),
+  "db.invalidate_catalog_cache": _db("invalidate_catalog_cache"),
+  "db.catalog_cache_stats": _db("catalog_cache_stats"),
+  "db.write_queue_stats": _db("write_queue_stats"),
+  "db.list_items": _db("list_items"),
+  "db.list_items_page": _db("list_items_page"),
+  "db.list_items_page[columnar]": _db("list_items_page", columnar=True),
+  "db.list_items_page[after_id,fields]": lambda ctx: (
+    db.list_items_page, (), {"after_id": ctx.page_after[0] if ctx.page_after else None, "fields": ["sku", "on_hand"]}),
+  "db.get_item_by_name_or_sku[sku]": lambda ctx: (db.get_item_by_name_or_sku, (ctx.sku(),), {}),
+  "db.get_item_by_name_or_sku[name]": lambda ctx: (db.get_item_by_name_or_sku, (ctx.names[ctx.tick() % len(ctx.names)],), {}),
+  "db.get_items_by_name_or_sku[15]": lambda ctx: (db.get_items_by_name_or_sku, ([ctx.sku() for _ in range(14)] + ["missing"],), {}),
+  "db.search_items[word]": _db("search_items", "item"),
+  "db.search_items[plural,sku]": lambda ctx: (db.search_items, (f"widgets {ctx.sku()}",), {}),
+  "db.rebuild_search_index": _db("rebuild_search_index"),
+  "db.list_low_stock": _db("list_low_stock"),
+  "db.check_low_stock_consistency": _db("check_low_stock_consistency"),
+  "db.rebuild_low_stock": _db("rebuild_low_stock"),
+  "db.rebuild_demand_weekly": _db("rebuild_demand_weekly"),
+  "db.rebuild_analytics": _db("rebuild_analytics"),
+  "db.changes_since": _db("changes_since"),
+  "db.changes_since[latest]": lambda ctx: (db.changes_since, (db.changes_since()["latest_seq"],), {}),
+  "db.compact_change_log": _db("compact_change_log"),
+  "db.reserve_stock": lambda ctx: (db.reserve_stock, ([{"sku_or_name": ctx.sku(), "qty": 1}],), {"ref": "benchmark"}),
+  "db.reserve_stock[15]": lambda ctx: (
+    db.reserve_stock, ([{"sku_or_name": ctx.sku(), "qty": 1} for _ in range(15)],), {"ref": "benchmark"}),
+  "db.release_reservations[ref]": _db("release_reservations", ref="benchmark"),
+  "db.expire_reservations": _db("expire_reservations"),
+  "db.snapshot_stock": _db("snapshot_stock"),
+  "db.rebuild_stock_snapshots": _db("rebuild_stock_snapshots"),
+  "db.stock_at": lambda ctx: (db.stock_at, (ctx.sku(), _days_ago(90)), {}),
+  "db.stock_at[today]": lambda ctx: (db.stock_at, (ctx.sku(), _days_ago(0)), {}),
+  "db.stock_history[15,90d]": lambda ctx: (db.stock_history, ([ctx.sku() for _ in range(15)], _days_ago(90)), {}),
+  "db.stock_history[15,1y,weekly]": lambda ctx: (
+    db.stock_history, ([ctx.sku() for _ in range(15)], _days_ago(365)), {"step_days": 7}),
+  "db.recommend_order_quantities": _db("recommend_order_quantities"),
+  "db.list_purchase_orders": _db("list_purchase_orders"),
+  "db.list_open_purchase_orders": _db("list_open_purchase_orders"),
+  "db.list_received_purchase_orders": _db("list_received_purchase_orders"),
+  "db.list_purchase_orders_page": _db("list_purchase_orders_page"),
+  "db.list_purchase_orders_page[open,total]": _db("list_purchase_orders_page", ["DRAFT", "PLACED"], with_total=True),
+  "db.get_purchase_order": lambda ctx: (db.get_purchase_order, (ctx.po_id(),), {}),
+  "db.create_purchase_order": lambda ctx: (db.create_purchase_order, (ctx.supplier, ctx.lines()), {"notes": "benchmark"}),
+  "db.create_purchase_orders[10]": lambda ctx: (
+    db.create_purchase_orders, ([{"supplier_name": ctx.supplier, "lines": ctx.lines(), "notes": "benchmark"} for _ in range(10)],), {}),
+  "db.to_columnar": lambda ctx: (db.to_columnar, (ctx.recs,), {}),
+  "db.split_recommendations_by_supplier": lambda ctx: (db.split_recommendations_by_supplier, (ctx.recs,), {}),
+  "db.receive_purchase_order": lambda ctx: (db.receive_purchase_order, (ctx.open_po(),), {}),
+  "db.receive_purchase_orders[10]": lambda ctx: (
+    db.receive_purchase_orders, ([{"po_id": ctx.open_po()} for _ in range(10)],), {}),
+  "agent.tool_emit_ui": _tool("tool_emit_ui", "table", {"rows": []}),
+  "agent.tool_emit_table[items]": _tool("tool_emit_table", "items"),
+  "agent.tool_emit_table[low_stock]": _tool("tool_emit_table", "low_stock"),
+  "agent.tool_emit_table[open_purchase_orders]": _tool("tool_emit_table", "open_purchase_orders"),
+  "agent.tool_list_items": _tool("tool_list_items"),
+  "agent.tool_get_item": lambda ctx: (ctx.agent.tool_get_item, (ctx.sku(),), {}),
+  "agent.tool_get_items": lambda ctx: (ctx.agent.tool_get_items, ([ctx.sku() for _ in range(14)] + ["widgets"],), {}),
+  "agent.tool_search_items": lambda ctx: (ctx.agent.tool_search_items, (ctx.names[ctx.tick() % len(ctx.names)][-8:],), {}),
+  "agent.tool_list_low_stock": _tool("tool_list_low_stock"),
+  "agent.tool_recommend_orders[mvp]": _tool("tool_recommend_orders"),
+  "agent.tool_recommend_orders[moving_average]": _tool("tool_recommend_orders", "moving_average"),
+  "agent.tool_recommend_orders[exp_smoothing]": _tool("tool_recommend_orders", "exp_smoothing"),
+  "agent.tool_create_po": lambda ctx: (ctx.agent.tool_create_po, (ctx.supplier, ctx.lines()), {}),
+  "agent.tool_create_pos": lambda ctx: (
+    ctx.agent.tool_create_pos, ([{"supplier_name": ctx.supplier, "lines": ctx.lines()} for _ in range(3)],), {}),
+  "agent.tool_get_po": lambda ctx: (ctx.agent.tool_get_po, (ctx.po_id(),), {}),
+  "agent.tool_receive_po": lambda ctx: (ctx.agent.tool_receive_po, (ctx.open_po(),), {}),
+  "agent.tool_receive_pos": lambda ctx: (ctx.agent.tool_receive_pos, ([{"po_id": ctx.open_po()} for _ in range(3)],), {}),
+  "agent.tool_spend_report": _tool("tool_spend_report"),
+  "agent.tool_spend_report[supplier]": lambda ctx: (ctx.agent.tool_spend_report, (), {"supplier_name": ctx.supplier}),
+  "agent.tool_open_po_aging": _tool("tool_open_po_aging"),
+  "agent.tool_lead_time_accuracy": _tool("tool_lead_time_accuracy"),
+  "agent.tool_changes_since": _tool("tool_changes_since"),
+  "agent.tool_stock_history": lambda ctx: (ctx.agent.tool_stock_history, ([ctx.sku(), ctx.sku()], _days_ago(30)), {}),
+  "agent.tool_lead_time_accuracy[by_item]": _tool("tool_lead_time_accuracy", by_item=True),
+  "agent.tool_emit_table[open_po_aging]": _tool("tool_emit_table", "open_po_aging"),
+  "fast_path[low_stock]": _fast("what is low?"),
+  "fast_path[stock]": _fast("stock for {sku}"),
+  "fast_path[po]": _fast("show PO {po}"),
+  "fast_path[open_orders,he]": _fast("הזמנות פתוחות"),
+  "history.trim[20 turns]": _history(20),
+  "locations.adjust_stock": lambda ctx: (locations.adjust_stock, ("bench-a", [{"sku_or_name": ctx.sku(), "qty": 1}]), {}),
+  "locations.total_stock": lambda ctx: (locations.total_stock, (), {}),
+  "locations.low_stock_by_location": lambda ctx: (locations.low_stock_by_location, (), {}),
+  "locations.network_recommendations": lambda ctx: (locations.network_recommendations, (), {}),
+  "agent.tool_list_purchase_orders": _tool("tool_list_purchase_orders"),
+  "agent.tool_list_open_purchase_orders": _tool("tool_list_open_purchase_orders"),
+  "agent.tool_list_received_purchase_orders": _tool("tool_list_received_purchase_orders"),
+}
+
+def _percentile(sorted_ms: List[float], q: float) -> float:
+  k = max(0, min(len(sorted_ms) - 1, round(q * (len(sorted_ms) - 1))))
+  return sorted_ms[k]
+
+def _run_case(factory: Callable[[_Context], Call], ctx: _Context, repeat: int) -> Dict[str, Any]:
+  fn, args, kwargs = factory(ctx)
+  result = fn(*args, **kwargs)  # warm-up; also sizes the result
+  samples = []
+  for _ in range(repeat):
+    fn, args, kwargs = factory(ctx)
+    t = time.perf_counter()
+    fn(*args, **kwargs)
+    samples.append((time.perf_counter() - t) * 1000)
+  fn, args, kwargs = factory(ctx)
+  tracemalloc.start()
+  try:
+    fn(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  samples.sort()
+  return {
+    "p50_ms": round(_percentile(samples, 0.50), 3),
+    "p95_ms": round(_percentile(samples, 0.95), 3),
+    "mean_ms": round(statistics.fmean(samples), 3),
+    "max_ms": round(samples[-1], 3),
+    "peak_kib": round(peak / 1024, 1),
+    "result_bytes": len(json.dumps(result, default=str)),
+  }
+
+def uncovered(agent) -> List[str]:
+  """Public db functions and agent tools that have no benchmark case."""
+  covered = {name.split("[")[0] for name in CASES}
+  names = [
+    f"db.{n}" for n, f in inspect.getmembers(db, inspect.isfunction)
+    if not n.startswith("_") and f.__module__ == db.__name__ and n not in EXCLUDED
+  ]
+  names += [f"agent.{n}" for n, f in inspect.getmembers(agent, inspect.isfunction) if n.startswith("tool_")]
+  return sorted(n for n in names if n not in covered)
+
+def run_scale(scale: str, workdir: Path, repeat: int, seed: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+  path = workdir / f"bench-{scale}.db"
+  for suffix in ("", "-wal", "-shm"):
+    Path(f"{path}{suffix}").unlink(missing_ok=True)
+  generated = datagen.generate(datagen.default_counts(datagen.SCALES[scale]), seed=seed, db_path=path)
+  db.snapshot_stock()  # what the maintenance task does for a running server
+  with db.get_conn() as conn:
+    conn.execute("ANALYZE")
+
+  from . import agent  # imported late: only the tool cases need it
+  ctx = _Context(agent)
+  # Two more sites next to the generated DB, stocked with the sampled SKUs.
+  for site in ("bench-a", "bench-b"):
+    site_path = workdir / f"bench-{scale}-{site}.db"
+    for suffix in ("", "-wal", "-shm"):
+      Path(f"{site_path}{suffix}").unlink(missing_ok=True)
+    locations.add_location(site, str(site_path))
+    locations.adjust_stock(site, [{"sku_or_name": s, "qty": 5} for s in ctx.skus], ref="benchmark")
+  ops: Dict[str, Any] = {}
+  for name, factory in CASES.items():
+    if only and not any(name.startswith(o) for o in only):
+      continue
+    try:
+      ops[name] = _run_case(factory, ctx, repeat)
+    except Exception as e:  # keep going: one broken case should not hide the rest
+      ops[name] = {"error": f"{type(e).__name__}: {e}"}
+  return {"data": generated["counts"], "generate_seconds": generated["seconds"], "ops": ops}
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+  """Cases whose p50 grew by more than `threshold` (e.g. 0.25 = 25%) against the baseline."""
+  regressions = []
+  for scale, run in current["scales"].items():
+    base_ops = baseline.get("scales", {}).get(scale, {}).get("ops", {})
+    for name, stats in run["ops"].items():
+      old = base_ops.get(name, {}).get("p50_ms")
+      new = stats.get("p50_ms")
+      if old and new is not None and new > old * (1 + threshold) and new - old > 0.05:
+        regressions.append({"scale": scale, "case": name, "baseline_p50_ms": old, "p50_ms": new, "ratio": round(new / old, 2)})
+  return regressions
+
+def main() -> int:
+  parser = argparse.ArgumentParser(prog="python -m procurementAgent.benchmark", description="Benchmark db.py and agent tools.")
+  parser.add_argument("--scales", nargs="+", choices=sorted(datagen.SCALES), default=["1k"])
+  parser.add_argument("--repeat", type=int, default=20)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--only", nargs="*", help="run only cases whose name starts with one of these prefixes")
+  parser.add_argument("--workdir", type=Path, help="where generated databases go (default: a temp dir)")
+  parser.add_argument("--out", type=Path, help="write the JSON report here (default: stdout)")
+  parser.add_argument("--baseline", type=Path, help="previous report to compare against")
+  parser.add_argument("--threshold", type=float, default=0.25, help="allowed p50 growth vs baseline (default 0.25)")
+  args = parser.parse_args()
+
+  workdir = args.workdir or Path(tempfile.mkdtemp(prefix="procurement-bench-"))
+  workdir.mkdir(parents=True, exist_ok=True)
+  report: Dict[str, Any] = {
+    "meta": {
+      "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+      "python": platform.python_version(),
+      "sqlite": sqlite3.sqlite_version,
+      "platform": platform.platform(),
+      "repeat": args.repeat,
+      "seed": args.seed,
+    },
+    "scales": {},
+  }
+  for scale in args.scales:
+    report["scales"][scale] = run_scale(scale, workdir, args.repeat, args.seed, args.only)
+  from . import agent
+  report["uncovered"] = uncovered(agent)
+
+  status = 0
+  if args.baseline:
+    report["regressions"] = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+    status = 1 if report["regressions"] else 0
+  text = json.dumps(report, indent=2)
+  if args.out:
+    args.out.write_text(text)
+  else:
+    print(text)
+  return status
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,365 @@
+"""
+Streaming bulk import / export.
+
+  python -m procurementAgent.bulk_io import suppliers suppliers.csv
+  python -m procurementAgent.bulk_io import items items.jsonl
+  python -m procurementAgent.bulk_io export stock_moves moves.csv
+
+Imports read CSV or JSONL (by file suffix, or --format) CHUNK_ROWS rows at a
+time; each chunk is written with executemany in its own transaction, so memory
+stays flat and a bad row only skips itself (reported under "skipped").
+  suppliers     name, email, phone                    upsert on name
+  items         sku, name, unit, reorder_point, min_level, lead_time_days,
+                supplier (name)                       upsert on sku
+  inventory     sku, on_hand                          upsert on item (reserved
+                                                      is kept: it follows
+                                                      stock_reservations)
+  stock_moves   sku, qty, type, ref, created_at       append (history only;
+                                                      on_hand is not adjusted;
+                                                      checkpoints of the items
+                                                      written are rebuilt from
+                                                      their earliest new row)
+stock_moves.created_at accepts any ISO 8601 form (naive = UTC) and is stored
+as UTC 'YYYY-MM-DDTHH:MM:SSZ'; anything else skips the row.
+
+Exports page through the table by id (keyset), one short read per chunk, and
+yield rows as dicts; the whole table is never in memory.
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import db
+
+CHUNK_ROWS = 10_000
+MAX_REPORTED_SKIPS = 100
+
+Source = Union[str, Path, Iterable[Dict[str, Any]]]
+
+# -------------------- Reading --------------------
+
+def _format_of(path: Path, fmt: Optional[str]) -> str:
+  fmt = (fmt or path.suffix.lstrip(".")).lower()
+  if fmt in ("jsonl", "ndjson"):
+    return "jsonl"
+  if fmt == "csv":
+    return "csv"
+  raise ValueError(f"Unknown format '{fmt}'. Use csv or jsonl.")
+
+def _read_file(path: Path, fmt: str) -> Iterator[Dict[str, Any]]:
+  with open(path, newline="", encoding="utf-8") as f:
+    if fmt == "csv":
+      # Empty CSV cells mean "not given", like a missing JSON key.
+      for row in csv.DictReader(f):
+        yield {k: v for k, v in row.items() if v not in ("", None)}
+    else:
+      for line in f:
+        if line.strip():
+          yield json.loads(line)
+
+def _rows(source: Source, fmt: Optional[str]) -> Iterator[Dict[str, Any]]:
+  if isinstance(source, (str, Path)):
+    path = Path(source)
+    return _read_file(path, _format_of(path, fmt))
+  return iter(source)
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+  while True:
+    batch = list(itertools.islice(rows, size))
+    if not batch:
+      return
+    yield batch
+
+def _int(row: Dict[str, Any], key: str, default: Optional[int] = None) -> int:
+  value = row.get(key, default)
+  if value is None:
+    raise ValueError(f"missing {key}")
+  return int(value)
+
+def _text(row: Dict[str, Any], key: str, default: Optional[str] = None) -> str:
+  value = row.get(key, default)
+  if value is None or str(value).strip() == "":
+    raise ValueError(f"missing {key}")
+  return str(value).strip()
+
+def _timestamp(row: Dict[str, Any], key: str, default: str) -> str:
+  """
+  row[key] as the ledger's UTC 'YYYY-MM-DDTHH:MM:SSZ' (default when empty).
+  created_at is compared as text, so '2024-01-05 10:00' or '+02:00' forms must
+  not be stored as given. Naive values are taken as UTC.
+  """
+  value = row.get(key)
+  if value is None or str(value).strip() == "":
+    return default
+  try:
+    at = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+  except ValueError:
+    raise ValueError(f"bad {key} '{value}'") from None
+  if at.tzinfo is not None:
+    at = at.astimezone(timezone.utc).replace(tzinfo=None)
+  return db._iso(at.replace(microsecond=0))
+
+def _lookup_ids(conn, sql: str, keys: List[str]) -> Dict[str, int]:
+  """{key: id} for `sql` (a SELECT key, id ... IN ({}) template), one query per IN chunk."""
+  found: Dict[str, int] = {}
+  unique = list(dict.fromkeys(keys))
+  for chunk in db._chunks(unique):
+    for key, id_ in conn.execute(sql.format(",".join("?" * len(chunk))), chunk):
+      found[key] = id_
+  return found
+
+# -------------------- Import --------------------
+#
+# Each importer turns one batch of dicts into (params, skipped) inside the
+# batch's transaction and returns the statement to executemany.
+
+# (SQL for executemany, or a function(conn, params) that writes them; params; skipped)
+Prepared = Tuple[Union[str, Callable[..., None]], List[tuple], List[Tuple[int, str]]]
+
+def _prepare_suppliers(conn, batch: List[Dict[str, Any]], first: int) -> Prepared:
+  params, skipped = [], []
+  for n, row in enumerate(batch, first):
+    try:
+      params.append((_text(row, "name"), row.get("email"), row.get("phone")))
+    except (TypeError, ValueError) as e:
+      skipped.append((n, str(e)))
+  return ("""
+    INSERT INTO suppliers (name, email, phone) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET email = excluded.email, phone = excluded.phone
+  """, params, skipped)
+
+def _prepare_items(conn, batch: List[Dict[str, Any]], first: int) -> Prepared:
+  suppliers = _lookup_ids(
+    conn,
+    "SELECT name, id FROM suppliers WHERE name IN ({})",
+    [str(r["supplier"]) for r in batch if r.get("supplier")],
+  )
+  params, skipped = [], []
+  for n, row in enumerate(batch, first):
+    try:
+      supplier_id = None
+      if row.get("supplier"):
+        supplier_id = suppliers.get(str(row["supplier"]))
+        if supplier_id is None:
+          raise ValueError(f"unknown supplier '{row['supplier']}'")
+      params.append((
+        _text(row, "sku"), _text(row, "name"), _text(row, "unit", "unit"),
+        _int(row, "reorder_point", 10), _int(row, "min_level", 5), _int(row, "lead_time_days", 3),
+        supplier_id,
+      ))
+    except (TypeError, ValueError) as e:
+      skipped.append((n, str(e)))
+  return ("""
+    INSERT INTO items (sku, name, unit, reorder_point, min_level, lead_time_days, preferred_supplier_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(sku) DO UPDATE SET
+      name = excluded.name, unit = excluded.unit, reorder_point = excluded.reorder_point,
+      min_level = excluded.min_level, lead_time_days = excluded.lead_time_days,
+      preferred_supplier_id = excluded.preferred_supplier_id
+  """, params, skipped)
+
+def _item_ids(conn, batch: List[Dict[str, Any]]) -> Dict[str, int]:
+  return _lookup_ids(conn, "SELECT sku, id FROM items WHERE sku IN ({})", [str(r["sku"]) for r in batch if r.get("sku")])
+
+def _prepare_inventory(conn, batch: List[Dict[str, Any]], first: int) -> Prepared:
+  ids = _item_ids(conn, batch)
+  now = db._now_iso()
+  params, skipped = [], []
+  for n, row in enumerate(batch, first):
+    try:
+      sku = _text(row, "sku")
+      if sku not in ids:
+        raise ValueError(f"unknown sku '{sku}'")
+      params.append((ids[sku], _int(row, "on_hand"), now))
+    except (TypeError, ValueError) as e:
+      skipped.append((n, str(e)))
+  # reserved is the sum of ACTIVE stock_reservations, owned by reserve/release;
+  # a file value (e.g. a re-imported export) would break available-to-promise.
+  return ("""
+    INSERT INTO inventory (item_id, on_hand, reserved, updated_at) VALUES (?, ?, 0, ?)
+    ON CONFLICT(item_id) DO UPDATE SET on_hand = excluded.on_hand, updated_at = excluded.updated_at
+  """, params, skipped)
+
+_MOVE_TYPES = {"RECEIVE", "ISSUE", "ADJUST"}
+
+def _prepare_stock_moves(conn, batch: List[Dict[str, Any]], first: int) -> Prepared:
+  ids = _item_ids(conn, batch)
+  now = db._now_iso()
+  params, skipped = [], []
+  for n, row in enumerate(batch, first):
+    try:
+      sku = _text(row, "sku")
+      if sku not in ids:
+        raise ValueError(f"unknown sku '{sku}'")
+      kind = _text(row, "type").upper()
+      if kind not in _MOVE_TYPES:
+        raise ValueError(f"bad type '{kind}'")
+      params.append((ids[sku], _int(row, "qty"), kind, row.get("ref"), _timestamp(row, "created_at", now)))
+    except (TypeError, ValueError) as e:
+      skipped.append((n, str(e)))
+  return (db._insert_stock_moves, params, skipped)
+
+IMPORTERS: Dict[str, Callable[..., Prepared]] = {
+  "suppliers": _prepare_suppliers,
+  "items": _prepare_items,
+  "inventory": _prepare_inventory,
+  "stock_moves": _prepare_stock_moves,
+}
+
+def _write_chunk(conn, prepare: Callable[..., Prepared], batch: List[Dict[str, Any]], first: int) -> Dict[str, Any]:
+  """One chunk in one transaction, on the writer like every other write."""
+  write, params, bad = prepare(conn, batch, first)
+  if params and callable(write):
+    write(conn, params)
+  elif params:
+    conn.executemany(write, params)
+  return {"written": len(params), "skipped": bad}
+
+def import_rows(table: str, source: Source, fmt: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> Dict[str, Any]:
+  """
+  Stream `source` (a CSV/JSONL path or an iterable of dicts) into `table`.
+  Rows are numbered from 1 in "skipped"; at most MAX_REPORTED_SKIPS are listed.
+  """
+  if table not in IMPORTERS:
+    return {"status": "error", "error_message": f"Cannot import '{table}'. Use one of: {', '.join(IMPORTERS)}."}
+  prepare = IMPORTERS[table]
+  start = time.perf_counter()
+  written, seen, skip_count = 0, 0, 0
+  skipped: List[Dict[str, Any]] = []
+  try:
+    for batch in _batches(_rows(source, fmt), chunk_rows):
+      result = db._run_write(_write_chunk, prepare, batch, seen + 1)
+      if result.get("status") == "error":
+        return {"status": "error", "error_message": f"Import stopped after {seen} rows: {result['error_message']}", "written": written}
+      bad = result["skipped"]
+      seen += len(batch)
+      written += result["written"]
+      skip_count += len(bad)
+      skipped.extend({"row": n, "error": e} for n, e in bad[:MAX_REPORTED_SKIPS - len(skipped)])
+  except (OSError, ValueError) as e:
+    # Unreadable file or malformed JSON line: earlier chunks stay committed.
+    return {"status": "error", "error_message": f"Import stopped after {seen} rows: {e}", "written": written}
+  finally:
+    if table == "stock_moves" and written:
+      # A first history import leaves the horizon unset; checkpoint it now.
+      db.snapshot_stock()
+  return {
+    "status": "success",
+    "table": table,
+    "rows": seen,
+    "written": written,
+    "skipped_count": skip_count,
+    "skipped": skipped,
+    "seconds": round(time.perf_counter() - start, 3),
+  }
+
+# -------------------- Export --------------------
+
+EXPORTS: Dict[str, str] = {
+  "suppliers": "SELECT s.id, s.name, s.email, s.phone FROM suppliers s WHERE s.id > ? ORDER BY s.id LIMIT ?",
+  "items": """
+    SELECT i.id, i.sku, i.name, i.unit, i.reorder_point, i.min_level, i.lead_time_days, s.name AS supplier
+    FROM items i LEFT JOIN suppliers s ON s.id = i.preferred_supplier_id
+    WHERE i.id > ? ORDER BY i.id LIMIT ?
+  """,
+  "inventory": """
+    SELECT inv.item_id AS id, i.sku, inv.on_hand, inv.reserved, inv.updated_at
+    FROM inventory inv JOIN items i ON i.id = inv.item_id
+    WHERE inv.item_id > ? ORDER BY inv.item_id LIMIT ?
+  """,
+  "stock_moves": """
+    SELECT m.id, i.sku, m.qty, m.type, m.ref, m.created_at
+    FROM stock_moves m JOIN items i ON i.id = m.item_id
+    WHERE m.id > ? ORDER BY m.id LIMIT ?
+  """,
+  "purchase_orders": """
+    SELECT po.id, s.name AS supplier, po.status, po.created_at, po.expected_at, po.notes
+    FROM purchase_orders po JOIN suppliers s ON s.id = po.supplier_id
+    WHERE po.id > ? ORDER BY po.id LIMIT ?
+  """,
+  "purchase_order_lines": """
+    SELECT pol.id, pol.po_id, i.sku, pol.qty, pol.unit_price, pol.received_qty
+    FROM purchase_order_lines pol JOIN items i ON i.id = pol.item_id
+    WHERE pol.id > ? ORDER BY pol.id LIMIT ?
+  """,
+}
+
+def export_rows(table: str, after_id: int = 0, chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+  """
+  Yield every row of `table` (see EXPORTS) with id > after_id, in id order.
+  The connection is only held while a chunk is read, never across a yield,
+  so a slow consumer does not pin a read snapshot or the WAL.
+  Raises ValueError for an unknown table.
+  """
+  if table not in EXPORTS:
+    raise ValueError(f"Cannot export '{table}'. Use one of: {', '.join(EXPORTS)}.")
+  sql = EXPORTS[table]
+  last = int(after_id)
+  while True:
+    with db.get_conn() as conn:
+      rows = conn.execute(sql, (last, chunk_rows)).fetchall()
+    if not rows:
+      return
+    for r in rows:
+      yield dict(r)
+    last = rows[-1]["id"]
+    if len(rows) < chunk_rows:
+      return
+
+def write_export(table: str, out: Union[str, Path, IO[str]], fmt: Optional[str] = None, after_id: int = 0) -> Dict[str, Any]:
+  """Stream export_rows(table) to a CSV/JSONL file (or an open text stream)."""
+  start = time.perf_counter()
+  if isinstance(out, (str, Path)):
+    path = Path(out)
+    fmt = _format_of(path, fmt)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+      count = _write_rows(export_rows(table, after_id), f, fmt)
+  else:
+    count = _write_rows(export_rows(table, after_id), out, fmt or "jsonl")
+  return {"status": "success", "table": table, "rows": count, "seconds": round(time.perf_counter() - start, 3)}
+
+def _write_rows(rows: Iterator[Dict[str, Any]], f: IO[str], fmt: str) -> int:
+  count = 0
+  writer = None
+  for row in rows:
+    if fmt == "csv":
+      if writer is None:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        writer.writeheader()
+      writer.writerow(row)
+    else:
+      f.write(json.dumps(row, ensure_ascii=False))
+      f.write("\n")
+    count += 1
+  return count
+
+def main() -> int:
+  parser = argparse.ArgumentParser(prog="python -m procurementAgent.bulk_io", description="Bulk import/export.")
+  sub = parser.add_subparsers(dest="command", required=True)
+  imp = sub.add_parser("import")
+  imp.add_argument("table", choices=sorted(IMPORTERS))
+  imp.add_argument("path", type=Path)
+  exp = sub.add_parser("export")
+  exp.add_argument("table", choices=sorted(EXPORTS))
+  exp.add_argument("path", help="output file, or - for stdout (JSONL)")
+  exp.add_argument("--after-id", type=int, default=0)
+  for p in (imp, exp):
+    p.add_argument("--format", choices=["csv", "jsonl"])
+  args = parser.parse_args()
+  db.init_db_if_needed()
+  if args.command == "import":
+    result = import_rows(args.table, args.path, args.format)
+  else:
+    out = sys.stdout if args.path == "-" else Path(args.path)
+    result = write_export(args.table, out, args.format, args.after_id)
+  print(json.dumps(result, indent=2), file=sys.stderr if args.path == "-" else sys.stdout)
+  return 0 if result["status"] == "success" else 1
+
+if __name__ == "__main__":
+  raise SystemExit(main())
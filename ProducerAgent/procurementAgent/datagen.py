@@ -0,0 +1,172 @@
+"""
+Reproducible synthetic data for load testing.
+
+  python -m procurementAgent.datagen --scale 100k --db /tmp/bench.db
+
+Fills the database at PROCUREMENT_DB_PATH (or --db) with suppliers, items,
+inventory, purchase orders with lines, and two years of stock moves. Counts
+derive from the number of items (see SCALES) and can be overridden one by
+one. The same seed always produces the same rows.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import db
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+CHUNK_ROWS = 10_000
+HISTORY_DAYS = 730
+
+def default_counts(items: int) -> Dict[str, int]:
+  return {
+    "suppliers": max(2, items // 100),
+    "items": items,
+    "purchase_orders": max(10, items // 10),
+    "lines_per_po": 3,
+    "stock_moves": items * 2,
+  }
+
+def _executemany(conn, sql: str, rows: List[tuple]) -> Dict[str, Any]:
+  conn.executemany(sql, rows)
+  return {"status": "success"}
+
+def _write(sql: str, chunk: List[tuple]) -> None:
+  """One chunk through the writer thread, so a live server's writes are not locked out."""
+  result = db._run_write(_executemany, sql, chunk)
+  if result["status"] == "error":
+    raise RuntimeError(result["error_message"])
+
+def _insert_chunked(sql: str, rows: Iterator[tuple]) -> None:
+  chunk: List[tuple] = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) >= CHUNK_ROWS:
+      _write(sql, chunk)
+      chunk = []
+  if chunk:
+    _write(sql, chunk)
+
+def _iso(ts: datetime) -> str:
+  return ts.isoformat(timespec="seconds") + "Z"
+
+def generate(counts: Dict[str, int], seed: int = 42, db_path: Optional[Path] = None) -> Dict[str, Any]:
+  """
+  Append synthetic rows to the database (db.DB_PATH, or db_path if given).
+  Returns the counts used and how long each table took.
+  """
+  if db_path is not None:
+    db.DB_PATH = Path(db_path).resolve()
+    db.reset_connections()
+  db.init_db_if_needed()
+  rnd = random.Random(seed)
+  now = datetime.utcnow().replace(microsecond=0)
+  timings: Dict[str, float] = {}
+
+  with db.get_conn() as conn:
+    supplier_base = conn.execute("SELECT COALESCE(MAX(id), 0) FROM suppliers").fetchone()[0]
+    item_base = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+    po_base = conn.execute("SELECT COALESCE(MAX(id), 0) FROM purchase_orders").fetchone()[0]
+  n_sup, n_items, n_pos = counts["suppliers"], counts["items"], counts["purchase_orders"]
+  supplier_ids = range(supplier_base + 1, supplier_base + n_sup + 1)
+  item_ids = range(item_base + 1, item_base + n_items + 1)
+
+  t = time.perf_counter()
+  _insert_chunked(
+    "INSERT INTO suppliers (id, name, email, phone) VALUES (?, ?, ?, ?)",
+    ((sid, f"Supplier {sid:06d}", f"orders{sid}@supplier.example", f"+1-555-{sid % 10000:04d}") for sid in supplier_ids),
+  )
+  timings["suppliers"] = time.perf_counter() - t
+
+  t = time.perf_counter()
+  _insert_chunked(
+    """INSERT INTO items (id, sku, name, unit, reorder_point, min_level, lead_time_days, preferred_supplier_id)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+    (
+      (iid, f"GEN-{iid:07d}", f"Generated item {iid}", rnd.choice(("unit", "bag", "can", "bottle", "box")),
+       rnd.randint(5, 60), rnd.randint(2, 20), rnd.randint(1, 14), rnd.choice(supplier_ids))
+      for iid in item_ids
+    ),
+  )
+  _insert_chunked(
+    "INSERT INTO inventory (item_id, on_hand, reserved, updated_at) VALUES (?, ?, 0, ?)",
+    ((iid, rnd.randint(0, 120), _iso(now)) for iid in item_ids),
+  )
+  timings["items"] = time.perf_counter() - t
+
+  t = time.perf_counter()
+  statuses = ("DRAFT", "PLACED", "PLACED", "RECEIVED", "RECEIVED", "RECEIVED", "CANCELLED")
+  po_status: Dict[int, str] = {}
+
+  def po_rows():
+    for k in range(n_pos):
+      po_id = po_base + k + 1
+      status = rnd.choice(statuses)
+      po_status[po_id] = status
+      created = now - timedelta(days=rnd.random() * HISTORY_DAYS)
+      received = min(now, created + timedelta(days=rnd.uniform(1, 21))) if status == "RECEIVED" else None
+      yield (po_id, rnd.choice(supplier_ids), status, _iso(created),
+             (created + timedelta(days=rnd.randint(1, 14))).date().isoformat(),
+             _iso(received) if received else None, "generated")
+
+  _insert_chunked(
+    """INSERT INTO purchase_orders (id, supplier_id, status, created_at, expected_at, received_at, notes)
+       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+    po_rows(),
+  )
+
+  def line_rows():
+    for po_id, status in po_status.items():
+      for _ in range(counts["lines_per_po"]):
+        qty = rnd.randint(1, 100)
+        yield (po_id, rnd.choice(item_ids), qty, round(rnd.uniform(0.5, 50), 2), qty if status == "RECEIVED" else 0)
+
+  _insert_chunked(
+    "INSERT INTO purchase_order_lines (po_id, item_id, qty, unit_price, received_qty) VALUES (?, ?, ?, ?, ?)",
+    line_rows(),
+  )
+  timings["purchase_orders"] = time.perf_counter() - t
+
+  t = time.perf_counter()
+
+  def move_rows():
+    for _ in range(counts["stock_moves"]):
+      kind = rnd.choices(("ISSUE", "RECEIVE", "ADJUST"), weights=(75, 20, 5))[0]
+      qty = rnd.randint(1, 20) if kind != "ADJUST" else rnd.randint(-5, 5) or 1
+      ts = now - timedelta(seconds=rnd.randint(0, HISTORY_DAYS * 86400))
+      yield (rnd.choice(item_ids), qty, kind, "generated", _iso(ts))
+
+  _insert_chunked(
+    "INSERT INTO stock_moves (item_id, qty, type, ref, created_at) VALUES (?, ?, ?, ?, ?)",
+    move_rows(),
+  )
+  timings["stock_moves"] = time.perf_counter() - t
+
+  return {
+    "status": "success",
+    "db_path": str(db.DB_PATH),
+    "seed": seed,
+    "counts": counts,
+    "seconds": {k: round(v, 3) for k, v in timings.items()},
+  }
+
+def main() -> int:
+  parser = argparse.ArgumentParser(prog="python -m procurementAgent.datagen", description="Generate synthetic procurement data.")
+  parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+  parser.add_argument("--db", type=Path, help="database file (default: PROCUREMENT_DB_PATH)")
+  parser.add_argument("--seed", type=int, default=42)
+  for key in default_counts(1):
+    parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key, help=f"override the {key} count")
+  args = parser.parse_args()
+  counts = default_counts(SCALES[args.scale])
+  counts.update({k: v for k, v in vars(args).items() if k in counts and v is not None})
+  print(json.dumps(generate(counts, seed=args.seed, db_path=args.db), indent=2))
+  return 0
+
+if __name__ == "__main__":
+  raise SystemExit(main())
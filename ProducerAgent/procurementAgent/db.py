@@ -1,12 +1,47 @@
+import json
 import os
+import re
 import sqlite3
+import bisect
+import threading
+import time
+import weakref
 from contextlib import contextmanager
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
+
+from . import maintenance, metrics, writer
 
 DB_PATH = Path(os.getenv("PROCUREMENT_DB_PATH", "procurement.db")).resolve()
 
+# Connection tuning (see _open_conn). cache_size is in KiB, mmap_size in bytes.
+DB_CACHE_KB = int(os.getenv("PROCUREMENT_DB_CACHE_KB", "16384"))
+DB_MMAP_BYTES = int(os.getenv("PROCUREMENT_DB_MMAP_BYTES", str(128 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("PROCUREMENT_DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Cold start (see init_db_if_needed). A missing DB_PATH is restored from the
+# backup, else from the prebuilt snapshot, before the schema check runs.
+DB_SNAPSHOT = os.getenv("PROCUREMENT_DB_SNAPSHOT", "")
+DB_BACKUP_PATH = os.getenv("PROCUREMENT_DB_BACKUP_PATH", "")
+DB_BACKUP_INTERVAL_S = float(os.getenv("PROCUREMENT_DB_BACKUP_INTERVAL_S", "300"))
+
+# Change feed retention (see compact_change_log).
+CHANGE_LOG_MAX_ROWS = int(os.getenv("PROCUREMENT_CHANGE_LOG_MAX_ROWS", "100000"))
+CHANGE_LOG_RETENTION_DAYS = float(os.getenv("PROCUREMENT_CHANGE_LOG_RETENTION_DAYS", "7"))
+CHANGE_LOG_COMPACT_INTERVAL_S = float(os.getenv("PROCUREMENT_CHANGE_LOG_COMPACT_INTERVAL_S", "600"))
+# Stock reservations (see reserve_stock / expire_reservations).
+RESERVATION_TTL_MINUTES = float(os.getenv("PROCUREMENT_RESERVATION_TTL_MINUTES", "60"))
+RESERVATION_SWEEP_INTERVAL_S = float(os.getenv("PROCUREMENT_RESERVATION_SWEEP_INTERVAL_S", "60"))
+# Stock checkpoints (see snapshot_stock / stock_at / stock_history).
+STOCK_SNAPSHOT_DAYS = max(1, int(os.getenv("PROCUREMENT_STOCK_SNAPSHOT_DAYS", "1")))
+STOCK_SNAPSHOT_INTERVAL_S = float(os.getenv("PROCUREMENT_STOCK_SNAPSHOT_INTERVAL_S", "3600"))
+
+# Stored in PRAGMA user_version once init_db_if_needed has brought a file up to
+# date. Bump it whenever SCHEMA_SQL, SEARCH_SQL, SEED_SQL, _ADDED_COLUMNS or one
+# of the *_SQL trigger scripts change.
+SCHEMA_VERSION = 5
+
 SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
 
@@ -43,6 +78,7 @@ CREATE TABLE IF NOT EXISTS purchase_orders (
   status TEXT NOT NULL CHECK(status IN ('DRAFT','PLACED','RECEIVED','CANCELLED')) DEFAULT 'DRAFT',
   created_at TEXT NOT NULL,
   expected_at TEXT,
+  received_at TEXT,
   notes TEXT,
   FOREIGN KEY (supplier_id) REFERENCES suppliers(id)
 );
@@ -53,6 +89,7 @@ CREATE TABLE IF NOT EXISTS purchase_order_lines (
   item_id INTEGER NOT NULL,
   qty INTEGER NOT NULL CHECK(qty > 0),
   unit_price REAL,
+  received_qty INTEGER NOT NULL DEFAULT 0,
   FOREIGN KEY (po_id) REFERENCES purchase_orders(id) ON DELETE CASCADE,
   FOREIGN KEY (item_id) REFERENCES items(id)
 );
@@ -66,6 +103,570 @@ CREATE TABLE IF NOT EXISTS stock_moves (
   created_at TEXT NOT NULL,
   FOREIGN KEY (item_id) REFERENCES items(id)
 );
+
+-- Bumped by trigger on every catalog (items/suppliers) write; the in-process
+-- catalog cache compares it to drop stale entries.
+CREATE TABLE IF NOT EXISTS catalog_version (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_items_ins_version AFTER INSERT ON items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_items_upd_version AFTER UPDATE ON items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_items_del_version AFTER DELETE ON items
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_suppliers_ins_version AFTER INSERT ON suppliers
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_suppliers_upd_version AFTER UPDATE ON suppliers
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_suppliers_del_version AFTER DELETE ON suppliers
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+-- Materialized "what is low": one row per item whose available-to-promise
+-- (on_hand - reserved + open PO quantity) is <= reorder_point, shortage =
+-- reorder_point - available. Kept current by the triggers in AVAILABILITY_SQL;
+-- rebuild_low_stock() recomputes it from scratch.
+CREATE TABLE IF NOT EXISTS low_stock (
+  item_id INTEGER PRIMARY KEY,
+  shortage INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_low_stock_shortage ON low_stock(shortage DESC, item_id);
+
+-- Stock held for outgoing orders (see reserve_stock). inventory.reserved is
+-- the sum of qty over ACTIVE rows; releasing or expiring a row gives it back.
+CREATE TABLE IF NOT EXISTS stock_reservations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id INTEGER NOT NULL,
+  qty INTEGER NOT NULL CHECK(qty > 0),
+  ref TEXT,
+  status TEXT NOT NULL CHECK(status IN ('ACTIVE','RELEASED','EXPIRED')) DEFAULT 'ACTIVE',
+  created_at TEXT NOT NULL,
+  expires_at TEXT,
+  released_at TEXT,
+  FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_active_expiry ON stock_reservations(expires_at) WHERE status = 'ACTIVE';
+CREATE INDEX IF NOT EXISTS idx_reservations_active_ref ON stock_reservations(ref) WHERE status = 'ACTIVE';
+
+-- Lookups compare SKU/name case-insensitively, so index them under NOCASE.
+CREATE INDEX IF NOT EXISTS idx_items_sku_nocase ON items(sku COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_items_name_nocase ON items(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_suppliers_name_nocase ON suppliers(name COLLATE NOCASE);
+
+CREATE INDEX IF NOT EXISTS idx_items_preferred_supplier ON items(preferred_supplier_id);
+CREATE INDEX IF NOT EXISTS idx_po_status ON purchase_orders(status);
+CREATE INDEX IF NOT EXISTS idx_po_supplier ON purchase_orders(supplier_id);
+CREATE INDEX IF NOT EXISTS idx_pol_po ON purchase_order_lines(po_id);
+CREATE INDEX IF NOT EXISTS idx_pol_item ON purchase_order_lines(item_id);
+CREATE INDEX IF NOT EXISTS idx_stock_moves_item ON stock_moves(item_id, created_at);
+
+-- Weekly demand (ISSUE quantity) per item, for forecast.py. week = whole
+-- weeks since 1970-01-01. Maintained by trigger so forecasting never has to
+-- aggregate the raw ledger.
+CREATE TABLE IF NOT EXISTS demand_weekly (
+  item_id INTEGER NOT NULL,
+  week INTEGER NOT NULL,
+  qty INTEGER NOT NULL,
+  PRIMARY KEY (item_id, week)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_moves_ins_demand AFTER INSERT ON stock_moves
+WHEN new.type = 'ISSUE'
+BEGIN
+  INSERT INTO demand_weekly (item_id, week, qty)
+  VALUES (new.item_id, CAST((julianday(new.created_at) - 2440587.5) / 7 AS INTEGER), ABS(new.qty))
+  ON CONFLICT(item_id, week) DO UPDATE SET qty = qty + excluded.qty;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stock_moves_del_demand AFTER DELETE ON stock_moves
+WHEN old.type = 'ISSUE'
+BEGIN
+  UPDATE demand_weekly SET qty = qty - ABS(old.qty)
+  WHERE item_id = old.item_id AND week = CAST((julianday(old.created_at) - 2440587.5) / 7 AS INTEGER);
+END;
+"""
+
+# Full-text search over item SKU + name (see search_items). Separate from
+# SCHEMA_SQL because FTS5 / the trigram tokenizer (SQLite 3.34+) may be
+# missing from the linked SQLite; search then falls back to LIKE.
+SEARCH_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+  sku, name, content='items', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_items_ins_fts AFTER INSERT ON items BEGIN
+  INSERT INTO items_fts (rowid, sku, name) VALUES (new.id, new.sku, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_items_upd_fts AFTER UPDATE OF sku, name ON items BEGIN
+  INSERT INTO items_fts (items_fts, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name);
+  INSERT INTO items_fts (rowid, sku, name) VALUES (new.id, new.sku, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_items_del_fts AFTER DELETE ON items BEGIN
+  INSERT INTO items_fts (items_fts, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name);
+END;
+"""
+
+# Procurement rollups read by analytics.py. Separate from SCHEMA_SQL because the
+# triggers use purchase_orders.received_at, which older files only get from
+# _add_missing_columns. Every trigger applies a signed delta, so creating,
+# receiving, editing or cancelling POs keeps the rollups exact without
+# scanning the PO tables; rebuild_analytics() recomputes them for backfills.
+# Not tracked incrementally: moving a line to another PO (po_id updates), and
+# lead-time receipts of deleted POs.
+ANALYTICS_SQL = """
+-- Spend per supplier and month of PO creation ('YYYY-MM'); cancelled POs excluded.
+CREATE TABLE IF NOT EXISTS spend_monthly (
+  supplier_id INTEGER NOT NULL,
+  month TEXT NOT NULL,
+  po_count INTEGER NOT NULL,
+  ordered_qty INTEGER NOT NULL,
+  ordered_amount REAL NOT NULL,
+  received_qty INTEGER NOT NULL,
+  received_amount REAL NOT NULL,
+  PRIMARY KEY (supplier_id, month)
+) WITHOUT ROWID;
+
+-- Open (DRAFT/PLACED) POs by supplier, creation day and expected day ('' if none).
+-- Age buckets depend on today, so they are computed at query time from these days.
+CREATE TABLE IF NOT EXISTS open_po_aging (
+  supplier_id INTEGER NOT NULL,
+  created_day TEXT NOT NULL,
+  expected_day TEXT NOT NULL,
+  po_count INTEGER NOT NULL,
+  outstanding_qty INTEGER NOT NULL,
+  outstanding_amount REAL NOT NULL,
+  PRIMARY KEY (supplier_id, created_day, expected_day)
+) WITHOUT ROWID;
+
+-- Actual vs. promised (items.lead_time_days) lead time, per supplier and item.
+-- One receipt per PO line, counted when the line becomes fully received.
+CREATE TABLE IF NOT EXISTS lead_time_stats (
+  supplier_id INTEGER NOT NULL,
+  item_id INTEGER NOT NULL,
+  receipts INTEGER NOT NULL,
+  actual_days_sum REAL NOT NULL,
+  promised_days_sum REAL NOT NULL,
+  abs_error_days_sum REAL NOT NULL,
+  late INTEGER NOT NULL,
+  PRIMARY KEY (supplier_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_po_ins_analytics AFTER INSERT ON purchase_orders
+BEGIN
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT new.supplier_id, substr(new.created_at, 1, 7), 1, 0, 0, 0, 0
+  WHERE new.status != 'CANCELLED'
+  ON CONFLICT(supplier_id, month) DO UPDATE SET po_count = po_count + 1;
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT new.supplier_id, substr(new.created_at, 1, 10), COALESCE(substr(new.expected_at, 1, 10), ''), 1, 0, 0
+  WHERE new.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET po_count = po_count + 1;
+END;
+
+-- Status changes re-file the whole PO: take its totals out under the old
+-- values and add them back under the new ones.
+CREATE TRIGGER IF NOT EXISTS trg_po_upd_analytics AFTER UPDATE OF status, supplier_id, created_at, expected_at ON purchase_orders
+BEGIN
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT old.supplier_id, substr(old.created_at, 1, 7), -1, -t.q, -t.a, -t.rq, -t.ra
+  FROM (SELECT COALESCE(SUM(qty), 0) AS q, COALESCE(SUM(qty * COALESCE(unit_price, 0)), 0) AS a,
+               COALESCE(SUM(received_qty), 0) AS rq, COALESCE(SUM(received_qty * COALESCE(unit_price, 0)), 0) AS ra
+        FROM purchase_order_lines WHERE po_id = old.id) t
+  WHERE old.status != 'CANCELLED'
+    AND (new.status = 'CANCELLED' OR new.supplier_id != old.supplier_id OR substr(new.created_at, 1, 7) != substr(old.created_at, 1, 7))
+  ON CONFLICT(supplier_id, month) DO UPDATE SET
+    po_count = po_count + excluded.po_count, ordered_qty = ordered_qty + excluded.ordered_qty,
+    ordered_amount = ordered_amount + excluded.ordered_amount, received_qty = received_qty + excluded.received_qty,
+    received_amount = received_amount + excluded.received_amount;
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT new.supplier_id, substr(new.created_at, 1, 7), 1, t.q, t.a, t.rq, t.ra
+  FROM (SELECT COALESCE(SUM(qty), 0) AS q, COALESCE(SUM(qty * COALESCE(unit_price, 0)), 0) AS a,
+               COALESCE(SUM(received_qty), 0) AS rq, COALESCE(SUM(received_qty * COALESCE(unit_price, 0)), 0) AS ra
+        FROM purchase_order_lines WHERE po_id = new.id) t
+  WHERE new.status != 'CANCELLED'
+    AND (old.status = 'CANCELLED' OR new.supplier_id != old.supplier_id OR substr(new.created_at, 1, 7) != substr(old.created_at, 1, 7))
+  ON CONFLICT(supplier_id, month) DO UPDATE SET
+    po_count = po_count + excluded.po_count, ordered_qty = ordered_qty + excluded.ordered_qty,
+    ordered_amount = ordered_amount + excluded.ordered_amount, received_qty = received_qty + excluded.received_qty,
+    received_amount = received_amount + excluded.received_amount;
+
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT old.supplier_id, substr(old.created_at, 1, 10), COALESCE(substr(old.expected_at, 1, 10), ''), -1, -t.q, -t.a
+  FROM (SELECT COALESCE(SUM(qty - received_qty), 0) AS q, COALESCE(SUM((qty - received_qty) * COALESCE(unit_price, 0)), 0) AS a
+        FROM purchase_order_lines WHERE po_id = old.id) t
+  WHERE old.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET
+    po_count = po_count + excluded.po_count, outstanding_qty = outstanding_qty + excluded.outstanding_qty,
+    outstanding_amount = outstanding_amount + excluded.outstanding_amount;
+  DELETE FROM open_po_aging
+  WHERE supplier_id = old.supplier_id AND created_day = substr(old.created_at, 1, 10)
+    AND expected_day = COALESCE(substr(old.expected_at, 1, 10), '') AND po_count <= 0;
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT new.supplier_id, substr(new.created_at, 1, 10), COALESCE(substr(new.expected_at, 1, 10), ''), 1, t.q, t.a
+  FROM (SELECT COALESCE(SUM(qty - received_qty), 0) AS q, COALESCE(SUM((qty - received_qty) * COALESCE(unit_price, 0)), 0) AS a
+        FROM purchase_order_lines WHERE po_id = new.id) t
+  WHERE new.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET
+    po_count = po_count + excluded.po_count, outstanding_qty = outstanding_qty + excluded.outstanding_qty,
+    outstanding_amount = outstanding_amount + excluded.outstanding_amount;
+END;
+
+-- BEFORE, so the lines are still there: ON DELETE CASCADE removes them before
+-- any AFTER trigger on the PO runs, and the line triggers then find no PO.
+CREATE TRIGGER IF NOT EXISTS trg_po_del_analytics BEFORE DELETE ON purchase_orders
+BEGIN
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT old.supplier_id, substr(old.created_at, 1, 7), -1, -t.q, -t.a, -t.rq, -t.ra
+  FROM (SELECT COALESCE(SUM(qty), 0) AS q, COALESCE(SUM(qty * COALESCE(unit_price, 0)), 0) AS a,
+               COALESCE(SUM(received_qty), 0) AS rq, COALESCE(SUM(received_qty * COALESCE(unit_price, 0)), 0) AS ra
+        FROM purchase_order_lines WHERE po_id = old.id) t
+  WHERE old.status != 'CANCELLED'
+  ON CONFLICT(supplier_id, month) DO UPDATE SET
+    po_count = po_count + excluded.po_count, ordered_qty = ordered_qty + excluded.ordered_qty,
+    ordered_amount = ordered_amount + excluded.ordered_amount, received_qty = received_qty + excluded.received_qty,
+    received_amount = received_amount + excluded.received_amount;
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT old.supplier_id, substr(old.created_at, 1, 10), COALESCE(substr(old.expected_at, 1, 10), ''), -1, -t.q, -t.a
+  FROM (SELECT COALESCE(SUM(qty - received_qty), 0) AS q, COALESCE(SUM((qty - received_qty) * COALESCE(unit_price, 0)), 0) AS a
+        FROM purchase_order_lines WHERE po_id = old.id) t
+  WHERE old.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET
+    po_count = po_count + excluded.po_count, outstanding_qty = outstanding_qty + excluded.outstanding_qty,
+    outstanding_amount = outstanding_amount + excluded.outstanding_amount;
+  DELETE FROM open_po_aging
+  WHERE supplier_id = old.supplier_id AND created_day = substr(old.created_at, 1, 10)
+    AND expected_day = COALESCE(substr(old.expected_at, 1, 10), '') AND po_count <= 0;
+END;
+
+-- Line triggers add (sign = 1) or remove (sign = -1) one line's contribution
+-- to its PO's rollup rows; an UPDATE does both.
+CREATE TRIGGER IF NOT EXISTS trg_pol_ins_analytics AFTER INSERT ON purchase_order_lines
+BEGIN
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT po.supplier_id, substr(po.created_at, 1, 7), 0, new.qty, new.qty * COALESCE(new.unit_price, 0),
+         new.received_qty, new.received_qty * COALESCE(new.unit_price, 0)
+  FROM purchase_orders po WHERE po.id = new.po_id AND po.status != 'CANCELLED'
+  ON CONFLICT(supplier_id, month) DO UPDATE SET
+    ordered_qty = ordered_qty + excluded.ordered_qty, ordered_amount = ordered_amount + excluded.ordered_amount,
+    received_qty = received_qty + excluded.received_qty, received_amount = received_amount + excluded.received_amount;
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT po.supplier_id, substr(po.created_at, 1, 10), COALESCE(substr(po.expected_at, 1, 10), ''), 0,
+         new.qty - new.received_qty, (new.qty - new.received_qty) * COALESCE(new.unit_price, 0)
+  FROM purchase_orders po WHERE po.id = new.po_id AND po.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET
+    outstanding_qty = outstanding_qty + excluded.outstanding_qty,
+    outstanding_amount = outstanding_amount + excluded.outstanding_amount;
+  -- Lines loaded already received (imports, generated history) use the PO's received_at.
+  INSERT INTO lead_time_stats (supplier_id, item_id, receipts, actual_days_sum, promised_days_sum, abs_error_days_sum, late)
+  SELECT d.supplier_id, new.item_id, 1, d.actual, i.lead_time_days, ABS(d.actual - i.lead_time_days), d.actual > i.lead_time_days
+  FROM (SELECT supplier_id, julianday(received_at) - julianday(created_at) AS actual
+        FROM purchase_orders WHERE id = new.po_id AND received_at IS NOT NULL) d
+  JOIN items i ON i.id = new.item_id
+  WHERE new.received_qty >= new.qty
+  ON CONFLICT(supplier_id, item_id) DO UPDATE SET
+    receipts = receipts + 1, actual_days_sum = actual_days_sum + excluded.actual_days_sum,
+    promised_days_sum = promised_days_sum + excluded.promised_days_sum,
+    abs_error_days_sum = abs_error_days_sum + excluded.abs_error_days_sum, late = late + excluded.late;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pol_upd_analytics AFTER UPDATE OF qty, unit_price, received_qty ON purchase_order_lines
+BEGIN
+  INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+  SELECT po.supplier_id, substr(po.created_at, 1, 7), 0, new.qty - old.qty,
+         new.qty * COALESCE(new.unit_price, 0) - old.qty * COALESCE(old.unit_price, 0),
+         new.received_qty - old.received_qty,
+         new.received_qty * COALESCE(new.unit_price, 0) - old.received_qty * COALESCE(old.unit_price, 0)
+  FROM purchase_orders po WHERE po.id = new.po_id AND po.status != 'CANCELLED'
+  ON CONFLICT(supplier_id, month) DO UPDATE SET
+    ordered_qty = ordered_qty + excluded.ordered_qty, ordered_amount = ordered_amount + excluded.ordered_amount,
+    received_qty = received_qty + excluded.received_qty, received_amount = received_amount + excluded.received_amount;
+  INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+  SELECT po.supplier_id, substr(po.created_at, 1, 10), COALESCE(substr(po.expected_at, 1, 10), ''), 0,
+         (new.qty - new.received_qty) - (old.qty - old.received_qty),
+         (new.qty - new.received_qty) * COALESCE(new.unit_price, 0) - (old.qty - old.received_qty) * COALESCE(old.unit_price, 0)
+  FROM purchase_orders po WHERE po.id = new.po_id AND po.status IN ('DRAFT', 'PLACED')
+  ON CONFLICT(supplier_id, created_day, expected_day) DO UPDATE SET
+    outstanding_qty = outstanding_qty + excluded.outstanding_qty,
+    outstanding_amount = outstanding_amount + excluded.outstanding_amount;
+  -- The line just became fully received: that is its receipt date (whole seconds, like the ledger).
+  INSERT INTO lead_time_stats (supplier_id, item_id, receipts, actual_days_sum, promised_days_sum, abs_error_days_sum, late)
+  SELECT d.supplier_id, new.item_id, 1, d.actual, i.lead_time_days, ABS(d.actual - i.lead_time_days), d.actual > i.lead_time_days
+  FROM (SELECT supplier_id, julianday(strftime('%Y-%m-%dT%H:%M:%S', 'now')) - julianday(created_at) AS actual
+        FROM purchase_orders WHERE id = new.po_id) d
+  JOIN items i ON i.id = new.item_id
+  WHERE old.received_qty < old.qty AND new.received_qty >= new.qty
+  ON CONFLICT(supplier_id, item_id) DO UPDATE SET
+    receipts = receipts + 1, actual_days_sum = actual_days_sum + excluded.actual_days_sum,
+    promised_days_sum = promised_days_sum + excluded.promised_days_sum,
+    abs_error_days_sum = abs_error_days_sum + excluded.abs_error_days_sum, late = late + excluded.late;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pol_del_analytics AFTER DELETE ON purchase_order_lines
+BEGIN
+  UPDATE spend_monthly SET
+    ordered_qty = ordered_qty - old.qty, ordered_amount = ordered_amount - old.qty * COALESCE(old.unit_price, 0),
+    received_qty = received_qty - old.received_qty,
+    received_amount = received_amount - old.received_qty * COALESCE(old.unit_price, 0)
+  WHERE (supplier_id, month) = (
+    SELECT supplier_id, substr(created_at, 1, 7) FROM purchase_orders WHERE id = old.po_id AND status != 'CANCELLED'
+  );
+  UPDATE open_po_aging SET
+    outstanding_qty = outstanding_qty - (old.qty - old.received_qty),
+    outstanding_amount = outstanding_amount - (old.qty - old.received_qty) * COALESCE(old.unit_price, 0)
+  WHERE (supplier_id, created_day, expected_day) = (
+    SELECT supplier_id, substr(created_at, 1, 10), COALESCE(substr(expected_at, 1, 10), '')
+    FROM purchase_orders WHERE id = old.po_id AND status IN ('DRAFT', 'PLACED')
+  );
+END;
+"""
+
+# Append-only change feed for dashboards (see changes_since). seq comes from
+# AUTOINCREMENT, so it only grows and is never reused after compaction. Each
+# row carries the entity's state after the change (null for deletes), so a
+# client that applies rows in seq order ends up current even when compaction
+# has dropped superseded rows. Separate from SCHEMA_SQL for the same reason as
+# ANALYTICS_SQL (purchase_orders.received_at).
+CHANGE_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS change_log (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  entity TEXT NOT NULL CHECK(entity IN ('inventory', 'purchase_order')),
+  entity_id INTEGER NOT NULL,
+  op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete')),
+  data TEXT,
+  created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_created ON change_log(created_at);
+
+-- horizon_seq: highest seq dropped by retention. Clients behind it must reload.
+CREATE TABLE IF NOT EXISTS change_log_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  horizon_seq INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO change_log_state (id, horizon_seq) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_ins_changes AFTER INSERT ON inventory
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  VALUES ('inventory', new.item_id, 'insert', json_object('on_hand', new.on_hand, 'reserved', new.reserved),
+          strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_upd_changes AFTER UPDATE OF on_hand, reserved ON inventory
+WHEN new.on_hand IS NOT old.on_hand OR new.reserved IS NOT old.reserved
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  VALUES ('inventory', new.item_id, 'update', json_object('on_hand', new.on_hand, 'reserved', new.reserved),
+          strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_inventory_del_changes AFTER DELETE ON inventory
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  VALUES ('inventory', old.item_id, 'delete', NULL, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+
+-- PO state: header fields plus ordered / received totals over its lines.
+CREATE TRIGGER IF NOT EXISTS trg_po_ins_changes AFTER INSERT ON purchase_orders
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  VALUES ('purchase_order', new.id, 'insert',
+          json_object('status', new.status, 'supplier_id', new.supplier_id, 'expected_at', new.expected_at,
+                      'received_at', new.received_at, 'ordered_qty', 0, 'received_qty', 0),
+          strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_po_upd_changes AFTER UPDATE OF status, supplier_id, expected_at, received_at ON purchase_orders
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  SELECT 'purchase_order', new.id, 'update',
+         json_object('status', new.status, 'supplier_id', new.supplier_id, 'expected_at', new.expected_at,
+                     'received_at', new.received_at, 'ordered_qty', COALESCE(SUM(pol.qty), 0),
+                     'received_qty', COALESCE(SUM(pol.received_qty), 0)),
+         strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+  FROM purchase_order_lines pol WHERE pol.po_id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_po_del_changes AFTER DELETE ON purchase_orders
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  VALUES ('purchase_order', old.id, 'delete', NULL, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+-- Line writes (new lines, receipts) change the PO's totals; deletes of whole
+-- POs are covered above, so only lines whose PO still exists are logged.
+CREATE TRIGGER IF NOT EXISTS trg_pol_ins_changes AFTER INSERT ON purchase_order_lines
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  SELECT 'purchase_order', po.id, 'update',
+         json_object('status', po.status, 'supplier_id', po.supplier_id, 'expected_at', po.expected_at,
+                     'received_at', po.received_at,
+                     'ordered_qty', (SELECT SUM(qty) FROM purchase_order_lines WHERE po_id = po.id),
+                     'received_qty', (SELECT SUM(received_qty) FROM purchase_order_lines WHERE po_id = po.id)),
+         strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+  FROM purchase_orders po WHERE po.id = new.po_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pol_upd_changes AFTER UPDATE OF qty, received_qty ON purchase_order_lines
+BEGIN
+  INSERT INTO change_log (entity, entity_id, op, data, created_at)
+  SELECT 'purchase_order', po.id, 'update',
+         json_object('status', po.status, 'supplier_id', po.supplier_id, 'expected_at', po.expected_at,
+                     'received_at', po.received_at,
+                     'ordered_qty', (SELECT SUM(qty) FROM purchase_order_lines WHERE po_id = po.id),
+                     'received_qty', (SELECT SUM(received_qty) FROM purchase_order_lines WHERE po_id = po.id)),
+         strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+  FROM purchase_orders po WHERE po.id = new.po_id;
+END;
+"""
+
+# Available-to-promise. on_order holds the outstanding quantity (qty -
+# received_qty) of DRAFT/PLACED PO lines per item, kept by signed-delta
+# triggers like the analytics rollups, so low_stock can be maintained per item
+# without re-aggregating PO lines. Separate from SCHEMA_SQL because the
+# triggers use purchase_order_lines.received_qty, which older files only get
+# from _add_missing_columns. The low_stock triggers are dropped and recreated:
+# schema v3 and earlier defined them on on_hand alone.
+AVAILABILITY_SQL = """
+CREATE TABLE IF NOT EXISTS on_order (
+  item_id INTEGER PRIMARY KEY,
+  qty INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_pol_ins_on_order AFTER INSERT ON purchase_order_lines
+WHEN EXISTS (SELECT 1 FROM purchase_orders WHERE id = new.po_id AND status IN ('DRAFT', 'PLACED'))
+BEGIN
+  INSERT INTO on_order (item_id, qty) VALUES (new.item_id, new.qty - new.received_qty)
+  ON CONFLICT(item_id) DO UPDATE SET qty = qty + excluded.qty;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_pol_upd_on_order AFTER UPDATE OF po_id, item_id, qty, received_qty ON purchase_order_lines
+BEGIN
+  UPDATE on_order SET qty = qty - (old.qty - old.received_qty)
+  WHERE item_id = old.item_id
+    AND EXISTS (SELECT 1 FROM purchase_orders WHERE id = old.po_id AND status IN ('DRAFT', 'PLACED'));
+  INSERT INTO on_order (item_id, qty)
+  SELECT new.item_id, new.qty - new.received_qty
+  WHERE EXISTS (SELECT 1 FROM purchase_orders WHERE id = new.po_id AND status IN ('DRAFT', 'PLACED'))
+  ON CONFLICT(item_id) DO UPDATE SET qty = qty + excluded.qty;
+END;
+-- A cascaded line delete no longer sees its PO, so whole-PO deletes are
+-- subtracted up front by trg_po_del_on_order.
+CREATE TRIGGER IF NOT EXISTS trg_pol_del_on_order AFTER DELETE ON purchase_order_lines
+WHEN EXISTS (SELECT 1 FROM purchase_orders WHERE id = old.po_id AND status IN ('DRAFT', 'PLACED'))
+BEGIN
+  UPDATE on_order SET qty = qty - (old.qty - old.received_qty) WHERE item_id = old.item_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_po_upd_on_order AFTER UPDATE OF status ON purchase_orders
+WHEN (old.status IN ('DRAFT', 'PLACED')) != (new.status IN ('DRAFT', 'PLACED'))
+BEGIN
+  INSERT INTO on_order (item_id, qty)
+  SELECT item_id, SUM(qty - received_qty) * (CASE WHEN new.status IN ('DRAFT', 'PLACED') THEN 1 ELSE -1 END)
+  FROM purchase_order_lines WHERE po_id = new.id GROUP BY item_id
+  ON CONFLICT(item_id) DO UPDATE SET qty = qty + excluded.qty;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_po_del_on_order BEFORE DELETE ON purchase_orders
+WHEN old.status IN ('DRAFT', 'PLACED')
+BEGIN
+  UPDATE on_order SET qty = on_order.qty - l.qty
+  FROM (SELECT item_id, SUM(qty - received_qty) AS qty FROM purchase_order_lines WHERE po_id = old.id GROUP BY item_id) l
+  WHERE on_order.item_id = l.item_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_inventory_ins_low_stock;
+DROP TRIGGER IF EXISTS trg_inventory_upd_low_stock;
+DROP TRIGGER IF EXISTS trg_inventory_del_low_stock;
+DROP TRIGGER IF EXISTS trg_items_upd_low_stock;
+DROP TRIGGER IF EXISTS trg_items_del_low_stock;
+
+CREATE TRIGGER trg_inventory_ins_low_stock AFTER INSERT ON inventory
+BEGIN
+  INSERT OR REPLACE INTO low_stock (item_id, shortage)
+  SELECT new.item_id, i.reorder_point - (new.on_hand - new.reserved + COALESCE(oo.qty, 0))
+  FROM items i LEFT JOIN on_order oo ON oo.item_id = i.id
+  WHERE i.id = new.item_id AND new.on_hand - new.reserved + COALESCE(oo.qty, 0) <= i.reorder_point;
+END;
+CREATE TRIGGER trg_inventory_upd_low_stock AFTER UPDATE OF item_id, on_hand, reserved ON inventory
+BEGIN
+  DELETE FROM low_stock WHERE item_id IN (old.item_id, new.item_id);
+  INSERT INTO low_stock (item_id, shortage)
+  SELECT new.item_id, i.reorder_point - (new.on_hand - new.reserved + COALESCE(oo.qty, 0))
+  FROM items i LEFT JOIN on_order oo ON oo.item_id = i.id
+  WHERE i.id = new.item_id AND new.on_hand - new.reserved + COALESCE(oo.qty, 0) <= i.reorder_point;
+END;
+CREATE TRIGGER trg_inventory_del_low_stock AFTER DELETE ON inventory
+BEGIN
+  DELETE FROM low_stock WHERE item_id = old.item_id;
+END;
+CREATE TRIGGER trg_items_upd_low_stock AFTER UPDATE OF reorder_point ON items
+BEGIN
+  DELETE FROM low_stock WHERE item_id = new.id;
+  INSERT INTO low_stock (item_id, shortage)
+  SELECT new.id, new.reorder_point - (inv.on_hand - inv.reserved + COALESCE(oo.qty, 0))
+  FROM inventory inv LEFT JOIN on_order oo ON oo.item_id = inv.item_id
+  WHERE inv.item_id = new.id AND inv.on_hand - inv.reserved + COALESCE(oo.qty, 0) <= new.reorder_point;
+END;
+CREATE TRIGGER trg_items_del_low_stock AFTER DELETE ON items
+BEGIN
+  DELETE FROM low_stock WHERE item_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_on_order_ins_low_stock AFTER INSERT ON on_order
+BEGIN
+  DELETE FROM low_stock WHERE item_id = new.item_id;
+  INSERT INTO low_stock (item_id, shortage)
+  SELECT new.item_id, i.reorder_point - (inv.on_hand - inv.reserved + new.qty)
+  FROM inventory inv JOIN items i ON i.id = inv.item_id
+  WHERE inv.item_id = new.item_id AND inv.on_hand - inv.reserved + new.qty <= i.reorder_point;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_on_order_upd_low_stock AFTER UPDATE OF qty ON on_order
+BEGIN
+  DELETE FROM low_stock WHERE item_id = new.item_id;
+  INSERT INTO low_stock (item_id, shortage)
+  SELECT new.item_id, i.reorder_point - (inv.on_hand - inv.reserved + new.qty)
+  FROM inventory inv JOIN items i ON i.id = inv.item_id
+  WHERE inv.item_id = new.item_id AND inv.on_hand - inv.reserved + new.qty <= i.reorder_point;
+END;
+"""
+
+# Per-item stock checkpoints for point-in-time queries (see stock_at). A row
+# holds the ledger balance (ISSUE counted as -ABS(qty), RECEIVE and ADJUST as
+# signed qty) of every stock_moves row with created_at < at. Rows sit on
+# period boundaries (every period_days days from 1970-01-01) and exist only
+# for periods in which the item moved, up to horizon, which snapshot_stock
+# advances. Moves dated before the horizon (imports, deletes) patch the later
+# checkpoints by trigger, adding the checkpoint for their own period if it is
+# missing, so "no checkpoint at a boundary" always means "no moves in that
+# period". Live moves are dated after the horizon and skip the triggers.
+SNAPSHOT_SQL = """
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+  item_id INTEGER NOT NULL,
+  at TEXT NOT NULL,
+  qty INTEGER NOT NULL,
+  PRIMARY KEY (item_id, at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS stock_snapshot_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  period_days INTEGER NOT NULL,
+  horizon TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stock_moves_created ON stock_moves(created_at);
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_moves_ins_snapshot AFTER INSERT ON stock_moves
+WHEN new.created_at < (SELECT horizon FROM stock_snapshot_state WHERE id = 1)
+BEGIN
+  INSERT OR IGNORE INTO stock_snapshots (item_id, at, qty)
+  SELECT new.item_id, b.at, COALESCE((
+    SELECT s.qty FROM stock_snapshots s WHERE s.item_id = new.item_id AND s.at < b.at ORDER BY s.at DESC LIMIT 1
+  ), 0)
+  FROM (
+    SELECT strftime('%Y-%m-%dT00:00:00Z',
+      (CAST((julianday(new.created_at) - 2440587.5) / period_days AS INTEGER) + 1) * period_days + 2440587.5) AS at
+    FROM stock_snapshot_state WHERE id = 1
+  ) b;
+  UPDATE stock_snapshots SET qty = qty + (CASE WHEN new.type = 'ISSUE' THEN -ABS(new.qty) ELSE new.qty END)
+  WHERE item_id = new.item_id AND at > new.created_at;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stock_moves_del_snapshot AFTER DELETE ON stock_moves
+WHEN old.created_at < (SELECT horizon FROM stock_snapshot_state WHERE id = 1)
+BEGIN
+  UPDATE stock_snapshots SET qty = qty - (CASE WHEN old.type = 'ISSUE' THEN -ABS(old.qty) ELSE old.qty END)
+  WHERE item_id = old.item_id AND at > old.created_at;
+END;
 """
 
 SEED_SQL = """
@@ -95,86 +696,1012 @@ INSERT OR IGNORE INTO purchase_order_lines (id, po_id, item_id, qty, unit_price)
 VALUES (1, 1, 2, 12, 4.20);
 """
 
+# -------------------- Connections --------------------
+#
+# One long-lived connection per thread instead of open/close per call.
+# get_conn() may be nested: only the outermost block commits (or rolls back),
+# so helpers can call each other without splitting a transaction.
+
+class _PooledConnection(sqlite3.Connection):
+  """sqlite3.Connection subclass so the pool can track it by weak reference."""
+
+class _InstrumentedConnection(_PooledConnection):
+  """Times every statement for metrics / the slow-query log. Only used when they are on."""
+
+  def execute(self, sql, parameters=()):
+    return metrics.timed_execute(super().execute, sql, parameters)
+
+  def executemany(self, sql, seq_of_parameters):
+    return metrics.timed_executemany(super().executemany, sql, seq_of_parameters)
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool: "weakref.WeakSet[_PooledConnection]" = weakref.WeakSet()
+_pool_generation = 0
+
+def _open_conn(path: Optional[Path] = None) -> sqlite3.Connection:
+  """A tuned connection to `path` (default DB_PATH); locations.py opens its handles here too."""
+  path = path or DB_PATH
+  path.parent.mkdir(parents=True, exist_ok=True)
+  conn = sqlite3.connect(
+    str(path),
+    timeout=DB_BUSY_TIMEOUT_MS / 1000,
+    check_same_thread=False,  # owned by one thread; closed from others only by reset_connections()
+    factory=_InstrumentedConnection if metrics.queries_instrumented() else _PooledConnection,
+  )
+  conn.row_factory = sqlite3.Row
+  conn.execute("PRAGMA journal_mode=WAL")
+  conn.execute("PRAGMA synchronous=NORMAL")
+  conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+  conn.execute(f"PRAGMA mmap_size={DB_MMAP_BYTES}")
+  conn.execute("PRAGMA temp_store=MEMORY")
+  conn.execute("PRAGMA foreign_keys=ON")
+  return conn
+
+def _discard_thread_conn() -> None:
+  conn = getattr(_local, "conn", None)
+  _local.conn = None
+  if conn is not None:
+    with _pool_lock:
+      _pool.discard(conn)
+    try:
+      conn.close()
+    except sqlite3.Error:
+      pass
+
+def _thread_conn() -> sqlite3.Connection:
+  conn = getattr(_local, "conn", None)
+  if conn is not None and (_local.generation != _pool_generation or _local.path != DB_PATH):
+    _discard_thread_conn()
+    conn = None
+  if conn is None:
+    _ensure_initialized()
+    conn = getattr(_local, "conn", None)  # opened by init on this thread
+  if conn is None:
+    conn = _open_conn()
+    _local.conn = conn
+    _local.generation = _pool_generation
+    _local.path = DB_PATH
+    _local.depth = 0
+    with _pool_lock:
+      _pool.add(conn)
+  return conn
+
+def _is_broken_conn_error(exc: BaseException) -> bool:
+  # Closed handles, or a plain DatabaseError (corrupt file, I/O error) - not
+  # constraint violations or "database is locked", which leave the handle usable.
+  return isinstance(exc, (sqlite3.ProgrammingError, sqlite3.InterfaceError)) or type(exc) is sqlite3.DatabaseError
+
 @contextmanager
 def get_conn():
-  DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-  conn = sqlite3.connect(str(DB_PATH))
-  conn.row_factory = sqlite3.Row
+  conn = _thread_conn()
+  outermost = _local.depth == 0
+  _local.depth += 1
   try:
     yield conn
-    conn.commit()
+    if outermost:
+      conn.commit()
+  except BaseException as exc:
+    if outermost:
+      try:
+        conn.rollback()
+      except sqlite3.Error:
+        pass
+      if _is_broken_conn_error(exc):
+        _local.depth = 0
+        _discard_thread_conn()
+    raise
   finally:
-    conn.close()
+    if getattr(_local, "conn", None) is conn:
+      _local.depth -= 1
+
+def reset_connections() -> None:
+  """Close every pooled connection; each thread reopens lazily on next use."""
+  global _pool_generation
+  with _pool_lock:
+    _pool_generation += 1
+    conns = list(_pool)
+    _pool.clear()
+  for conn in conns:
+    try:
+      conn.close()
+    except sqlite3.Error:
+      pass
+  _local.conn = None
+
+# Toggling metrics swaps the connection class, so reopen connections lazily.
+metrics.on_toggle(reset_connections)
+
+def check_db_health() -> Dict[str, Any]:
+  """
+  Ping the calling thread's connection, reopening it once if it is broken.
+  """
+  for attempt in range(2):
+    try:
+      with get_conn() as conn:
+        conn.execute("SELECT 1").fetchone()
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+      with _pool_lock:
+        open_connections = len(_pool)
+      return {
+        "status": "success",
+        "db_path": str(DB_PATH),
+        "journal_mode": journal_mode,
+        "open_connections": open_connections,
+        "reconnected": attempt > 0,
+      }
+    except sqlite3.Error as e:
+      _discard_thread_conn()
+      error = e
+  return {"status": "error", "error_message": f"Database unavailable: {error}"}
 
-def init_db_if_needed() -> None:
+# -------------------- Write transactions --------------------
+
+class _AbortTxn(Exception):
+  """Raised inside a write transaction to roll it back and return `result` instead."""
+
+  def __init__(self, result: Dict[str, Any]):
+    super().__init__(result.get("error_message", ""))
+    self.result = result
+
+@contextmanager
+def write_txn():
+  """
+  Explicit write transaction. BEGIN IMMEDIATE takes the write lock up front,
+  so reads made inside it cannot go stale before the writes land. Nested use
+  becomes a SAVEPOINT; any exception rolls back this block only. Only the
+  writer thread (and _run_write's inline fallback) opens one at top level;
+  everything else submits through _run_write.
+  """
   with get_conn() as conn:
-    conn.executescript(SCHEMA_SQL)
+    if conn.in_transaction:
+      conn.execute("SAVEPOINT write_txn")
+      try:
+        yield conn
+      except BaseException:
+        conn.execute("ROLLBACK TO write_txn")
+        conn.execute("RELEASE write_txn")
+        raise
+      conn.execute("RELEASE write_txn")
+    else:
+      conn.execute("BEGIN IMMEDIATE")
+      try:
+        yield conn
+      except BaseException:
+        conn.rollback()
+        raise
+
+def _commit_group(ops: List[writer.WriteOp]) -> None:
+  """
+  Writer-thread side of _run_write: run queued ops in one transaction, each
+  inside its own SAVEPOINT, and resolve their futures once the commit landed.
+  """
+  done: List[Any] = []
+  try:
+    with get_conn() as conn:
+      conn.execute("BEGIN IMMEDIATE")
+      for op in ops:
+        conn.execute("SAVEPOINT group_op")
+        try:
+          done.append((op, op.fn(conn, *op.args, **op.kwargs), None))
+        except _AbortTxn as e:
+          conn.execute("ROLLBACK TO group_op")
+          done.append((op, e.result, None))
+        except Exception as e:
+          if _is_broken_conn_error(e):
+            raise
+          conn.execute("ROLLBACK TO group_op")
+          done.append((op, None, e))
+        conn.execute("RELEASE group_op")
+  except Exception as e:
+    for op in ops:
+      op.future.set_exception(e)
+    return
+  for op, result, exc in done:
+    if exc is not None:
+      op.future.set_exception(exc)
+    else:
+      op.future.set_result(result)
+
+_writer = writer.Writer(_commit_group)
+
+def _run_write(fn, *args, **kwargs) -> Dict[str, Any]:
+  """
+  Run fn(conn, *args, **kwargs) in a write transaction; _AbortTxn rolls back
+  and returns its result. Goes through the writer thread (see writer.py)
+  unless it is disabled, or the caller is already inside a transaction (or is
+  the writer), in which case it runs inline to stay part of that transaction.
+  """
+  conn = getattr(_local, "conn", None)
+  if writer.WRITER_ENABLED and not _writer.on_writer_thread() and not (conn is not None and conn.in_transaction):
+    try:
+      return _writer.submit(fn, *args, **kwargs).result()
+    except writer.WriterBusy as e:
+      return {"status": "error", "error_message": str(e)}
+  try:
+    with write_txn() as conn:
+      return fn(conn, *args, **kwargs)
+  except _AbortTxn as e:
+    return e.result
+
+def write_queue_stats() -> Dict[str, Any]:
+  """Writer-thread counters: ops, batches (commits), avg/max batch size, rejected, queued."""
+  return {"status": "success", "enabled": writer.WRITER_ENABLED, **_writer.stats()}
+
+# Columns added after a table first shipped: CREATE TABLE IF NOT EXISTS will not
+# add them to an existing file. (table, column, definition, backfill SQL or None)
+_ADDED_COLUMNS = [
+  ("purchase_order_lines", "received_qty", "INTEGER NOT NULL DEFAULT 0",
+   "UPDATE purchase_order_lines SET received_qty = qty "
+   "WHERE po_id IN (SELECT id FROM purchase_orders WHERE status = 'RECEIVED')"),
+  # Last receipt in the ledger (receive_purchase_orders writes ref 'PO:<id>').
+  ("purchase_orders", "received_at", "TEXT",
+   "UPDATE purchase_orders SET received_at = m.at FROM ("
+   "  SELECT ref, MAX(created_at) AS at FROM stock_moves WHERE type = 'RECEIVE' AND ref LIKE 'PO:%' GROUP BY ref"
+   ") m WHERE m.ref = 'PO:' || purchase_orders.id AND purchase_orders.status = 'RECEIVED'"),
+]
+
+def _add_missing_columns(conn: sqlite3.Connection) -> None:
+  for table, column, definition, backfill in _ADDED_COLUMNS:
+    existing = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+      conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+      if backfill:
+        conn.execute(backfill)
+
+# DB path -> whether items_fts exists there.
+_search_index: Dict[str, bool] = {}
+
+def _ensure_search_index(conn: sqlite3.Connection) -> bool:
+  existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is not None
+  try:
+    conn.executescript(SEARCH_SQL)
+  except sqlite3.OperationalError:
+    return False
+  if not existed:
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+  return True
+
+_init_lock = threading.RLock()
+# DB paths init_db_if_needed has run against in this process.
+_initialized: Set[str] = set()
+
+def _ensure_analytics(conn: sqlite3.Connection) -> None:
+  existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'spend_monthly'").fetchone() is not None
+  conn.executescript(ANALYTICS_SQL)
+  if not existed:
+    _rebuild_analytics(conn)
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+  return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _restore_source() -> Optional[Path]:
+  for candidate in (DB_BACKUP_PATH, DB_SNAPSHOT):
+    if candidate and Path(candidate).is_file() and Path(candidate).stat().st_size > 0:
+      return Path(candidate)
+  return None
+
+def _copy_db(src_path: Path, dst_path: Path) -> None:
+  """Online copy with the SQLite backup API (consistent even while src is being written)."""
+  src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True)
+  dst = sqlite3.connect(str(dst_path))
+  try:
+    src.backup(dst)
+  finally:
+    dst.close()
+    src.close()
+
+def _migrate(conn: sqlite3.Connection, seed: bool = True) -> bool:
+  """
+  Apply the schema, migrations and (optionally) seed data to `conn` and stamp
+  SCHEMA_VERSION. Returns whether the full-text search index is available.
+  """
+  conn.executescript(SCHEMA_SQL)
+  _add_missing_columns(conn)
+  has_search = _ensure_search_index(conn)
+  _ensure_analytics(conn)
+  conn.executescript(CHANGE_LOG_SQL)
+  conn.executescript(AVAILABILITY_SQL)
+  conn.executescript(SNAPSHOT_SQL)
+  conn.execute(
+    "INSERT OR IGNORE INTO stock_snapshot_state (id, period_days, horizon) VALUES (1, ?, '')", (STOCK_SNAPSHOT_DAYS,),
+  )
+  if seed:
     conn.executescript(SEED_SQL)
+  _rebuild_on_order(conn)
+  _rebuild_low_stock(conn)
+  # Databases that had ISSUE moves before demand_weekly existed.
+  if not conn.execute("SELECT 1 FROM demand_weekly LIMIT 1").fetchone():
+    _rebuild_demand_weekly(conn)
+  conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+  return has_search
+
+def init_db_if_needed() -> Dict[str, Any]:
+  """
+  Bring DB_PATH up to SCHEMA_VERSION. A missing file is first restored from
+  DB_BACKUP_PATH or DB_SNAPSHOT; a file already at SCHEMA_VERSION is left as is,
+  so a warm start costs one PRAGMA instead of the schema and seed scripts.
+  """
+  with _init_lock:
+    _local.initializing = True
+    try:
+      restored = None
+      if not DB_PATH.exists() or DB_PATH.stat().st_size == 0:
+        source = _restore_source()
+        if source is not None:
+          DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+          for suffix in ("-wal", "-shm"):  # left over from a deleted file; would be replayed onto the copy
+            Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+          _copy_db(source, DB_PATH)
+          restored = str(source)
+      with get_conn() as conn:
+        version = _schema_version(conn)
+        if version != SCHEMA_VERSION:
+          _search_index[str(DB_PATH)] = _migrate(conn)
+      _initialized.add(str(DB_PATH))
+    finally:
+      _local.initializing = False
+  if DB_BACKUP_PATH:
+    maintenance.register("backup", DB_BACKUP_INTERVAL_S, _backup_task)
+  maintenance.register("compact_change_log", CHANGE_LOG_COMPACT_INTERVAL_S, compact_change_log)
+  maintenance.register("expire_reservations", RESERVATION_SWEEP_INTERVAL_S, expire_reservations)
+  # A freshly migrated ledger gets its checkpoints right away, off the request path.
+  maintenance.register("snapshot_stock", STOCK_SNAPSHOT_INTERVAL_S, snapshot_stock, run_immediately=version != SCHEMA_VERSION)
+  return {
+    "status": "success",
+    "db_path": str(DB_PATH),
+    "restored_from": restored,
+    "migrated_from": version if version != SCHEMA_VERSION else None,
+    "schema_version": SCHEMA_VERSION,
+  }
+
+def _ensure_initialized() -> None:
+  """Run init_db_if_needed once per DB_PATH, on the first connection any thread opens."""
+  if str(DB_PATH) in _initialized or getattr(_local, "initializing", False):
+    return
+  with _init_lock:
+    if str(DB_PATH) not in _initialized:
+      init_db_if_needed()
+
+def backup_to(path: str) -> Dict[str, Any]:
+  """
+  Online backup of DB_PATH to path. The copy is written next to path and
+  renamed into place, so a reader never sees a half-written file; in WAL mode
+  writers keep going while it runs.
+  """
+  target = Path(path).resolve()
+  if target == DB_PATH:
+    return {"status": "error", "error_message": "Backup path must differ from the database path."}
+  target.parent.mkdir(parents=True, exist_ok=True)
+  tmp = target.with_name(target.name + ".tmp")
+  start = time.perf_counter()
+  try:
+    with get_conn() as conn:
+      dst = sqlite3.connect(str(tmp))
+      try:
+        conn.backup(dst)
+      finally:
+        dst.close()
+    os.replace(tmp, target)
+  except (sqlite3.Error, OSError) as e:
+    tmp.unlink(missing_ok=True)
+    return {"status": "error", "error_message": f"Backup failed: {e}"}
+  return {
+    "status": "success",
+    "path": str(target),
+    "bytes": target.stat().st_size,
+    "seconds": round(time.perf_counter() - start, 3),
+  }
+
+def _backup_task() -> Dict[str, Any]:
+  result = backup_to(DB_BACKUP_PATH)
+  if result["status"] != "success":
+    raise RuntimeError(result["error_message"])  # recorded as last_error by maintenance
+  return result
+
+def restore_from(path: str) -> Dict[str, Any]:
+  """
+  Replace the contents of DB_PATH with the database at path (a snapshot or a
+  backup) and reopen every connection. Writes in flight are not merged.
+  """
+  source = Path(path).resolve()
+  if not source.is_file():
+    return {"status": "error", "error_message": f"No database file at {source}."}
+  if source == DB_PATH:
+    return {"status": "error", "error_message": "Restore source must differ from the database path."}
+  with _init_lock:
+    reset_connections()
+    try:
+      _copy_db(source, DB_PATH)
+    except sqlite3.Error as e:
+      return {"status": "error", "error_message": f"Restore failed: {e}"}
+    _initialized.discard(str(DB_PATH))
+    _search_index.pop(str(DB_PATH), None)
+    invalidate_catalog_cache()
+    result = init_db_if_needed()
+  return {**result, "restored_from": str(source)}
 
 def _now_iso() -> str:
   return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
+# Keeps IN (...) lists well under SQLite's bound-parameter limit.
+_IN_CHUNK = 500
+
+def _chunks(values: List[Any], size: int = _IN_CHUNK):
+  for i in range(0, len(values), size):
+    yield values[i:i + size]
+
+# -------------------- Pagination --------------------
+#
+# List endpoints page by keyset on id (not OFFSET), so any page - including
+# the first - costs the same regardless of table size.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _field_names(fields: Optional[List[str]], allowed: List[str]) -> List[str]:
+  """
+  Validate a requested field subset; id is always included since it is the
+  pagination cursor. Raises ValueError on unknown field names.
+  """
+  names = list(allowed) if not fields else ["id"] + [f for f in fields if f != "id"]
+  unknown = [f for f in names if f not in allowed]
+  if unknown:
+    raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}.")
+  return names
+
+def _projection(fields: Optional[List[str]], columns: Dict[str, str]) -> str:
+  """SELECT list for the requested fields from `columns` (output name -> SQL expr)."""
+  return ", ".join(f"{columns[f]} AS {f}" for f in _field_names(fields, list(columns)))
+
+def _clamp_limit(limit: Optional[int]) -> int:
+  return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+def to_columnar(rows: List[Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+  """
+  Column-oriented form of a list of dicts / sqlite3.Row: names once, then one
+  array per row. columns defaults to the keys of the first row.
+  """
+  if columns is None:
+    columns = list(rows[0].keys()) if rows else []
+  return {"columns": columns, "rows": [[r[c] for c in columns] for r in rows]}
+
+def _page_result(
+  key: str,
+  rows: List[Any],
+  limit: int,
+  total_hint: Optional[int],
+  columnar: bool = False,
+  columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+  """
+  Page envelope. With columnar, `key` holds row arrays and "columns" their
+  names (see to_columnar) instead of one dict per row.
+  """
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  result: Dict[str, Any] = {"status": "success"}
+  if columnar:
+    table = to_columnar(rows, columns)
+    result["columns"] = table["columns"]
+    result[key] = table["rows"]
+  else:
+    result[key] = [dict(r) for r in rows]
+  result["next_after_id"] = rows[-1]["id"] if has_more else None
+  result["total_hint"] = total_hint
+  return result
+
+# -------------------- Catalog cache --------------------
+#
+# items + suppliers change rarely, so they are cached in-process, keyed by
+# id, SKU and lower-cased name, with the supplier name already resolved.
+# catalog_version (bumped by trigger on any catalog write, from any
+# connection or process) is checked once per call; a mismatch reloads the
+# catalog. Only inventory numbers are read from the DB on every call.
+
+class _CatalogSnapshot:
+  __slots__ = ("db_path", "version", "ids", "by_id", "by_sku", "by_name", "suppliers_by_name")
+
+  def __init__(self, db_path: Path, version: int):
+    self.db_path = db_path
+    self.version = version
+    self.ids: List[int] = []
+    self.by_id: Dict[int, Dict[str, Any]] = {}
+    self.by_sku: Dict[str, Dict[str, Any]] = {}
+    self.by_name: Dict[str, Dict[str, Any]] = {}
+    self.suppliers_by_name: Dict[str, Dict[str, Any]] = {}
+
+  def lookup(self, name_or_sku: str) -> Optional[Dict[str, Any]]:
+    key = name_or_sku.lower()
+    return self.by_sku.get(key) or self.by_name.get(key)
+
+_catalog_lock = threading.Lock()
+_catalog_snapshot: Optional[_CatalogSnapshot] = None
+_catalog_stats = {"hits": 0, "misses": 0}
+
+def _load_catalog(conn: sqlite3.Connection, version: int) -> _CatalogSnapshot:
+  snap = _CatalogSnapshot(DB_PATH, version)
+  for r in conn.execute("SELECT id, name, email, phone FROM suppliers"):
+    snap.suppliers_by_name[r["name"].lower()] = dict(r)
+  for r in conn.execute("""
+    SELECT i.id, i.sku, i.name, i.unit, i.reorder_point, i.min_level, i.lead_time_days,
+           i.preferred_supplier_id, s.name AS supplier
+    FROM items i
+    LEFT JOIN suppliers s ON s.id = i.preferred_supplier_id
+    ORDER BY i.id
+  """):
+    item = dict(r)
+    snap.ids.append(item["id"])
+    snap.by_id[item["id"]] = item
+    snap.by_sku[item["sku"].lower()] = item
+    snap.by_name.setdefault(item["name"].lower(), item)
+  return snap
+
+def _catalog(conn: sqlite3.Connection) -> _CatalogSnapshot:
+  """Current catalog for `conn`, reloading it if catalog_version moved."""
+  global _catalog_snapshot
+  version = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+  snap = _catalog_snapshot
+  if snap is not None and snap.version == version and snap.db_path == DB_PATH:
+    with _catalog_lock:
+      _catalog_stats["hits"] += 1
+    return snap
+  with _catalog_lock:
+    _catalog_stats["misses"] += 1
+  snap = _load_catalog(conn, version)
+  # Inside a write transaction the catalog may hold uncommitted rows that
+  # could still roll back, so use the snapshot for this call only.
+  if not conn.in_transaction:
+    _catalog_snapshot = snap
+  return snap
+
+def invalidate_catalog_cache() -> None:
+  global _catalog_snapshot
+  _catalog_snapshot = None
+
+def catalog_cache_stats() -> Dict[str, Any]:
+  snap = _catalog_snapshot
+  with _catalog_lock:
+    stats = dict(_catalog_stats)
+  total = stats["hits"] + stats["misses"]
+  stats["hit_rate"] = round(stats["hits"] / total, 4) if total else None
+  stats["version"] = snap.version if snap else None
+  stats["items"] = len(snap.ids) if snap else 0
+  stats["suppliers"] = len(snap.suppliers_by_name) if snap else 0
+  return stats
+
 # -------------------- Items / Inventory --------------------
 
+_ITEM_FIELDS = [
+  "id", "sku", "name", "unit", "reorder_point", "min_level", "lead_time_days",
+  "supplier", "on_hand", "reserved", "updated_at",
+]
+_NO_STOCK = {"on_hand": None, "reserved": None, "updated_at": None}
+
+def _stock_by_item(conn: sqlite3.Connection, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+  stock: Dict[int, Dict[str, Any]] = {}
+  for chunk in _chunks(item_ids):
+    for r in conn.execute(
+      f"SELECT item_id, on_hand, reserved, updated_at FROM inventory WHERE item_id IN ({','.join('?' * len(chunk))})",
+      chunk,
+    ):
+      stock[r["item_id"]] = {"on_hand": r["on_hand"], "reserved": r["reserved"], "updated_at": r["updated_at"]}
+  return stock
+
+def _item_row(item: Dict[str, Any], stock: Optional[Dict[str, Any]], fields: List[str]) -> Dict[str, Any]:
+  merged = {**item, **(stock or _NO_STOCK)}
+  return {f: merged[f] for f in fields}
+
 def list_items() -> List[Dict[str, Any]]:
   with get_conn() as conn:
-    rows = conn.execute("""
-      SELECT i.id, i.sku, i.name, i.unit, i.reorder_point, i.min_level, i.lead_time_days,
-             s.name AS supplier,
-             inv.on_hand, inv.reserved, inv.updated_at
-      FROM items i
-      LEFT JOIN suppliers s ON s.id = i.preferred_supplier_id
-      LEFT JOIN inventory inv ON inv.item_id = i.id
-      ORDER BY i.id
-    """).fetchall()
-    return [dict(r) for r in rows]
+    cat = _catalog(conn)
+    stock = {
+      r["item_id"]: {"on_hand": r["on_hand"], "reserved": r["reserved"], "updated_at": r["updated_at"]}
+      for r in conn.execute("SELECT item_id, on_hand, reserved, updated_at FROM inventory")
+    }
+    return [_item_row(cat.by_id[i], stock.get(i), _ITEM_FIELDS) for i in cat.ids]
+
+def list_items_page(
+  limit: int = DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  fields: Optional[List[str]] = None,
+  columnar: bool = False,
+) -> Dict[str, Any]:
+  """
+  One page of catalog items ordered by id, starting after `after_id`.
+  fields: optional subset of _ITEM_FIELDS to return (id is always included).
+  total_hint is the exact item count (known from the catalog cache).
+  columnar: return {"columns": [...], "items": [[...], ...]} instead of dicts.
+  """
+  try:
+    names = _field_names(fields, _ITEM_FIELDS)
+  except ValueError as e:
+    return {"status": "error", "error_message": str(e)}
+  limit = _clamp_limit(limit)
+  with get_conn() as conn:
+    cat = _catalog(conn)
+    start = bisect.bisect_right(cat.ids, int(after_id or 0))
+    page_ids = cat.ids[start:start + limit + 1]
+    stock = _stock_by_item(conn, page_ids[:limit])
+  rows = [_item_row(cat.by_id[i], stock.get(i), names) for i in page_ids]
+  return _page_result("items", rows, limit, len(cat.ids), columnar, names)
 
 def get_item_by_name_or_sku(name_or_sku: str) -> Optional[Dict[str, Any]]:
+  """One item with its stock, on_order and available (on_hand - reserved + on_order, as in list_low_stock)."""
+  with get_conn() as conn:
+    item = _catalog(conn).lookup(name_or_sku)
+    if not item:
+      return None
+    stock = _stock_by_item(conn, [item["id"]]).get(item["id"])
+    if stock is None:
+      return {**item, **_NO_STOCK, "on_order": None, "available": None}
+    row = conn.execute("SELECT qty FROM on_order WHERE item_id = ?", (item["id"],)).fetchone()
+    on_order = row[0] if row else 0
+    return {**item, **stock, "on_order": on_order, "available": stock["on_hand"] - stock["reserved"] + on_order}
+
+def get_items_by_name_or_sku(names_or_skus: List[str]) -> Dict[str, Any]:
+  """
+  Resolve many exact SKUs / names at once (same matching as
+  get_item_by_name_or_sku): keys are looked up in the catalog cache and
+  stock is read with one IN query. Returns {"items": [...], "unresolved": [...]},
+  both in request order; each item carries the "key" it was requested by.
+  """
+  keys = [k for k in dict.fromkeys(str(k).strip() for k in names_or_skus) if k]
   with get_conn() as conn:
-    r = conn.execute("""
-      SELECT i.id, i.sku, i.name, i.unit, i.reorder_point, i.min_level, i.lead_time_days,
-             i.preferred_supplier_id, s.name AS supplier,
-             inv.on_hand, inv.reserved, inv.updated_at
-      FROM items i
-      LEFT JOIN suppliers s ON s.id = i.preferred_supplier_id
-      LEFT JOIN inventory inv ON inv.item_id = i.id
-      WHERE lower(i.sku)=lower(?) OR lower(i.name)=lower(?)
-      LIMIT 1
-    """, (name_or_sku, name_or_sku)).fetchone()
-    return dict(r) if r else None
+    found = _resolve_items(conn, keys)
+    stock = _stock_by_item(conn, list({item["id"] for item in found.values()}))
+  items, unresolved = [], []
+  for k in keys:
+    item = found.get(k.lower())
+    if item is None:
+      unresolved.append(k)
+    else:
+      items.append({"key": k, **item, **(stock.get(item["id"]) or _NO_STOCK)})
+  return {"items": items, "unresolved": unresolved}
+
+def _has_search_index(conn: sqlite3.Connection) -> bool:
+  key = str(DB_PATH)
+  if key not in _search_index:
+    _search_index[key] = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is not None
+  return _search_index[key]
+
+def _search_words(query: str) -> List[List[str]]:
+  """
+  One group per word of the query: the lower-cased word plus a crude singular
+  ("cans" -> "can", Hebrew plural -ים / -ות dropped), so plurals still hit
+  singular item names.
+  """
+  groups: List[List[str]] = []
+  for word in dict.fromkeys(re.findall(r"\w+", query.lower())):
+    group = [word]
+    for suffix in ("es", "s", "ים", "ות"):
+      if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+        group.append(word[:-len(suffix)])
+        break
+    groups.append(group)
+  return groups
+
+def _fts_phrase(terms: List[str]) -> str:
+  return "(" + " OR ".join('"' + t.replace('"', '""') + '"' for t in terms) + ")"
+
+# Candidates fetched per FTS query before ranking. Ranking happens in Python
+# on the candidates: bm25() needs statistics over every match and costs
+# ~100 ms for a word that occurs in most of a 100k-item catalog.
+_SEARCH_CANDIDATES = 200
+
+def _search_score(item: Dict[str, Any], groups: List[List[str]]) -> float:
+  sku, name = item["sku"].lower(), item["name"].lower()
+  score = 0.0
+  for group in groups:
+    if any(t in sku for t in group):
+      score += 3 if sku.startswith(group[0]) or sku == group[0] else 2
+    elif any(t in name for t in group):
+      score += 2 if re.search(r"(^|\W)" + re.escape(group[-1]), name) else 1
+  return score
+
+def search_items(query: str, k: int = 10) -> List[Dict[str, Any]]:
+  """
+  Top-k items whose SKU or name contains words of `query` (substring,
+  case-insensitive, plurals folded), best first: an exact SKU/name match, then
+  items matching more words, SKU hits over name hits, word starts over
+  mid-word hits, shorter names first.
+  Uses the trigram index (every word first, then any word); words under
+  3 characters, or a SQLite without FTS5, fall back to a LIKE scan.
+  """
+  k = max(1, min(int(k or 10), MAX_PAGE_SIZE))
+  groups = _search_words(query)
+  if not groups:
+    return []
+  cap = max(_SEARCH_CANDIDATES, 20 * k)
+  with get_conn() as conn:
+    cat = _catalog(conn)
+    exact = cat.lookup(query.strip())
+    indexed = [g for g in groups if len(g[-1]) >= 3]
+    ids: Dict[int, None] = {}
+    if indexed and _has_search_index(conn):
+      fts = "SELECT rowid FROM items_fts WHERE items_fts MATCH ? LIMIT ?"
+      ids.update((r[0], None) for r in conn.execute(fts, (" AND ".join(_fts_phrase(g) for g in indexed), cap)))
+      if len(ids) < k and len(indexed) > 1:
+        for g in indexed:
+          ids.update((r[0], None) for r in conn.execute(fts, (_fts_phrase(g), cap)))
+    else:
+      terms = [t for g in groups for t in g]
+      like = " OR ".join("sku LIKE ? OR name LIKE ?" for _ in terms)
+      params = [f"%{t}%" for t in terms for _ in (0, 1)]
+      ids.update((r[0], None) for r in conn.execute(f"SELECT id FROM items WHERE {like} LIMIT ?", (*params, cap)))
+    scored = sorted(
+      ((_search_score(cat.by_id[i], groups), i) for i in ids if i in cat.by_id),
+      key=lambda p: (-p[0], len(cat.by_id[p[1]]["name"]), p[1]),
+    )
+    if exact:
+      scored = [(float("inf"), exact["id"])] + [p for p in scored if p[1] != exact["id"]]
+    scored = scored[:k]
+    stock = _stock_by_item(conn, [i for _, i in scored])
+  fields = ["id", "sku", "name", "unit", "supplier", "on_hand", "reorder_point"]
+  return [
+    {**_item_row(cat.by_id[i], stock.get(i), fields), "exact": score == float("inf"), "score": None if score == float("inf") else score}
+    for score, i in scored
+  ]
+
+def _rebuild_search_index_txn(conn: sqlite3.Connection) -> Dict[str, Any]:
+  if not _has_search_index(conn):
+    return {"status": "error", "error_message": "Full-text search (FTS5 trigram) is not available in this SQLite build."}
+  conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+  return {"status": "success", "indexed_items": conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]}
+
+def rebuild_search_index() -> Dict[str, Any]:
+  """Repopulate items_fts from items (e.g. after bulk edits with triggers off)."""
+  return _run_write(_rebuild_search_index_txn)
+
+def _rebuild_demand_weekly(conn: sqlite3.Connection) -> int:
+  conn.execute("DELETE FROM demand_weekly")
+  return conn.execute("""
+    INSERT INTO demand_weekly (item_id, week, qty)
+    SELECT item_id, CAST((julianday(created_at) - 2440587.5) / 7 AS INTEGER) AS week, SUM(ABS(qty))
+    FROM stock_moves
+    WHERE type = 'ISSUE'
+    GROUP BY item_id, week
+  """).rowcount
+
+def _rebuild_demand_weekly_txn(conn: sqlite3.Connection) -> Dict[str, Any]:
+  return {"status": "success", "demand_weeks": _rebuild_demand_weekly(conn)}
+
+def rebuild_demand_weekly() -> Dict[str, Any]:
+  """Recompute the weekly demand rollup from stock_moves."""
+  return _run_write(_rebuild_demand_weekly_txn)
+
+def _rebuild_analytics(conn: sqlite3.Connection) -> Dict[str, int]:
+  conn.execute("DELETE FROM spend_monthly")
+  conn.execute("DELETE FROM open_po_aging")
+  conn.execute("DELETE FROM lead_time_stats")
+  counts = {}
+  counts["spend_months"] = conn.execute("""
+    INSERT INTO spend_monthly (supplier_id, month, po_count, ordered_qty, ordered_amount, received_qty, received_amount)
+    SELECT po.supplier_id, substr(po.created_at, 1, 7) AS month, COUNT(DISTINCT po.id),
+           COALESCE(SUM(pol.qty), 0), COALESCE(SUM(pol.qty * COALESCE(pol.unit_price, 0)), 0),
+           COALESCE(SUM(pol.received_qty), 0), COALESCE(SUM(pol.received_qty * COALESCE(pol.unit_price, 0)), 0)
+    FROM purchase_orders po
+    LEFT JOIN purchase_order_lines pol ON pol.po_id = po.id
+    WHERE po.status != 'CANCELLED'
+    GROUP BY po.supplier_id, month
+  """).rowcount
+  counts["open_po_days"] = conn.execute("""
+    INSERT INTO open_po_aging (supplier_id, created_day, expected_day, po_count, outstanding_qty, outstanding_amount)
+    SELECT po.supplier_id, substr(po.created_at, 1, 10) AS created_day, COALESCE(substr(po.expected_at, 1, 10), '') AS expected_day,
+           COUNT(DISTINCT po.id), COALESCE(SUM(pol.qty - pol.received_qty), 0),
+           COALESCE(SUM((pol.qty - pol.received_qty) * COALESCE(pol.unit_price, 0)), 0)
+    FROM purchase_orders po
+    LEFT JOIN purchase_order_lines pol ON pol.po_id = po.id
+    WHERE po.status IN ('DRAFT', 'PLACED')
+    GROUP BY po.supplier_id, created_day, expected_day
+  """).rowcount
+  # A line's receipt date is its last ledger receipt, else the PO's received_at.
+  counts["lead_time_pairs"] = conn.execute("""
+    WITH moves AS (
+      SELECT ref, item_id, MAX(created_at) AS at FROM stock_moves
+      WHERE type = 'RECEIVE' AND ref LIKE 'PO:%' GROUP BY ref, item_id
+    ), receipts AS (
+      SELECT po.supplier_id, pol.item_id, i.lead_time_days AS promised,
+             julianday(COALESCE(m.at, po.received_at)) - julianday(po.created_at) AS actual
+      FROM purchase_order_lines pol
+      JOIN purchase_orders po ON po.id = pol.po_id
+      JOIN items i ON i.id = pol.item_id
+      LEFT JOIN moves m ON m.ref = 'PO:' || pol.po_id AND m.item_id = pol.item_id
+      WHERE pol.received_qty >= pol.qty AND COALESCE(m.at, po.received_at) IS NOT NULL
+    )
+    INSERT INTO lead_time_stats (supplier_id, item_id, receipts, actual_days_sum, promised_days_sum, abs_error_days_sum, late)
+    SELECT supplier_id, item_id, COUNT(*), SUM(actual), SUM(promised), SUM(ABS(actual - promised)), SUM(actual > promised)
+    FROM receipts
+    GROUP BY supplier_id, item_id
+  """).rowcount
+  return counts
+
+def _rebuild_analytics_txn(conn: sqlite3.Connection) -> Dict[str, Any]:
+  return {"status": "success", **_rebuild_analytics(conn)}
+
+def rebuild_analytics() -> Dict[str, Any]:
+  """Recompute the spend / open-PO aging / lead-time rollups from the PO tables (backfills)."""
+  return _run_write(_rebuild_analytics_txn)
+
+# -------------------- Change feed --------------------
+
+_CHANGE_COLUMNS = ["seq", "entity", "entity_id", "op", "data", "created_at"]
+_CHANGE_ENTITIES = ("inventory", "purchase_order")
+
+def changes_since(seq: int = 0, limit: int = DEFAULT_PAGE_SIZE, entities: Optional[List[str]] = None) -> Dict[str, Any]:
+  """
+  Inventory / PO changes with seq > `seq`, oldest first, at most `limit` rows,
+  columnar. Within a page only the latest change per entity is kept. Pass
+  next_seq back as seq to continue. reset=True means changes after `seq` were
+  dropped by retention: reload the full lists, then continue from next_seq.
+  """
+  if entities and not set(entities) <= set(_CHANGE_ENTITIES):
+    return {"status": "error", "error_message": f"Unknown entity. Use any of: {', '.join(_CHANGE_ENTITIES)}."}
+  limit = _clamp_limit(limit)
+  seq = max(0, int(seq))
+  with get_conn() as conn:
+    horizon = conn.execute("SELECT horizon_seq FROM change_log_state WHERE id = 1").fetchone()[0]
+    latest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    latest = max(latest, horizon)
+    if seq < horizon:
+      return {"status": "success", "reset": True, "columns": _CHANGE_COLUMNS, "changes": [],
+              "next_seq": latest, "latest_seq": latest, "has_more": False}
+    wanted = list(entities or _CHANGE_ENTITIES)
+    rows = conn.execute(f"""
+      SELECT seq, entity, entity_id, op, data, created_at FROM change_log
+      WHERE seq > ? AND entity IN ({','.join('?' * len(wanted))})
+      ORDER BY seq
+      LIMIT ?
+    """, (seq, *wanted, limit + 1)).fetchall()
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  next_seq = rows[-1]["seq"] if rows else latest
+  newest: Dict[tuple, Dict[str, Any]] = {}
+  for r in rows:
+    newest.pop((r["entity"], r["entity_id"]), None)  # re-insert so dict order follows the latest seq
+    newest[(r["entity"], r["entity_id"])] = {**dict(r), "data": json.loads(r["data"]) if r["data"] else None}
+  return {
+    "status": "success",
+    "reset": False,
+    "columns": _CHANGE_COLUMNS,
+    "changes": to_columnar(list(newest.values()), _CHANGE_COLUMNS)["rows"],
+    "next_seq": next_seq,
+    "latest_seq": latest,
+    "has_more": has_more,
+  }
+
+def _compact_change_log_txn(conn: sqlite3.Connection, cutoff: str) -> Dict[str, Any]:
+  superseded = conn.execute("""
+    DELETE FROM change_log WHERE seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY entity, entity_id)
+  """).rowcount
+  overflow = conn.execute(
+    "SELECT seq FROM change_log ORDER BY seq DESC LIMIT 1 OFFSET ?", (max(0, CHANGE_LOG_MAX_ROWS),)
+  ).fetchone()
+  horizon = conn.execute(
+    "SELECT MAX(seq) FROM change_log WHERE created_at < ? OR seq <= ?", (cutoff, overflow[0] if overflow else 0)
+  ).fetchone()[0]
+  expired = 0
+  if horizon is not None:
+    expired = conn.execute("DELETE FROM change_log WHERE seq <= ?", (horizon,)).rowcount
+    conn.execute("UPDATE change_log_state SET horizon_seq = MAX(horizon_seq, ?) WHERE id = 1", (horizon,))
+  remaining = conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+  return {"status": "success", "superseded": superseded, "expired": expired, "remaining": remaining}
+
+def compact_change_log() -> Dict[str, Any]:
+  """
+  Keep only the latest row per entity (safe for every client: the dropped rows
+  are superseded), then apply retention: rows older than
+  CHANGE_LOG_RETENTION_DAYS or beyond CHANGE_LOG_MAX_ROWS are dropped and the
+  horizon moves past them. Registered as the "compact_change_log" maintenance
+  task; runs on the writer like every other write.
+  """
+  cutoff = (datetime.utcnow() - timedelta(days=CHANGE_LOG_RETENTION_DAYS)).isoformat(timespec="seconds") + "Z"
+  return _run_write(_compact_change_log_txn, cutoff)
+
+# Ad-hoc definition of low stock; low_stock must always equal this. Open PO
+# quantity is aggregated once over all open lines, not looked up per item.
+_LOW_STOCK_SQL = """
+  SELECT inv.item_id, i.reorder_point - (inv.on_hand - inv.reserved + COALESCE(oo.qty, 0)) AS shortage
+  FROM inventory inv
+  JOIN items i ON i.id = inv.item_id
+  LEFT JOIN (
+    SELECT pol.item_id, SUM(pol.qty - pol.received_qty) AS qty
+    FROM purchase_order_lines pol
+    JOIN purchase_orders po ON po.id = pol.po_id
+    WHERE po.status IN ('DRAFT', 'PLACED')
+    GROUP BY pol.item_id
+  ) oo ON oo.item_id = inv.item_id
+  WHERE inv.on_hand - inv.reserved + COALESCE(oo.qty, 0) <= i.reorder_point
+"""
+
+_LOW_STOCK_FIELDS = [
+  "id", "sku", "name", "unit", "reorder_point", "min_level", "lead_time_days", "supplier",
+  "on_hand", "reserved", "on_order", "available",
+]
 
 def list_low_stock() -> List[Dict[str, Any]]:
+  """
+  Items whose available-to-promise (available = on_hand - reserved + on_order,
+  on_order = open PO quantity) is <= reorder_point, largest shortage first
+  (read from low_stock).
+  """
   with get_conn() as conn:
     rows = conn.execute("""
-      SELECT i.id, i.sku, i.name, i.unit, i.reorder_point, i.min_level, i.lead_time_days,
-             s.name AS supplier,
-             inv.on_hand, inv.reserved
-      FROM items i
-      JOIN inventory inv ON inv.item_id = i.id
-      LEFT JOIN suppliers s ON s.id = i.preferred_supplier_id
-      WHERE inv.on_hand <= i.reorder_point
-      ORDER BY (i.reorder_point - inv.on_hand) DESC
+      SELECT ls.item_id, inv.on_hand, inv.reserved, COALESCE(oo.qty, 0) AS on_order,
+             inv.on_hand - inv.reserved + COALESCE(oo.qty, 0) AS available
+      FROM low_stock ls
+      JOIN inventory inv ON inv.item_id = ls.item_id
+      LEFT JOIN on_order oo ON oo.item_id = ls.item_id
+      ORDER BY ls.shortage DESC, ls.item_id
     """).fetchall()
-    return [dict(r) for r in rows]
+    # Catalog after the rows: an item added before the read has already bumped
+    # catalog_version, so it is reloaded; one deleted since is skipped.
+    cat = _catalog(conn)
+  return [_item_row(cat.by_id[r["item_id"]], dict(r), _LOW_STOCK_FIELDS) for r in rows if r["item_id"] in cat.by_id]
+
+def _rebuild_on_order(conn: sqlite3.Connection) -> int:
+  conn.execute("DELETE FROM on_order")
+  return conn.execute("""
+    INSERT INTO on_order (item_id, qty)
+    SELECT pol.item_id, SUM(pol.qty - pol.received_qty)
+    FROM purchase_order_lines pol
+    JOIN purchase_orders po ON po.id = pol.po_id
+    WHERE po.status IN ('DRAFT', 'PLACED')
+    GROUP BY pol.item_id
+  """).rowcount
+
+def _rebuild_low_stock(conn: sqlite3.Connection) -> int:
+  conn.execute("DELETE FROM low_stock")
+  return conn.execute(f"INSERT INTO low_stock (item_id, shortage) {_LOW_STOCK_SQL}").rowcount
+
+def _rebuild_low_stock_txn(conn: sqlite3.Connection) -> Dict[str, Any]:
+  on_order = _rebuild_on_order(conn)
+  return {"status": "success", "low_stock_items": _rebuild_low_stock(conn), "on_order_items": on_order}
+
+def rebuild_low_stock() -> Dict[str, Any]:
+  """Recompute on_order and low_stock from the PO lines, inventory and items (e.g. after bulk edits with triggers off)."""
+  return _run_write(_rebuild_low_stock_txn)
+
+def check_low_stock_consistency() -> Dict[str, Any]:
+  """Compare low_stock with the ad-hoc query; lists item ids that differ."""
+  with get_conn() as conn:
+    expected = {r["item_id"]: r["shortage"] for r in conn.execute(_LOW_STOCK_SQL)}
+    actual = {r["item_id"]: r["shortage"] for r in conn.execute("SELECT item_id, shortage FROM low_stock")}
+  missing = sorted(set(expected) - set(actual))
+  extra = sorted(set(actual) - set(expected))
+  wrong = sorted(i for i in set(expected) & set(actual) if expected[i] != actual[i])
+  return {
+    "status": "success",
+    "consistent": not (missing or extra or wrong),
+    "low_stock_items": len(expected),
+    "missing_item_ids": missing,
+    "extra_item_ids": extra,
+    "wrong_shortage_item_ids": wrong,
+  }
 
 def recommend_order_quantities() -> List[Dict[str, Any]]:
   """
   MVP policy:
     target = reorder_point + min_level
-    order_qty = max(0, target - on_hand)
+    order_qty = max(0, target - available)
+  available = on_hand - reserved + on_order: reserved quantity counts as
+  demand to replenish, and quantity already on open POs is not ordered again.
   """
   low = list_low_stock()
   recs: List[Dict[str, Any]] = []
   for x in low:
     target = int(x["reorder_point"]) + int(x["min_level"])
-    on_hand = int(x["on_hand"] or 0)
-    qty = max(0, target - on_hand)
+    available = int(x["available"])
+    qty = max(0, target - available)
     if qty > 0:
       recs.append({
         "sku": x["sku"],
         "name": x["name"],
         "unit": x["unit"],
-        "on_hand": on_hand,
+        "on_hand": int(x["on_hand"]),
+        "reserved": int(x["reserved"]),
+        "on_order": int(x["on_order"]),
+        "available": available,
         "reorder_point": int(x["reorder_point"]),
         "min_level": int(x["min_level"]),
         "recommended_qty": qty,
@@ -183,8 +1710,421 @@ def recommend_order_quantities() -> List[Dict[str, Any]]:
       })
   return recs
 
+# -------------------- Reservations --------------------
+
+class _ShortStock(Exception):
+  pass
+
+def _reserve_stock_txn(conn: sqlite3.Connection, lines: List[Dict[str, Any]], ref: str, ttl_minutes: float) -> Dict[str, Any]:
+  if not lines:
+    raise _AbortTxn({"status": "error", "error_message": "No lines given."})
+  error = _line_error(lines, "Reservation")
+  if error is None and ref is not None and not isinstance(ref, str):
+    error = "ref must be text."
+  if error is None and ttl_minutes is not None and not isinstance(ttl_minutes, (int, float)):
+    error = "ttl_minutes must be a number."
+  if error:
+    raise _AbortTxn({"status": "error", "error_message": error})
+  items = _resolve_items(conn, [ln["sku_or_name"] for ln in lines])
+  missing_items = sorted({ln["sku_or_name"] for ln in lines if ln["sku_or_name"].lower() not in items})
+  if len(missing_items) == 1:
+    raise _AbortTxn({"status": "error", "error_message": f"Item '{missing_items[0]}' not found."})
+  if missing_items:
+    raise _AbortTxn({"status": "error", "error_message": f"Items not found: {', '.join(missing_items)}."})
+  bad = [ln["sku_or_name"] for ln in lines if int(ln["qty"]) <= 0]
+  if bad:
+    raise _AbortTxn({"status": "error", "error_message": f"Quantity must be positive (item '{bad[0]}')."})
+
+  want: Dict[int, int] = {}
+  for ln in lines:
+    item_id = items[ln["sku_or_name"].lower()]["id"]
+    want[item_id] = want.get(item_id, 0) + int(ln["qty"])
+  now = _now_iso()
+  # The availability check is part of each UPDATE, so two callers can never
+  # both take the last units. On a shortfall, roll back to the savepoint and
+  # only then read what is available, for the error message.
+  try:
+    with write_txn():
+      updated = 0
+      for chunk in _chunks(list(want.items())):
+        updated += conn.execute(f"""
+          UPDATE inventory SET reserved = reserved + r.qty, updated_at = ?
+          FROM (SELECT column1 AS item_id, column2 AS qty FROM (VALUES {','.join(['(?, ?)'] * len(chunk))})) r
+          WHERE inventory.item_id = r.item_id AND inventory.on_hand - inventory.reserved >= r.qty
+        """, [now, *(v for pair in chunk for v in pair)]).rowcount
+      if updated != len(want):
+        raise _ShortStock()
+  except _ShortStock:
+    stock = _stock_by_item(conn, list(want))
+    by_id = _catalog(conn).by_id
+    short = []
+    for item_id, qty in want.items():
+      s = stock.get(item_id)
+      available = s["on_hand"] - s["reserved"] if s else 0
+      if available < qty:
+        short.append({"sku": by_id[item_id]["sku"], "requested": qty, "available": available})
+    raise _AbortTxn({
+      "status": "error",
+      "error_message": f"Not enough stock for {', '.join(x['sku'] for x in short)}; nothing was reserved.",
+      "short": short,
+    })
+
+  expires_at = None
+  if ttl_minutes and ttl_minutes > 0:
+    expires_at = (datetime.utcnow() + timedelta(minutes=ttl_minutes)).isoformat(timespec="seconds") + "Z"
+  by_id = _catalog(conn).by_id
+  reservations = []
+  for item_id, qty in want.items():
+    reservation_id = conn.execute(
+      "INSERT INTO stock_reservations (item_id, qty, ref, status, created_at, expires_at) VALUES (?, ?, ?, 'ACTIVE', ?, ?)",
+      (item_id, qty, ref or None, now, expires_at),
+    ).lastrowid
+    reservations.append({"reservation_id": reservation_id, "sku": by_id[item_id]["sku"], "qty": qty})
+  return {"status": "success", "ref": ref or None, "expires_at": expires_at, "reservations": reservations}
+
+def reserve_stock(lines: List[Dict[str, Any]], ref: str = "", ttl_minutes: float = RESERVATION_TTL_MINUTES) -> Dict[str, Any]:
+  """
+  Reserve stock for many items in one transaction (all or nothing).
+  lines: [{"sku_or_name": "...", "qty": 3}, ...]; repeated items are summed.
+  Each item needs on_hand - reserved >= qty; otherwise nothing is reserved and
+  "short" lists what is missing. Reservations expire after ttl_minutes (0 =
+  never) unless released first. ref tags them for release_reservations(ref=...).
+  """
+  return _run_write(_reserve_stock_txn, lines, ref, ttl_minutes)
+
+def _release_txn(conn: sqlite3.Connection, where: str, params: List[Any], status: str) -> Dict[str, Any]:
+  """Give ACTIVE reservations matching `where` back to inventory and mark them `status`."""
+  now = _now_iso()
+  items = conn.execute(f"""
+    UPDATE inventory SET reserved = reserved - r.qty, updated_at = ?
+    FROM (
+      SELECT item_id, SUM(qty) AS qty FROM stock_reservations
+      WHERE status = 'ACTIVE' AND {where} GROUP BY item_id
+    ) r
+    WHERE inventory.item_id = r.item_id
+  """, [now, *params]).rowcount
+  released = conn.execute(
+    f"UPDATE stock_reservations SET status = ?, released_at = ? WHERE status = 'ACTIVE' AND {where}",
+    [status, now, *params],
+  ).rowcount
+  return {"status": "success", "released": released, "items": items}
+
+def _release_reservations_txn(conn: sqlite3.Connection, reservation_ids: List[int], ref: str) -> Dict[str, Any]:
+  if ref:
+    return _release_txn(conn, "ref = ?", [ref], "RELEASED")
+  released = items = 0
+  for chunk in _chunks([int(i) for i in reservation_ids]):
+    r = _release_txn(conn, f"id IN ({','.join('?' * len(chunk))})", chunk, "RELEASED")
+    released += r["released"]
+    items += r["items"]
+  return {"status": "success", "released": released, "items": items}
+
+def release_reservations(reservation_ids: Optional[List[int]] = None, ref: str = "") -> Dict[str, Any]:
+  """
+  Release ACTIVE reservations by id or by ref, in one transaction. Ids that
+  are unknown or no longer active are ignored; "released" counts the rest.
+  """
+  if not reservation_ids and not ref:
+    return {"status": "error", "error_message": "Give reservation_ids or ref."}
+  return _run_write(_release_reservations_txn, reservation_ids or [], ref)
+
+def expire_reservations() -> Dict[str, Any]:
+  """Release every ACTIVE reservation past its expires_at. Registered as the "expire_reservations" maintenance task."""
+  return _run_write(_release_txn, "expires_at <= ?", [_now_iso()], "EXPIRED")
+
+# -------------------- Stock history --------------------
+#
+# On hand at time T = on hand now - (ledger now - ledger before T), so stock
+# that never went through the ledger (seed data, inventory imports) counts as
+# opening balance. Each ledger sum starts from the nearest checkpoint in
+# stock_snapshots and adds only the moves after it.
+
+_SIGNED_QTY = "CASE WHEN m.type = 'ISSUE' THEN -ABS(m.qty) ELSE m.qty END"
+_LEDGER_END = "9999"  # sorts after every created_at
+_EPOCH = datetime(1970, 1, 1)
+_BOUNDARY_FORMAT = "%Y-%m-%dT00:00:00Z"
+# Periods checkpointed per write transaction, so a first run over a long
+# ledger does not hold the write lock for the whole backfill.
+_SNAPSHOT_BATCH_PERIODS = 30
+MAX_HISTORY_POINTS = 1000
+
+def _floor_boundary(at: datetime, period_days: int) -> datetime:
+  return _EPOCH + timedelta(days=(at - _EPOCH).days // period_days * period_days)
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+  """YYYY-MM-DD as the end of that day (the exclusive upper bound of the moves it covers)."""
+  try:
+    return datetime.strptime(str(value or "").strip(), "%Y-%m-%d") + timedelta(days=1)
+  except ValueError:
+    return None
+
+def _parse_as_of(value: str) -> Optional[datetime]:
+  """A date (see _parse_date) or an ISO timestamp (UTC unless it has an offset), as an exclusive bound."""
+  end_of_day = _parse_date(value)
+  if end_of_day is not None:
+    return end_of_day
+  try:
+    at = datetime.fromisoformat(str(value or "").strip().replace("Z", "+00:00"))
+  except ValueError:
+    return None
+  if at.tzinfo is not None:
+    at = at.astimezone(timezone.utc).replace(tzinfo=None)
+  return at.replace(microsecond=0) + timedelta(seconds=1)
+
+def _iso(at: datetime) -> str:
+  return at.isoformat(timespec="seconds") + "Z"
+
+def _snapshot_state(conn: sqlite3.Connection) -> sqlite3.Row:
+  return conn.execute("SELECT period_days, horizon FROM stock_snapshot_state WHERE id = 1").fetchone()
+
+def _ledger_at(conn: sqlite3.Connection, item_ids: List[int], before: str) -> Dict[int, Dict[str, Any]]:
+  """
+  Ledger balance over moves with created_at < before, per item: the latest
+  checkpoint at or before `before` plus the moves since it. Returns
+  {item_id: {"qty", "checkpoint", "moves"}}; moves = ledger rows read.
+  """
+  out: Dict[int, Dict[str, Any]] = {}
+  for chunk in _chunks(item_ids):
+    rows = conn.execute(f"""
+      SELECT c.item_id, c.at, c.qty + COALESCE(SUM({_SIGNED_QTY}), 0) AS qty, COUNT(m.id) AS moves
+      FROM (
+        SELECT i.id AS item_id, COALESCE(s.at, '') AS at, COALESCE(s.qty, 0) AS qty
+        FROM items i
+        LEFT JOIN stock_snapshots s ON s.item_id = i.id
+          AND s.at = (SELECT MAX(at) FROM stock_snapshots WHERE item_id = i.id AND at <= ?)
+        WHERE i.id IN ({','.join('?' * len(chunk))})
+      ) c
+      LEFT JOIN stock_moves m ON m.item_id = c.item_id AND m.created_at >= c.at AND m.created_at < ?
+      GROUP BY c.item_id
+    """, (before, *chunk, before)).fetchall()
+    for r in rows:
+      out[r["item_id"]] = {"qty": r["qty"], "checkpoint": r["at"] or None, "moves": r["moves"]}
+  return out
+
+def _snapshot_batch_txn(conn: sqlite3.Connection, target: str) -> Dict[str, Any]:
+  """Checkpoint the periods from the horizon up to at most _SNAPSHOT_BATCH_PERIODS periods, capped at target."""
+  period, horizon = _snapshot_state(conn)
+  if horizon >= target:
+    return {"written": 0, "horizon": horizon, "done": True}
+  if horizon:
+    start = datetime.strptime(horizon, _BOUNDARY_FORMAT)
+  else:
+    first = conn.execute("""
+      SELECT strftime('%Y-%m-%dT00:00:00Z', CAST((julianday(MIN(created_at)) - 2440587.5) / ? AS INTEGER) * ? + 2440587.5)
+      FROM stock_moves WHERE created_at < ?
+    """, (period, period, target)).fetchone()[0]
+    if not first:
+      # Empty ledger: keep the horizon unset so a first history import is not treated as backdated.
+      return {"written": 0, "horizon": horizon, "done": True}
+    start = datetime.strptime(first, _BOUNDARY_FORMAT)
+  end = min(target, (start + timedelta(days=period * _SNAPSHOT_BATCH_PERIODS)).strftime(_BOUNDARY_FORMAT))
+  written = _checkpoint_periods(conn, period, horizon, end)
+  conn.execute("UPDATE stock_snapshot_state SET horizon = ? WHERE id = 1", (end,))
+  return {"written": written, "horizon": end, "done": end >= target}
+
+def _checkpoint_periods(conn: sqlite3.Connection, period: int, since: str, end: str, item_id: Optional[int] = None) -> int:
+  """
+  Checkpoint the end of each period with moves in [since, end): the item's
+  last checkpoint at or before `since` plus a running sum of the periods'
+  moves. All items, or only item_id.
+  """
+  only_item = "AND m.item_id = ?" if item_id is not None else ""
+  return conn.execute(f"""
+    INSERT INTO stock_snapshots (item_id, at, qty)
+    SELECT p.item_id, p.at,
+           COALESCE((SELECT s.qty FROM stock_snapshots s WHERE s.item_id = p.item_id AND s.at <= ? ORDER BY s.at DESC LIMIT 1), 0)
+           + SUM(p.delta) OVER (PARTITION BY p.item_id ORDER BY p.at)
+    FROM (
+      SELECT m.item_id,
+             strftime('%Y-%m-%dT00:00:00Z',
+               (CAST((julianday(m.created_at) - 2440587.5) / ? AS INTEGER) + 1) * ? + 2440587.5) AS at,
+             SUM({_SIGNED_QTY}) AS delta
+      FROM stock_moves m
+      WHERE m.created_at >= ? AND m.created_at < ? {only_item}
+      GROUP BY m.item_id, at
+    ) p
+  """, (since, period, period, since, end, *([item_id] if item_id is not None else []))).rowcount
+
+def _insert_stock_moves(conn: sqlite3.Connection, rows: List[tuple]) -> None:
+  """
+  Append stock_moves rows (item_id, qty, type, ref, created_at) in the caller's
+  transaction. Through the trigger every row behind the horizon would patch all
+  later checkpoints of its item; instead the trigger is held off for the insert
+  and each touched item's checkpoints after its earliest new row are rebuilt
+  once from the ledger. Other items' checkpoints are left alone.
+  """
+  period, horizon = _snapshot_state(conn)
+  since: Dict[int, str] = {}
+  for item_id, _, _, _, created_at in rows:
+    if created_at < since.get(item_id, horizon):
+      since[item_id] = created_at
+  if since:
+    # The trigger only fires for created_at < horizon; no row is below ''.
+    conn.execute("UPDATE stock_snapshot_state SET horizon = '' WHERE id = 1")
+  conn.executemany("INSERT INTO stock_moves (item_id, qty, type, ref, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+  if not since:
+    return
+  conn.execute("UPDATE stock_snapshot_state SET horizon = ? WHERE id = 1", (horizon,))
+  for item_id, first in since.items():
+    floor = _floor_boundary(datetime.strptime(first[:10], "%Y-%m-%d"), period).strftime(_BOUNDARY_FORMAT)
+    conn.execute("DELETE FROM stock_snapshots WHERE item_id = ? AND at > ?", (item_id, floor))
+    _checkpoint_periods(conn, period, floor, horizon, item_id)
+
+def snapshot_stock() -> Dict[str, Any]:
+  """
+  Advance the stock checkpoints to the start of the current period, one batch
+  of periods per write transaction; only periods since the last run are read.
+  Registered as the "snapshot_stock" maintenance task.
+  """
+  with get_conn() as conn:
+    period = _snapshot_state(conn)["period_days"]
+  target = _floor_boundary(datetime.utcnow(), period).strftime(_BOUNDARY_FORMAT)
+  written = 0
+  while True:
+    result = _run_write(_snapshot_batch_txn, target)
+    if "written" not in result:
+      return result  # writer queue full; the next run picks up from the horizon
+    written += result["written"]
+    if result["done"]:
+      return {"status": "success", "written": written, "horizon": result["horizon"] or None, "period_days": period}
+
+def _reset_snapshots_txn(conn: sqlite3.Connection, period_days: int) -> Dict[str, Any]:
+  deleted = conn.execute("DELETE FROM stock_snapshots").rowcount
+  conn.execute("UPDATE stock_snapshot_state SET period_days = ?, horizon = '' WHERE id = 1", (period_days,))
+  return {"deleted": deleted}
+
+def rebuild_stock_snapshots() -> Dict[str, Any]:
+  """Drop every checkpoint and rebuild them from stock_moves with the current PROCUREMENT_STOCK_SNAPSHOT_DAYS."""
+  reset = _run_write(_reset_snapshots_txn, STOCK_SNAPSHOT_DAYS)
+  if "deleted" not in reset:
+    return reset
+  return {**snapshot_stock(), "deleted": reset["deleted"]}
+
+def stock_at(name_or_sku: str, as_of: str) -> Dict[str, Any]:
+  """
+  On hand of one item at `as_of` (YYYY-MM-DD = end of that day, or an ISO
+  timestamp). Reads the nearest checkpoints and the moves after them
+  ("moves_scanned"), never the item's whole ledger.
+  """
+  before = _parse_as_of(as_of)
+  if before is None:
+    return {"status": "error", "error_message": "as_of must be a date (YYYY-MM-DD) or an ISO timestamp."}
+  with get_conn() as conn:
+    item = _catalog(conn).lookup(name_or_sku)
+    if not item:
+      return {"status": "error", "error_message": f"Item '{name_or_sku}' not found."}
+    then = _ledger_at(conn, [item["id"]], _iso(before))[item["id"]]
+    now = _ledger_at(conn, [item["id"]], _LEDGER_END)[item["id"]]
+    on_hand_now = (_stock_by_item(conn, [item["id"]]).get(item["id"]) or {}).get("on_hand") or 0
+  return {
+    "status": "success",
+    "sku": item["sku"],
+    "name": item["name"],
+    "as_of": as_of,
+    "on_hand": on_hand_now - now["qty"] + then["qty"],
+    "on_hand_now": on_hand_now,
+    "checkpoint": then["checkpoint"],
+    "moves_scanned": then["moves"] + now["moves"],
+  }
+
+def stock_history(
+  names_or_skus: List[str],
+  start_date: str,
+  end_date: Optional[str] = None,
+  step_days: int = 1,
+) -> Dict[str, Any]:
+  """
+  On hand at the end of every step_days-th day from start_date to end_date
+  (default today) for many items, as one series per item in request order.
+  Points that fall on a checkpoint boundary at or before the horizon come
+  straight from stock_snapshots (carried forward across periods without
+  moves); the rest add the moves between their period start and the point.
+  """
+  start, end = _parse_date(start_date), _parse_date(end_date or datetime.utcnow().strftime("%Y-%m-%d"))
+  if start is None or end is None:
+    return {"status": "error", "error_message": "start_date / end_date must be dates (YYYY-MM-DD)."}
+  step_days = max(1, int(step_days))
+  bounds = [start + timedelta(days=d) for d in range(0, (end - start).days + 1, step_days)]
+  if not bounds:
+    return {"status": "error", "error_message": "end_date is before start_date."}
+  if len(bounds) > MAX_HISTORY_POINTS:
+    return {"status": "error", "error_message": f"At most {MAX_HISTORY_POINTS} points per call; raise step_days or narrow the range."}
+  keys = [k for k in dict.fromkeys(str(k).strip() for k in names_or_skus) if k]
+  with get_conn() as conn:
+    period, horizon = _snapshot_state(conn)
+    found = _resolve_items(conn, keys)
+    ids = list(dict.fromkeys(item["id"] for item in found.values()))
+    # Moves before max(period start, horizon) are already in the checkpoint at or before the point.
+    points = [(_iso(b), min(_floor_boundary(b, period).strftime(_BOUNDARY_FORMAT), horizon)) for b in bounds]
+    move_from = min((lo for b, lo in points if lo < b), default=None)
+    stock = _stock_by_item(conn, ids)
+    now = _ledger_at(conn, ids, _LEDGER_END)
+    checkpoints: Dict[int, List[Any]] = {}
+    moves: Dict[int, List[Any]] = {}
+    for chunk in _chunks(ids):
+      marks = ",".join("?" * len(chunk))
+      for r in conn.execute(f"""
+        SELECT s.item_id, s.at, s.qty FROM stock_snapshots s
+        WHERE s.item_id IN ({marks}) AND s.at <= ?
+          AND s.at >= COALESCE((SELECT MAX(at) FROM stock_snapshots WHERE item_id = s.item_id AND at <= ?), '')
+        ORDER BY s.item_id, s.at
+      """, (*chunk, points[-1][0], points[0][0])):
+        checkpoints.setdefault(r["item_id"], []).append((r["at"], r["qty"]))
+      if move_from is not None:
+        for r in conn.execute(f"""
+          SELECT m.item_id, m.created_at, {_SIGNED_QTY} AS qty FROM stock_moves m
+          WHERE m.item_id IN ({marks}) AND m.created_at >= ? AND m.created_at < ?
+          ORDER BY m.item_id, m.created_at
+        """, (*chunk, move_from, points[-1][0])):
+          moves.setdefault(r["item_id"], []).append((r["created_at"], r["qty"]))
+
+  series: Dict[int, List[int]] = {}
+  for item_id in ids:
+    cps = checkpoints.get(item_id, [])
+    cp_at = [at for at, _ in cps]
+    mv = moves.get(item_id, [])
+    mv_at = [at for at, _ in mv]
+    running = [0]
+    for _, qty in mv:
+      running.append(running[-1] + qty)
+    offset = ((stock.get(item_id) or {}).get("on_hand") or 0) - now[item_id]["qty"]
+    values = []
+    for b, lo in points:
+      i = bisect.bisect_right(cp_at, b)
+      ledger = cps[i - 1][1] if i else 0
+      if lo < b:
+        ledger += running[bisect.bisect_left(mv_at, b)] - running[bisect.bisect_left(mv_at, lo)]
+      values.append(offset + ledger)
+    series[item_id] = values
+
+  out, unresolved = [], []
+  for k in keys:
+    item = found.get(k.lower())
+    if item is None:
+      unresolved.append(k)
+    else:
+      out.append({"key": k, "sku": item["sku"], "name": item["name"], "on_hand": series[item["id"]]})
+  return {
+    "status": "success",
+    "dates": [(b - timedelta(days=1)).strftime("%Y-%m-%d") for b in bounds],
+    "series": out,
+    "unresolved": unresolved,
+    "checkpoint_horizon": horizon or None,
+  }
+
 # -------------------- Purchase Orders --------------------
 
+_PO_HEADER_SQL = """
+  SELECT po.id,
+         s.name AS supplier,
+         po.status,
+         po.created_at,
+         po.expected_at,
+         (SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id) AS line_count
+  FROM purchase_orders po
+  JOIN suppliers s ON s.id = po.supplier_id
+"""
+
 def list_purchase_orders(status: Optional[str] = None) -> List[Dict[str, Any]]:
   """
   List PO headers. Optionally filter by status:
@@ -192,28 +2132,12 @@ def list_purchase_orders(status: Optional[str] = None) -> List[Dict[str, Any]]:
   """
   with get_conn() as conn:
     if status:
-      rows = conn.execute("""
-        SELECT po.id,
-               s.name AS supplier,
-               po.status,
-               po.created_at,
-               po.expected_at,
-               (SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id) AS line_count
-        FROM purchase_orders po
-        JOIN suppliers s ON s.id = po.supplier_id
+      rows = conn.execute(_PO_HEADER_SQL + """
         WHERE po.status = ?
         ORDER BY po.id DESC
       """, (status,)).fetchall()
     else:
-      rows = conn.execute("""
-        SELECT po.id,
-               s.name AS supplier,
-               po.status,
-               po.created_at,
-               po.expected_at,
-               (SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id) AS line_count
-        FROM purchase_orders po
-        JOIN suppliers s ON s.id = po.supplier_id
+      rows = conn.execute(_PO_HEADER_SQL + """
         ORDER BY po.id DESC
       """).fetchall()
 
@@ -221,84 +2145,237 @@ def list_purchase_orders(status: Optional[str] = None) -> List[Dict[str, Any]]:
 
 def list_open_purchase_orders() -> List[Dict[str, Any]]:
   """Open = not received/cancelled."""
+  # One idx_po_status search per open status, merged newest first. With
+  # status IN (...) the planner walks the whole table in id order instead.
   with get_conn() as conn:
-    rows = conn.execute("""
-      SELECT po.id,
-             s.name AS supplier,
-             po.status,
-             po.created_at,
-             po.expected_at,
-             (SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id) AS line_count
-      FROM purchase_orders po
-      JOIN suppliers s ON s.id = po.supplier_id
-      WHERE po.status IN ('DRAFT','PLACED')
-      ORDER BY po.id DESC
-    """).fetchall()
-    return [dict(r) for r in rows]
+    rows = [
+      r for status in ("DRAFT", "PLACED")
+      for r in conn.execute(_PO_HEADER_SQL + """
+        WHERE po.status = ?
+        ORDER BY po.id DESC
+      """, (status,))
+    ]
+  rows.sort(key=lambda r: r["id"], reverse=True)
+  return [dict(r) for r in rows]
 
 def list_received_purchase_orders() -> List[Dict[str, Any]]:
   with get_conn() as conn:
-    rows = conn.execute("""
-      SELECT po.id,
-             s.name AS supplier,
-             po.status,
-             po.created_at,
-             po.expected_at,
-             (SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id) AS line_count
-      FROM purchase_orders po
-      JOIN suppliers s ON s.id = po.supplier_id
+    rows = conn.execute(_PO_HEADER_SQL + """
       WHERE po.status = 'RECEIVED'
       ORDER BY po.id DESC
     """).fetchall()
     return [dict(r) for r in rows]
 
-def create_purchase_order(supplier_name: str, lines: List[Dict[str, Any]], notes: str = "") -> Dict[str, Any]:
+_PO_COLUMNS = {
+  "id": "po.id",
+  "supplier": "s.name",
+  "status": "po.status",
+  "created_at": "po.created_at",
+  "expected_at": "po.expected_at",
+  "received_at": "po.received_at",
+  "notes": "po.notes",
+  "line_count": "(SELECT COUNT(*) FROM purchase_order_lines pol WHERE pol.po_id = po.id)",
+}
+_PO_DEFAULT_FIELDS = ["id", "supplier", "status", "created_at", "expected_at", "line_count"]
+
+def list_purchase_orders_page(
+  statuses: Optional[List[str]] = None,
+  limit: int = DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  fields: Optional[List[str]] = None,
+  with_total: bool = False,
+  columnar: bool = False,
+) -> Dict[str, Any]:
   """
-  lines: [{"sku_or_name": "...", "qty": 10, "unit_price": 4.2?}, ...]
+  One page of PO headers, newest first. `after_id` is the last id of the
+  previous page, so the next page holds ids below it.
+  statuses: optional list of statuses to include (None = all).
+  total_hint is exact with with_total, else an upper bound (max id) when
+  unfiltered and None when filtering by status.
+  columnar: row arrays plus "columns", as in list_items_page.
   """
+  try:
+    names = _field_names(fields or _PO_DEFAULT_FIELDS, list(_PO_COLUMNS))
+    select = _projection(names, _PO_COLUMNS)
+  except ValueError as e:
+    return {"status": "error", "error_message": str(e)}
+  limit = _clamp_limit(limit)
+  status_sql = f"po.status IN ({','.join('?' * len(statuses))})" if statuses else "1"
+  status_params = tuple(statuses or ())
+  cursor_sql = "po.id < ?" if after_id is not None else "1"
+  cursor_params = (int(after_id),) if after_id is not None else ()
   with get_conn() as conn:
-    supplier = conn.execute(
-      "SELECT id, name FROM suppliers WHERE lower(name)=lower(?)",
-      (supplier_name,),
-    ).fetchone()
-    if not supplier:
-      return {"status": "error", "error_message": f"Supplier '{supplier_name}' not found."}
+    rows = conn.execute(f"""
+      SELECT {select}
+      FROM purchase_orders po
+      JOIN suppliers s ON s.id = po.supplier_id
+      WHERE {status_sql} AND {cursor_sql}
+      ORDER BY po.id DESC
+      LIMIT ?
+    """, (*status_params, *cursor_params, limit + 1)).fetchall()
+    if with_total:
+      total_hint = conn.execute(
+        f"SELECT COUNT(*) FROM purchase_orders po WHERE {status_sql}", status_params
+      ).fetchone()[0]
+    elif not statuses:
+      total_hint = conn.execute("SELECT MAX(id) FROM purchase_orders").fetchone()[0] or 0
+    else:
+      total_hint = None
+  return _page_result("purchase_orders", rows, limit, total_hint, columnar, names)
 
-    created_at = _now_iso()
-    expected_at = (datetime.utcnow() + timedelta(days=3)).date().isoformat()
+def _as_int(value: Any) -> Optional[int]:
+  """A whole number given as int, integral float or numeric string; None for anything else."""
+  if isinstance(value, bool):
+    return None
+  if isinstance(value, int):
+    return value
+  if isinstance(value, float):
+    return int(value) if value.is_integer() else None
+  if isinstance(value, str):
+    try:
+      return int(value.strip())
+    except ValueError:
+      return None
+  return None
 
-    cur = conn.execute(
+def _line_error(lines: Any, label: str) -> Optional[str]:
+  """
+  First shape/type problem in item lines ([{"sku_or_name": str, "qty": int,
+  "unit_price": number?}, ...]) as "<label> line <n>: ...", or None. Tool input
+  is free-form model output, so it is checked before anything is resolved.
+  """
+  if not isinstance(lines, list):
+    return f"{label}: lines must be a list."
+  for n, ln in enumerate(lines, 1):
+    where = f"{label} line {n}"
+    if not isinstance(ln, dict):
+      return f"{where}: must be an object with sku_or_name and qty."
+    if not isinstance(ln.get("sku_or_name"), str) or not ln["sku_or_name"].strip():
+      return f"{where}: sku_or_name is required."
+    if _as_int(ln.get("qty")) is None:
+      return f"{where}: qty must be an integer."
+    price = ln.get("unit_price")
+    if price is not None:
+      try:
+        float(price)
+      except (TypeError, ValueError):
+        return f"{where}: unit_price must be a number."
+  return None
+
+def _resolve_items(conn: sqlite3.Connection, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+  """
+  Resolve SKU-or-name keys against the catalog cache (no per-key queries).
+  Returns {key.lower(): item} for the keys that matched; an SKU match wins over a name match.
+  """
+  cat = _catalog(conn)
+  found: Dict[str, Dict[str, Any]] = {}
+  for k in keys:
+    item = cat.lookup(k)
+    if item:
+      found[k.lower()] = item
+  return found
+
+def _order_error(orders: Any) -> Optional[str]:
+  """First shape/type problem in create_purchase_orders input, or None."""
+  if not isinstance(orders, list):
+    return "orders must be a list."
+  for n, o in enumerate(orders, 1):
+    if not isinstance(o, dict):
+      return f"Order {n}: must be an object with supplier_name and lines."
+    if not isinstance(o.get("supplier_name"), str) or not o["supplier_name"].strip():
+      return f"Order {n}: supplier_name is required."
+    if o.get("notes") is not None and not isinstance(o["notes"], str):
+      return f"Order {n}: notes must be text."
+    error = _line_error(o.get("lines"), f"Order {n}")
+    if error:
+      return error
+  return None
+
+def _create_purchase_orders_txn(conn: sqlite3.Connection, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+  if not orders:
+    raise _AbortTxn({"status": "error", "error_message": "No purchase orders given."})
+  error = _order_error(orders)
+  if error:
+    raise _AbortTxn({"status": "error", "error_message": error})
+
+  suppliers = _catalog(conn).suppliers_by_name
+  missing_suppliers = [o["supplier_name"] for o in orders if o["supplier_name"].lower() not in suppliers]
+  if missing_suppliers:
+    raise _AbortTxn({"status": "error", "error_message": f"Supplier '{missing_suppliers[0]}' not found."})
+
+  items = _resolve_items(conn, [ln["sku_or_name"] for o in orders for ln in o["lines"]])
+  missing_items = sorted({ln["sku_or_name"] for o in orders for ln in o["lines"] if ln["sku_or_name"].lower() not in items})
+  if len(missing_items) == 1:
+    raise _AbortTxn({"status": "error", "error_message": f"Item '{missing_items[0]}' not found."})
+  if missing_items:
+    raise _AbortTxn({"status": "error", "error_message": f"Items not found: {', '.join(missing_items)}."})
+  for o in orders:
+    if not o["lines"]:
+      raise _AbortTxn({"status": "error", "error_message": f"Order for '{o['supplier_name']}' has no lines."})
+    bad = [ln["sku_or_name"] for ln in o["lines"] if int(ln["qty"]) <= 0]
+    if bad:
+      raise _AbortTxn({"status": "error", "error_message": f"Quantity must be positive (item '{bad[0]}')."})
+
+  created_at = _now_iso()
+  expected_at = (datetime.utcnow() + timedelta(days=3)).date().isoformat()
+  created: List[Dict[str, Any]] = []
+  line_rows = []
+  for o in orders:
+    supplier = suppliers[o["supplier_name"].lower()]
+    po_id = conn.execute(
       "INSERT INTO purchase_orders (supplier_id, status, created_at, expected_at, notes) VALUES (?, 'PLACED', ?, ?, ?)",
-      (supplier["id"], created_at, expected_at, notes),
-    )
-    po_id = cur.lastrowid
+      (supplier["id"], created_at, expected_at, o.get("notes", "")),
+    ).lastrowid
+    for ln in o["lines"]:
+      line_rows.append((po_id, int(items[ln["sku_or_name"].lower()]["id"]), int(ln["qty"]), ln.get("unit_price")))
+    created.append({"po_id": po_id, "supplier": supplier["name"], "expected_at": expected_at, "line_count": len(o["lines"])})
 
-    # IMPORTANT: lookup items using THE SAME connection (avoid nested connection calls)
-    for ln in lines:
-      sku_or_name = ln["sku_or_name"]
-      item = conn.execute("""
-        SELECT i.id, i.sku, i.name
-        FROM items i
-        WHERE lower(i.sku)=lower(?) OR lower(i.name)=lower(?)
-        LIMIT 1
-      """, (sku_or_name, sku_or_name)).fetchone()
+  conn.executemany(
+    "INSERT INTO purchase_order_lines (po_id, item_id, qty, unit_price) VALUES (?, ?, ?, ?)",
+    line_rows,
+  )
+  return {"status": "success", "purchase_orders": created}
 
-      if not item:
-        return {"status": "error", "error_message": f"Item '{sku_or_name}' not found."}
+def create_purchase_order(supplier_name: str, lines: List[Dict[str, Any]], notes: str = "") -> Dict[str, Any]:
+  """
+  lines: [{"sku_or_name": "...", "qty": 10, "unit_price": 4.2?}, ...]
+  Nothing is written unless every line resolves.
+  """
+  result = create_purchase_orders([{"supplier_name": supplier_name, "lines": lines, "notes": notes}])
+  if result["status"] != "success":
+    return result
+  po = result["purchase_orders"][0]
+  return {"status": "success", "po_id": po["po_id"], "expected_at": po["expected_at"]}
 
-      qty = int(ln["qty"])
-      unit_price = ln.get("unit_price")
-      conn.execute(
-        "INSERT INTO purchase_order_lines (po_id, item_id, qty, unit_price) VALUES (?, ?, ?, ?)",
-        (po_id, int(item["id"]), qty, unit_price),
-      )
+def create_purchase_orders(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  Create several POs in one transaction: either all of them commit or none do.
+  orders: [{"supplier_name": "...", "lines": [...as in create_purchase_order...], "notes": "..."}, ...]
+  All lines are resolved with one query and inserted with one executemany.
+  Malformed input (missing supplier_name, non-integer qty, ...) returns an
+  error naming the first bad order/line.
+  """
+  return _run_write(_create_purchase_orders_txn, orders)
 
-    return {"status": "success", "po_id": po_id, "expected_at": expected_at}
+def split_recommendations_by_supplier(recs: List[Dict[str, Any]], notes: str = "") -> Dict[str, Any]:
+  """
+  Group recommend_order_quantities() output into one draft PO per preferred supplier,
+  in the shape create_purchase_orders() accepts. Items without a supplier are listed separately.
+  """
+  by_supplier: Dict[str, List[Dict[str, Any]]] = {}
+  unassigned: List[str] = []
+  for r in recs:
+    if not r["supplier"]:
+      unassigned.append(r["sku"])
+      continue
+    by_supplier.setdefault(r["supplier"], []).append({"sku_or_name": r["sku"], "qty": r["recommended_qty"]})
+  orders = [{"supplier_name": s, "lines": lines, "notes": notes} for s, lines in by_supplier.items()]
+  return {"orders": orders, "unassigned_skus": unassigned}
 
 def get_purchase_order(po_id: int) -> Dict[str, Any]:
   with get_conn() as conn:
     po = conn.execute("""
-      SELECT po.id, po.status, po.created_at, po.expected_at, po.notes, s.name AS supplier
+      SELECT po.id, po.status, po.created_at, po.expected_at, po.received_at, po.notes, s.name AS supplier
       FROM purchase_orders po
       JOIN suppliers s ON s.id = po.supplier_id
       WHERE po.id = ?
@@ -307,7 +2384,7 @@ def get_purchase_order(po_id: int) -> Dict[str, Any]:
       return {"status": "error", "error_message": f"PO {po_id} not found."}
 
     lines = conn.execute("""
-      SELECT i.sku, i.name, pol.qty, pol.unit_price
+      SELECT i.sku, i.name, pol.qty, pol.unit_price, pol.received_qty
       FROM purchase_order_lines pol
       JOIN items i ON i.id = pol.item_id
       WHERE pol.po_id = ?
@@ -320,30 +2397,158 @@ def receive_purchase_order(po_id: int) -> Dict[str, Any]:
   """
   Mark PO as RECEIVED and add qty to inventory with stock_moves.
   """
-  with get_conn() as conn:
-    po = conn.execute("SELECT id, status FROM purchase_orders WHERE id = ?", (po_id,)).fetchone()
-    if not po:
-      return {"status": "error", "error_message": f"PO {po_id} not found."}
-    if po["status"] == "RECEIVED":
-      return {"status": "success", "message": f"PO {po_id} already received."}
-
-    lines = conn.execute("SELECT item_id, qty FROM purchase_order_lines WHERE po_id = ?", (po_id,)).fetchall()
-    now = _now_iso()
-
-    for ln in lines:
-      item_id = int(ln["item_id"])
-      qty = int(ln["qty"])
-      conn.execute("""
-        INSERT INTO inventory (item_id, on_hand, reserved, updated_at)
-        VALUES (?, ?, 0, ?)
-        ON CONFLICT(item_id) DO UPDATE SET
-          on_hand = on_hand + excluded.on_hand,
-          updated_at = excluded.updated_at
-      """, (item_id, qty, now))
-      conn.execute(
-        "INSERT INTO stock_moves (item_id, qty, type, ref, created_at) VALUES (?, ?, 'RECEIVE', ?, ?)",
-        (item_id, qty, f"PO:{po_id}", now),
-      )
-
-    conn.execute("UPDATE purchase_orders SET status='RECEIVED' WHERE id = ?", (po_id,))
-    return {"status": "success", "message": f"PO {po_id} received and inventory updated."}
+  result = receive_purchase_orders([{"po_id": po_id}])
+  if result["status"] != "success":
+    return result
+  if result["already_received"]:
+    return {"status": "success", "message": f"PO {po_id} already received."}
+  return {"status": "success", "message": f"PO {po_id} received and inventory updated."}
+
+def _receipt_error(receipts: Any) -> Optional[str]:
+  """First shape/type problem in receive_purchase_orders input, or None."""
+  if not isinstance(receipts, list):
+    return "receipts must be a list."
+  for n, r in enumerate(receipts, 1):
+    if not isinstance(r, dict):
+      return f"Receipt {n}: must be an object with po_id."
+    if _as_int(r.get("po_id")) is None:
+      return f"Receipt {n}: po_id must be an integer."
+    if r.get("lines") is not None:
+      error = _line_error(r["lines"], f"Receipt {n}")
+      if error:
+        return error
+  return None
+
+def _receive_purchase_orders_txn(conn: sqlite3.Connection, receipts: List[Dict[str, Any]]) -> Dict[str, Any]:
+  if not receipts:
+    raise _AbortTxn({"status": "error", "error_message": "No purchase orders given."})
+  error = _receipt_error(receipts)
+  if error:
+    raise _AbortTxn({"status": "error", "error_message": error})
+  po_ids = [int(r["po_id"]) for r in receipts]
+  if len(set(po_ids)) != len(po_ids):
+    raise _AbortTxn({"status": "error", "error_message": "Each PO may appear only once per receipt batch."})
+
+  # Running under BEGIN IMMEDIATE: nobody else can receive these POs between
+  # this status read and the updates below.
+  marks = ",".join("?" * len(po_ids))
+  status_by_po = {r["id"]: r["status"] for r in conn.execute(
+    f"SELECT id, status FROM purchase_orders WHERE id IN ({marks})", po_ids
+  )}
+  for po_id in po_ids:
+    if po_id not in status_by_po:
+      raise _AbortTxn({"status": "error", "error_message": f"PO {po_id} not found."})
+    if status_by_po[po_id] == "CANCELLED":
+      raise _AbortTxn({"status": "error", "error_message": f"PO {po_id} is cancelled."})
+
+  already_received = [p for p in po_ids if status_by_po[p] == "RECEIVED"]
+  todo = [r for r in receipts if status_by_po[int(r["po_id"])] != "RECEIVED"]
+  lines_by_po: Dict[int, List[sqlite3.Row]] = {}
+  if todo:
+    todo_ids = [int(r["po_id"]) for r in todo]
+    for ln in conn.execute(f"""
+      SELECT pol.id, pol.po_id, pol.item_id, pol.qty, pol.received_qty, i.sku
+      FROM purchase_order_lines pol
+      JOIN items i ON i.id = pol.item_id
+      WHERE pol.po_id IN ({','.join('?' * len(todo_ids))})
+      ORDER BY pol.id
+    """, todo_ids):
+      lines_by_po.setdefault(ln["po_id"], []).append(ln)
+
+  keys = [x["sku_or_name"] for r in todo for x in (r.get("lines") or [])]
+  items = _resolve_items(conn, keys) if keys else {}
+
+  # line id -> qty received now
+  take: Dict[int, int] = {}
+  for r in todo:
+    po_id = int(r["po_id"])
+    po_lines = lines_by_po.get(po_id, [])
+    if not r.get("lines"):
+      for ln in po_lines:
+        if ln["qty"] > ln["received_qty"]:
+          take[ln["id"]] = ln["qty"] - ln["received_qty"]
+      continue
+    for x in r["lines"]:
+      item = items.get(x["sku_or_name"].lower())
+      qty = int(x["qty"])
+      if qty <= 0:
+        raise _AbortTxn({"status": "error", "error_message": f"Quantity must be positive (item '{x['sku_or_name']}')."})
+      matching = [ln for ln in po_lines if item is not None and ln["item_id"] == item["id"]]
+      if not matching:
+        raise _AbortTxn({"status": "error", "error_message": f"Item '{x['sku_or_name']}' is not on PO {po_id}."})
+      # Spread over the PO's lines for this item, oldest line first.
+      for ln in matching:
+        room = ln["qty"] - ln["received_qty"] - take.get(ln["id"], 0)
+        n = min(qty, room)
+        if n > 0:
+          take[ln["id"]] = take.get(ln["id"], 0) + n
+          qty -= n
+      if qty > 0:
+        raise _AbortTxn({
+          "status": "error",
+          "error_message": f"PO {po_id}: receiving more '{x['sku_or_name']}' than is outstanding (excess {qty}).",
+        })
+
+  lines_by_id = {ln["id"]: ln for po_lines in lines_by_po.values() for ln in po_lines}
+  cur = conn.executemany(
+    "UPDATE purchase_order_lines SET received_qty = received_qty + ? WHERE id = ? AND received_qty + ? <= qty",
+    [(n, line_id, n) for line_id, n in take.items()],
+  )
+  if take and cur.rowcount != len(take):
+    raise _AbortTxn({"status": "error", "error_message": "PO lines changed while receiving; please retry."})
+
+  # One inventory upsert per item and one ledger row per (PO, item), however many lines.
+  item_delta: Dict[int, int] = {}
+  move_qty: Dict[tuple, int] = {}
+  for line_id, n in take.items():
+    ln = lines_by_id[line_id]
+    item_delta[ln["item_id"]] = item_delta.get(ln["item_id"], 0) + n
+    move_qty[(ln["po_id"], ln["item_id"])] = move_qty.get((ln["po_id"], ln["item_id"]), 0) + n
+  now = _now_iso()
+  conn.executemany("""
+    INSERT INTO inventory (item_id, on_hand, reserved, updated_at)
+    VALUES (?, ?, 0, ?)
+    ON CONFLICT(item_id) DO UPDATE SET
+      on_hand = on_hand + excluded.on_hand,
+      updated_at = excluded.updated_at
+  """, [(item_id, n, now) for item_id, n in item_delta.items()])
+  conn.executemany(
+    "INSERT INTO stock_moves (item_id, qty, type, ref, created_at) VALUES (?, ?, 'RECEIVE', ?, ?)",
+    [(item_id, n, f"PO:{po_id}", now) for (po_id, item_id), n in move_qty.items()],
+  )
+
+  results = []
+  completed: List[int] = []
+  for r in todo:
+    po_id = int(r["po_id"])
+    po_lines = lines_by_po.get(po_id, [])
+    outstanding = {ln["id"]: ln["qty"] - ln["received_qty"] - take.get(ln["id"], 0) for ln in po_lines}
+    if not any(outstanding.values()):
+      completed.append(po_id)
+    results.append({
+      "po_id": po_id,
+      "status": "RECEIVED" if po_id in completed else "PARTIAL",
+      "lines": [
+        {"sku": ln["sku"], "received_now": take.get(ln["id"], 0), "outstanding_qty": outstanding[ln["id"]]}
+        for ln in po_lines
+      ],
+    })
+  if completed:
+    conn.execute(
+      f"UPDATE purchase_orders SET status='RECEIVED', received_at=? WHERE id IN ({','.join('?' * len(completed))})",
+      [now, *completed],
+    )
+
+  return {"status": "success", "received": results, "already_received": already_received}
+
+def receive_purchase_orders(receipts: List[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  Receive many POs in one transaction (all or nothing).
+  receipts: [{"po_id": 12}, {"po_id": 13, "lines": [{"sku_or_name": "TUN-001", "qty": 10}]}, ...]
+  Without "lines" everything still outstanding on the PO is received; with
+  "lines" only those quantities are (a short shipment). A PO turns RECEIVED
+  once every line is fully received, otherwise it stays open and is reported PARTIAL.
+  POs that are already RECEIVED are skipped and listed in already_received.
+  Malformed input returns an error naming the first bad receipt/line.
+  """
+  return _run_write(_receive_purchase_orders_txn, receipts)
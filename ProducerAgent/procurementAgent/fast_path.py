@@ -0,0 +1,355 @@
+"""
+Deterministic fast path for the common read-only questions (SYSTEM_INSTRUCTION
+workflows A, B, C, F and H), in English and Hebrew:
+
+  "show all products" / "הצג את כל המוצרים"   -> tool_emit_table("items")
+  "stock for TUN-001" / "כמה טונה יש לנו"      -> tool_get_item(...)
+  "what is low" / "מה חסר"                     -> tool_emit_table("low_stock")
+  "show PO 12" / "הזמנה 12"                    -> tool_get_po(12) + tool_emit_table("po_lines", po_id=12)
+  "open orders" / "הזמנות פתוחות"              -> tool_emit_table("open_purchase_orders")
+
+before_model_callback runs in front of every model call. On a user turn that
+matches, it returns the tool call(s) itself instead of asking the model; ADK
+runs the real tools, so the UI gets the same table event and the session the
+same history as on the model path. On the follow-up call (the tool results)
+it writes the 1-3 line summary itself. Both model round trips are skipped.
+The callback is async: its one DB lookup runs on the async_db thread pool.
+
+Only whole-message matches count: anything with extra words, more than one
+intent, an unknown item or a write verb (order, receive, approve, ...) falls
+through to the model. stats() reports hits and fallthroughs per intent/reason.
+
+  PROCUREMENT_FAST_PATH=0   always ask the model
+"""
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from . import async_db, db
+
+ENABLED = os.getenv("PROCUREMENT_FAST_PATH", "1").lower() not in ("0", "false", "no", "off")
+
+log = logging.getLogger("procurementAgent.fast_path")
+
+# State key holding the intent between the tool-call turn and the summary turn.
+_PENDING_KEY = "fast_path_pending"
+
+# (tool name, args)
+Call = Tuple[str, Dict[str, Any]]
+
+class Intent:
+  __slots__ = ("name", "lang", "calls", "item_key")
+
+  def __init__(self, name: str, lang: str, calls: List[Call], item_key: Optional[str] = None):
+    self.name = name
+    self.lang = lang
+    self.calls = calls
+    self.item_key = item_key  # stock questions: resolved against the catalog before answering
+
+  def __repr__(self) -> str:
+    return f"Intent({self.name!r}, {self.lang!r}, {self.calls!r})"
+
+# -------------------- Matching --------------------
+
+_HEBREW = re.compile(r"[֐-׿]")
+_PUNCT = re.compile(r"[?!.,:;\"'״׳]+$|^[\"'״׳]+")
+_SPACE = re.compile(r"\s+")
+_POLITE = re.compile(r"^(?:please |pls |can you |could you |would you |can i |let me |i want to |i'd like to )+|(?: please| pls| בבקשה)$|^בבקשה ")
+
+# Messages with these are writes (or approvals of one) and always go to the model.
+_WRITE = re.compile(
+  r"\b(?:create|place|make|order (?!\d)|reorder|buy|receive|we received|we got|arrived|approve|confirm|cancel|"
+  r"delete|remove|update|change|set|add|yes|go ahead|proceed)\b|"
+  r"\b(?:צור|תצור|הזמן|תזמין|להזמין|קיבלנו|הגיע|הגיעה|אשר|מאשר|בטל|מחק|עדכן|שנה|הוסף|כן)\b"
+)
+
+_SHOW = r"(?:(?:show|list|display|give|get|view|see)(?: me)?(?: all the| all| the| our)? )?"
+_HE_SHOW = r"(?:(?:תראה|תראי|הראה|הצג|תציג|תציגי) (?:לי )?)?(?:את )?"
+
+_ORDER_STATUS = {
+  "open": "open", "pending": "open", "outstanding": "open", "unreceived": "open", "not yet received": "open",
+  "received": "received", "completed": "received", "draft": "DRAFT", "placed": "PLACED",
+  "cancelled": "CANCELLED", "canceled": "CANCELLED", "all": None, "": None,
+  "פתוחות": "open", "ממתינות": "open", "שלא התקבלו": "open", "שהתקבלו": "received", "שהגיעו": "received",
+  "סגורות": "received", "טיוטה": "DRAFT", "מבוטלות": "CANCELLED", "כל": None,
+}
+
+def _orders_calls(status: Optional[str]) -> List[Call]:
+  if status == "open":
+    return [("tool_emit_table", {"query_name": "open_purchase_orders"})]
+  if status == "received":
+    return [("tool_emit_table", {"query_name": "received_purchase_orders"})]
+  if status:
+    return [("tool_emit_table", {"query_name": "purchase_orders", "status": status})]
+  return [("tool_emit_table", {"query_name": "purchase_orders"})]
+
+def _po_calls(po_id: str) -> List[Call]:
+  return [("tool_get_po", {"po_id": int(po_id)}), ("tool_emit_table", {"query_name": "po_lines", "po_id": int(po_id)})]
+
+# (intent, lang, pattern, build(match) -> (calls, item_key))
+_Rule = Tuple[str, str, "re.Pattern[str]", Callable[["re.Match[str]"], Tuple[List[Call], Optional[str]]]]
+
+def _rule(name: str, lang: str, pattern: str, build: Callable[["re.Match[str]"], Tuple[List[Call], Optional[str]]]) -> _Rule:
+  return (name, lang, re.compile(pattern), build)
+
+def _first_group(m: "re.Match[str]") -> str:
+  return next(g for g in m.groups() if g)
+
+_RULES: List[_Rule] = [
+  _rule("items", "en", _SHOW + r"(?:all )?(?:products|items|inventory|stock|catalog)(?: list)?|what(?:'s| is| do we have) in stock",
+        lambda m: ([("tool_emit_table", {"query_name": "items"})], None)),
+  _rule("low_stock", "en",
+        r"what(?:'s| is| are)? (?:low|running (?:low|out)|out of stock|below reorder point)(?: on)?|"
+        r"what (?:are we|is) running (?:low|out)(?: on| of)?|what (?:needs|do we need) (?:reordering|to reorder|restocking)|"
+        + _SHOW + r"(?:low[- ]stock|low)(?: items| products| list)?",
+        lambda m: ([("tool_emit_table", {"query_name": "low_stock"})], None)),
+  _rule("po", "en", _SHOW + r"(?:po|purchase order)(?: number| no)? ?#?(\d+)(?: details)?|(?:show|view) order #?(\d+)|"
+        r"details (?:of|for) (?:po|purchase order) #?(\d+)",
+        lambda m: (_po_calls(_first_group(m)), None)),
+  _rule("orders", "en", _SHOW + r"(?:(open|pending|outstanding|unreceived|not yet received|received|completed|draft|placed|"
+        r"cancelled|canceled|all) )?(?:purchase orders|orders|pos)",
+        lambda m: (_orders_calls(_ORDER_STATUS[m.group(1) or ""]), None)),
+  _rule("orders", "en", _SHOW + r"(?:purchase orders|orders|pos) (?:with|in|by) status (draft|placed|received|cancelled)",
+        lambda m: (_orders_calls(m.group(1).upper()), None)),
+  _rule("stock", "en",
+        r"how (?:many|much)(?: of)? (.+?) (?:do we have|have we got|are (?:there|left)|is (?:there|left)|in stock|left|on hand)|"
+        r"(?:what(?:'s| is) the )?(?:stock|stock level|inventory|on hand|quantity) (?:for|of) (.+)",
+        lambda m: ([], _first_group(m))),
+  _rule("items", "he", _HE_SHOW + r"(?:כל )?(?:ה)?(?:מוצרים|פריטים|מלאי)(?: הקיים)?|רשימת (?:ה)?(?:מוצרים|פריטים)|מה יש (?:לנו )?במלאי",
+        lambda m: ([("tool_emit_table", {"query_name": "items"})], None)),
+  _rule("low_stock", "he",
+        r"מה (?:חסר|נמוך|עומד להיגמר|נגמר|צריך להזמין)(?: במלאי)?|מה במלאי נמוך|"
+        + _HE_SHOW + r"(?:(?:ה)?(?:פריטים|מוצרים) (?:ב|עם )?)?(?:ה)?מלאי (?:ה)?נמוך",
+        lambda m: ([("tool_emit_table", {"query_name": "low_stock"})], None)),
+  _rule("po", "he", _HE_SHOW + r"(?:ה)?(?:הזמנה|הזמנת רכש|po)(?: מספר)? ?#?(\d+)|פרטי (?:ה)?הזמנה (?:מספר )?#?(\d+)",
+        lambda m: (_po_calls(_first_group(m)), None)),
+  _rule("orders", "he", _HE_SHOW + r"(?:(כל) )?(?:ה)?הזמנות(?: (?:ה)?רכש)?(?: (?:ה)?(פתוחות|ממתינות|שלא התקבלו|שהתקבלו|שהגיעו|סגורות|טיוטה|מבוטלות))?",
+        lambda m: (_orders_calls(_ORDER_STATUS[m.group(2) or m.group(1) or ""]), None)),
+  _rule("stock", "he",
+        r"כמה (.+?) (?:יש|נשאר|נשארו)(?: לנו)?(?: במלאי)?|כמה יש (?:לנו )?(?:מ-?|של )(.+?)(?: במלאי)?|"
+        r"(?:מה )?(?:ה)?מלאי (?:של|עבור) (.+)",
+        lambda m: ([], _first_group(m))),
+]
+
+def normalize(text: str) -> str:
+  text = _SPACE.sub(" ", text.strip().lower())
+  text = _PUNCT.sub("", text).strip()
+  return _POLITE.sub("", text).strip()
+
+def match(text: str) -> Tuple[Optional[Intent], str]:
+  """
+  (intent, "") for a whole-message match, else (None, reason): "empty",
+  "write", "no_match" or "ambiguous" (several intents match).
+  """
+  norm = normalize(text)
+  if not norm:
+    return None, "empty"
+  if _WRITE.search(norm):
+    return None, "write"
+  hits = {}
+  for name, lang, pattern, build in _RULES:
+    m = pattern.fullmatch(norm)
+    if m:
+      hits.setdefault(name, (lang, build(m)))
+  if not hits:
+    return None, "no_match"
+  if len(hits) > 1:
+    return None, "ambiguous"
+  name, (lang, (calls, item_key)) = next(iter(hits.items()))
+  if _HEBREW.search(norm):
+    lang = "he"
+  return Intent(name, lang, calls, item_key.strip() if item_key else None), ""
+
+def resolve(intent: Intent) -> Optional[Intent]:
+  """Stock questions: look the item up; None (fall through) if it is not an exact SKU / name."""
+  if intent.item_key is None:
+    return intent
+  item = db.get_item_by_name_or_sku(intent.item_key)
+  if item is None:
+    return None
+  intent.calls = [("tool_get_item", {"name_or_sku": item["sku"]})]
+  return intent
+
+# -------------------- Summaries --------------------
+
+_TEXT = {
+  "en": {
+    "items": "Showing {shown} of about {total} items.",
+    "items_more": "Want the next page?",
+    "low_none": "No items are at or below their reorder point.",
+    "low": "{n} item(s) at or below reorder point. Most critical: {top}.",
+    "low_item": "{sku} {name} ({available} available, reorder point {reorder_point})",
+    "low_next": "Do you want reorder recommendations?",
+    "orders": "{n} purchase order(s) shown ({title}).",
+    "orders_more": "More are available - want the next page?",
+    "orders_next": "Do you want to view a specific PO? (provide PO ID)",
+    "po": "PO {id} - {supplier}, status {status}, created {created_at}, expected {expected_at}; {lines} line(s) shown above.",
+    "stock": "{sku} - {name}: {on_hand} {unit} on hand, {available} available (reorder point {reorder_point}, min level {min_level}). "
+             "Supplier: {supplier}, lead time {lead_time_days} days.",
+    "stock_low": "Available stock is at or below its reorder point.",
+  },
+  "he": {
+    "items": "מוצגים {shown} מתוך כ-{total} פריטים.",
+    "items_more": "להציג את העמוד הבא?",
+    "low_none": "אין פריטים מתחת לנקודת ההזמנה.",
+    "low": "{n} פריטים בנקודת ההזמנה או מתחתיה. הקריטיים ביותר: {top}.",
+    "low_item": "{sku} {name} ({available} זמינים, נקודת הזמנה {reorder_point})",
+    "low_next": "להכין המלצות הזמנה?",
+    "orders": "מוצגות {n} הזמנות רכש ({title}).",
+    "orders_more": "יש עוד - להציג את העמוד הבא?",
+    "orders_next": "להציג הזמנה מסוימת? (מספר הזמנה)",
+    "po": "הזמנה {id} - {supplier}, סטטוס {status}, נוצרה {created_at}, צפויה {expected_at}; {lines} שורות מוצגות למעלה.",
+    "stock": "{sku} - {name}: {on_hand} {unit} במלאי, {available} זמינים (נקודת הזמנה {reorder_point}, מינימום {min_level}). "
+             "ספק: {supplier}, זמן אספקה {lead_time_days} ימים.",
+    "stock_low": "המלאי הזמין בנקודת ההזמנה או מתחתיה.",
+  },
+}
+
+def _rows(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+  keys = [c["key"] for c in payload["columns"]]
+  return [dict(zip(keys, row)) for row in payload["rows"]]
+
+def summarize(intent: Intent, results: Dict[str, Dict[str, Any]]) -> str:
+  """Short answer text from the tool results (tool name -> result dict)."""
+  for result in results.values():
+    if result.get("status") == "error":
+      return result.get("error_message", "")
+  t = _TEXT[intent.lang]
+  if intent.name == "stock":
+    item = results["tool_get_item"]["item"]
+    text = t["stock"].format(**{k: ("-" if v is None else v) for k, v in item.items()})
+    # Same definition as list_low_stock: available = on_hand - reserved + on_order.
+    available = item.get("available")
+    return f"{text} {t['stock_low']}" if available is not None and available <= item["reorder_point"] else text
+  if intent.name == "po":
+    po = results["tool_get_po"]["po"]
+    lines = results["tool_emit_table"]["payload"]["meta"]["row_count"]
+    return t["po"].format(lines=lines, **{k: ("-" if v is None else v) for k, v in po.items()})
+  payload = results["tool_emit_table"]["payload"]
+  meta = payload["meta"]
+  if intent.name == "items":
+    text = t["items"].format(shown=meta["row_count"], total=meta.get("total_hint", meta["row_count"]))
+    return f"{text} {t['items_more']}" if meta.get("next_after_id") else text
+  if intent.name == "low_stock":
+    rows = _rows(payload)
+    if not rows:
+      return t["low_none"]
+    rows.sort(key=lambda r: r["available"] - r["reorder_point"])
+    top = "; ".join(t["low_item"].format(**r) for r in rows[:3])
+    return f"{t['low'].format(n=len(rows), top=top)} {t['low_next']}"
+  text = t["orders"].format(n=meta["row_count"], title=payload["title"])
+  if meta.get("next_after_id"):
+    text = f"{text} {t['orders_more']}"
+  return f"{text} {t['orders_next']}"
+
+# -------------------- Stats --------------------
+
+_stats_lock = threading.Lock()
+_hits: Dict[str, int] = {}
+_fallthrough: Dict[str, int] = {}
+_answer_ms = {"count": 0, "total": 0.0, "max": 0.0}
+
+def _count(table: Dict[str, int], key: str) -> None:
+  with _stats_lock:
+    table[key] = table.get(key, 0) + 1
+
+def stats() -> Dict[str, Any]:
+  """Hits per intent, fallthroughs per reason, and time from user turn to fast answer."""
+  with _stats_lock:
+    hits, fallthrough = sum(_hits.values()), sum(_fallthrough.values())
+    count = _answer_ms["count"]
+    return {
+      "enabled": ENABLED,
+      "hits": hits,
+      "fallthrough": fallthrough,
+      "hit_rate": round(hits / (hits + fallthrough), 4) if hits + fallthrough else 0.0,
+      "hits_by_intent": dict(_hits),
+      "fallthrough_by_reason": dict(_fallthrough),
+      "answered": count,
+      "answer_mean_ms": round(_answer_ms["total"] / count, 3) if count else 0.0,
+      "answer_max_ms": round(_answer_ms["max"], 3),
+    }
+
+def reset_stats() -> None:
+  with _stats_lock:
+    _hits.clear()
+    _fallthrough.clear()
+    _answer_ms.update(count=0, total=0.0, max=0.0)
+
+# -------------------- ADK callback --------------------
+
+def _text_response(text: str) -> LlmResponse:
+  return LlmResponse(content=types.Content(role="model", parts=[types.Part.from_text(text=text)]))
+
+def _user_text(content: types.Content) -> Optional[str]:
+  """The text of a plain user message (None for tool results or mixed content)."""
+  if content.role != "user" or not content.parts or any(p.text is None for p in content.parts):
+    return None
+  return " ".join(p.text for p in content.parts)
+
+async def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+  if not ENABLED or not llm_request.contents:
+    return None
+  last = llm_request.contents[-1]
+  pending = callback_context.state.get(_PENDING_KEY)
+
+  # Second call of a fast-path turn: the tool results are in, answer without the model.
+  if pending and pending.get("invocation_id") == callback_context.invocation_id:
+    callback_context.state[_PENDING_KEY] = None
+    results = {p.function_response.name: p.function_response.response or {} for p in last.parts or [] if p.function_response}
+    if set(results) != {name for name, _ in pending["calls"]}:
+      return None  # not our tool results after all; let the model handle it
+    intent = Intent(pending["intent"], pending["lang"], [tuple(c) for c in pending["calls"]])
+    text = summarize(intent, results)
+    elapsed = (time.time() - pending["started"]) * 1000
+    with _stats_lock:
+      _answer_ms["count"] += 1
+      _answer_ms["total"] += elapsed
+      _answer_ms["max"] = max(_answer_ms["max"], elapsed)
+    return _text_response(text)
+
+  user_text = _user_text(last)
+  if user_text is None:
+    return None  # model is mid-workflow (tool results of its own calls)
+  started = time.time()
+  intent, reason = match(user_text)
+  # The item lookup (and a cold start's lazy init) runs on the DB pool, never on the loop.
+  if intent is not None and await async_db.run_db(resolve, intent) is None:
+    intent, reason = None, "unknown_item"
+  if intent is None:
+    _count(_fallthrough, reason)
+    return None
+  _count(_hits, intent.name)
+  log.debug("fast path %s: %r", intent.name, intent.calls)
+  callback_context.state[_PENDING_KEY] = {
+    "invocation_id": callback_context.invocation_id,
+    "intent": intent.name,
+    "lang": intent.lang,
+    "calls": [list(c) for c in intent.calls],
+    "started": started,
+  }
+  return LlmResponse(content=types.Content(role="model", parts=[
+    types.Part(function_call=types.FunctionCall(id=f"adk-{uuid.uuid4()}", name=name, args=args))
+    for name, args in intent.calls
+  ]))
+
+# -------------------- Without ADK --------------------
+
+def answer(text: str, tools: Dict[str, Callable[..., Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+  """
+  Answer text synchronously with the given tool functions (name -> callable),
+  or None when it would fall through. For benchmarks and non-ADK front ends.
+  """
+  intent, _ = match(text)
+  if intent is None or resolve(intent) is None:
+    return None
+  results = {name: tools[name](**args) for name, args in intent.calls}
+  return {"intent": intent.name, "calls": intent.calls, "results": results, "text": summarize(intent, results)}
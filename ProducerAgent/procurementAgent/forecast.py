@@ -0,0 +1,196 @@
+"""
+Demand-driven reorder recommendations over the stock_moves ledger.
+
+Each policy returns the same records as db.recommend_order_quantities(), so
+callers can switch policy with a parameter:
+
+  mvp              target = reorder_point + min_level (the original rule)
+  moving_average   mean weekly demand over the history window
+  exp_smoothing    exponentially weighted weekly demand (alpha per week)
+
+Demand is ISSUE quantity, read from the demand_weekly rollup that triggers
+keep in step with stock_moves. One grouped query returns, per item, the
+sums of weekly demand and of its square (weighted by (1 - alpha) ** weeks-ago
+for exp_smoothing); everything after that is NumPy over all items at once:
+
+  weekly mean m, std-dev s     from the weighted sums (weeks without moves count as 0)
+  safety stock  = z(service_level) * s/sqrt(7) * sqrt(lead_time_days)
+  reorder point = m/7 * lead_time_days + safety stock
+  EOQ           = sqrt(2 * annual demand * order_cost / holding_cost)
+  order qty     = max(EOQ, reorder point + min_level - available) once available <= reorder point
+
+available is available-to-promise, on_hand - reserved + open PO quantity,
+as in db.list_low_stock().
+
+Items with no demand in the window fall back to the MVP rule.
+"""
+import math
+import sqlite3
+from datetime import datetime
+from statistics import NormalDist
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from .db import _catalog, get_conn, recommend_order_quantities
+
+DEFAULT_HISTORY_WEEKS = 26
+
+def _current_week() -> int:
+  return (datetime.utcnow() - datetime(1970, 1, 1)).days // 7
+
+def _load_items(conn) -> Dict[str, np.ndarray]:
+  rows = conn.execute("""
+    SELECT i.id, i.reorder_point, i.min_level, i.lead_time_days,
+           COALESCE(inv.on_hand, 0), COALESCE(inv.reserved, 0), COALESCE(oo.qty, 0)
+    FROM items i
+    LEFT JOIN inventory inv ON inv.item_id = i.id
+    LEFT JOIN on_order oo ON oo.item_id = i.id
+    ORDER BY i.id
+  """).fetchall()
+  arr = np.array([tuple(r) for r in rows], dtype=np.int64).reshape(-1, 7)
+  return {
+    "id": arr[:, 0],
+    "reorder_point": arr[:, 1].astype(np.float64),
+    "min_level": arr[:, 2].astype(np.float64),
+    "lead_time_days": arr[:, 3].astype(np.float64),
+    "on_hand": arr[:, 4].astype(np.float64),
+    "reserved": arr[:, 5].astype(np.float64),
+    "on_order": arr[:, 6].astype(np.float64),
+    "available": (arr[:, 4] - arr[:, 5] + arr[:, 6]).astype(np.float64),
+  }
+
+def _has_math_functions(conn) -> bool:
+  try:
+    conn.execute("SELECT pow(2, 2)").fetchone()
+    return True
+  except sqlite3.OperationalError:
+    return False
+
+def _load_demand_moments(conn, item_ids: np.ndarray, history_weeks: int, decay: float):
+  """
+  Per item: sum(w * qty) and sum(w * qty^2) over the last history_weeks
+  weeks, with w = decay ** (weeks ago). Returns two arrays aligned with item_ids.
+  """
+  now = _current_week()
+  if decay == 1:
+    rows = conn.execute("""
+      SELECT item_id, SUM(qty), SUM(qty * qty)
+      FROM demand_weekly
+      WHERE week > ?
+      GROUP BY item_id
+    """, (now - history_weeks,)).fetchall()
+  elif _has_math_functions(conn):
+    rows = conn.execute("""
+      SELECT item_id, SUM(qty * pow(?, ? - week)), SUM(qty * qty * pow(?, ? - week))
+      FROM demand_weekly
+      WHERE week > ?
+      GROUP BY item_id
+    """, (decay, now, decay, now, now - history_weeks)).fetchall()
+  else:
+    # SQLite built without math functions: join a table of per-age weights instead.
+    ages = ",".join("(?, ?)" for _ in range(history_weeks))
+    params: List[Any] = [v for age in range(history_weeks) for v in (age, decay ** age)]
+    rows = conn.execute(f"""
+      WITH w(age, wt) AS (VALUES {ages})
+      SELECT d.item_id, SUM(w.wt * d.qty), SUM(w.wt * d.qty * d.qty)
+      FROM demand_weekly d
+      CROSS JOIN w
+      WHERE d.week > ? AND w.age = ? - d.week
+      GROUP BY d.item_id
+    """, (*params, now - history_weeks, now)).fetchall()
+  s1 = np.zeros(len(item_ids))
+  s2 = np.zeros(len(item_ids))
+  if rows:
+    arr = np.array([tuple(r) for r in rows], dtype=np.float64)
+    ids = arr[:, 0].astype(np.int64)
+    idx = np.minimum(np.searchsorted(item_ids, ids), len(item_ids) - 1)
+    ok = item_ids[idx] == ids
+    s1[idx[ok]] = arr[ok, 1]
+    s2[idx[ok]] = arr[ok, 2]
+  return s1, s2
+
+def _forecast_recommendations(
+  decay: float,
+  history_weeks: int = DEFAULT_HISTORY_WEEKS,
+  service_level: float = 0.95,
+  order_cost: float = 50.0,
+  holding_cost: float = 1.0,
+) -> List[Dict[str, Any]]:
+  with get_conn() as conn:
+    items = _load_items(conn)
+    if not len(items["id"]):
+      return []
+    s1, s2 = _load_demand_moments(conn, items["id"], history_weeks, decay)
+
+  total = (decay ** np.arange(history_weeks)).sum()
+  weekly = s1 / total
+  sd_weekly = np.sqrt(np.maximum(s2 / total - weekly ** 2, 0))
+  daily = weekly / 7
+  sd_daily = sd_weekly / math.sqrt(7)
+  lead = items["lead_time_days"]
+
+  z = NormalDist().inv_cdf(service_level)
+  rop = daily * lead + z * sd_daily * np.sqrt(lead)
+  eoq = np.sqrt(2 * daily * 365 * order_cost / holding_cost)
+  qty = np.maximum(eoq, rop + items["min_level"] - items["available"])
+
+  # No demand history: nothing to forecast from, use the static MVP rule.
+  cold = s1 == 0
+  rop = np.ceil(np.where(cold, items["reorder_point"], rop))
+  qty = np.ceil(np.where(cold, items["reorder_point"] + items["min_level"] - items["available"], qty))
+
+  pick = np.flatnonzero((items["available"] <= rop) & (qty > 0))
+  # Largest shortage first, like list_low_stock().
+  pick = pick[np.lexsort((items["id"][pick], -(rop[pick] - items["available"][pick])))]
+  return _records(items, pick, rop, qty)
+
+def _records(items: Dict[str, np.ndarray], pick: np.ndarray, rop: np.ndarray, qty: np.ndarray) -> List[Dict[str, Any]]:
+  if not len(pick):
+    return []
+  # sku/name/unit/supplier from the catalog cache, as in recommend_order_quantities.
+  # Read after _load_items, so every picked item is in it unless deleted since.
+  with get_conn() as conn:
+    by_id = _catalog(conn).by_id
+  ids = [int(i) for i in items["id"][pick]]
+  return [
+    {
+      "sku": by_id[item_id]["sku"],
+      "name": by_id[item_id]["name"],
+      "unit": by_id[item_id]["unit"],
+      "on_hand": int(items["on_hand"][k]),
+      "reserved": int(items["reserved"][k]),
+      "on_order": int(items["on_order"][k]),
+      "available": int(items["available"][k]),
+      "reorder_point": int(rop[k]),
+      "min_level": int(items["min_level"][k]),
+      "recommended_qty": int(qty[k]),
+      "supplier": by_id[item_id]["supplier"],
+      "lead_time_days": int(items["lead_time_days"][k]),
+    }
+    for item_id, k in zip(ids, pick)
+    if item_id in by_id
+  ]
+
+def _moving_average(**params: Any) -> List[Dict[str, Any]]:
+  return _forecast_recommendations(1.0, **params)
+
+def _exp_smoothing(alpha: float = 0.3, **params: Any) -> List[Dict[str, Any]]:
+  return _forecast_recommendations(1 - alpha, **params)
+
+POLICIES: Dict[str, Callable[..., List[Dict[str, Any]]]] = {
+  "mvp": lambda **_: recommend_order_quantities(),
+  "moving_average": _moving_average,
+  "exp_smoothing": _exp_smoothing,
+}
+
+def recommend(policy: str = "mvp", **params: Any) -> List[Dict[str, Any]]:
+  """
+  Reorder recommendations under `policy` (see POLICIES). Extra keyword
+  parameters (history_weeks, service_level, order_cost, holding_cost, alpha)
+  tune the forecasting policies.
+  Raises ValueError for an unknown policy.
+  """
+  if policy not in POLICIES:
+    raise ValueError(f"Unknown policy '{policy}'. Use one of: {', '.join(POLICIES)}.")
+  return POLICIES[policy](**params)
@@ -0,0 +1,327 @@
+"""
+Bounded conversation history for model calls and the ADK session store.
+
+ADK replays every event of a session to the model on every call, so a long
+chat resends each table and PO listing it ever fetched. before_model_callback
+trims the request (the stored session is not touched):
+
+  - only the last PROCUREMENT_HISTORY_TURNS user turns are sent; a turn is a
+    user message plus everything up to the next one, so function calls and
+    their results are always dropped together;
+  - in turns before the current one, tool results longer than
+    PROCUREMENT_HISTORY_MAX_RESULT_CHARS are replaced with a summary (status,
+    row counts, columns, the first few ids / SKUs) and a note to call the
+    tool again for the full data;
+  - if the estimate is still over PROCUREMENT_HISTORY_MAX_TOKENS, more of the
+    oldest turns are dropped (the current turn is always kept).
+
+compact_session_db() applies the same policy to the session DB that `adk web`
+/ `adk api_server` keep (PROCUREMENT_SESSION_DB): idle sessions are deleted,
+old events dropped and old bulky tool results rewritten as summaries. It is
+registered as the "compact_sessions" maintenance task on the first model call
+when that file exists.
+
+stats() reports the estimated tokens (characters / 4) sent before and after
+trimming, per call and in total.
+
+  PROCUREMENT_HISTORY=0   send the full history
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from . import maintenance
+
+ENABLED = os.getenv("PROCUREMENT_HISTORY", "1").lower() not in ("0", "false", "no", "off")
+HISTORY_TURNS = max(1, int(os.getenv("PROCUREMENT_HISTORY_TURNS", "6")))
+MAX_RESULT_CHARS = int(os.getenv("PROCUREMENT_HISTORY_MAX_RESULT_CHARS", "2000"))
+MAX_TOKENS = int(os.getenv("PROCUREMENT_HISTORY_MAX_TOKENS", "30000"))  # 0 = no budget
+
+SESSION_DB = os.getenv("PROCUREMENT_SESSION_DB", str(Path(__file__).resolve().parent / ".adk" / "session.db"))
+SESSION_KEEP_TURNS = max(1, int(os.getenv("PROCUREMENT_SESSION_KEEP_TURNS", "50")))
+SESSION_MAX_AGE_DAYS = float(os.getenv("PROCUREMENT_SESSION_MAX_AGE_DAYS", "30"))  # 0 = keep idle sessions
+SESSION_COMPACT_INTERVAL_S = float(os.getenv("PROCUREMENT_SESSION_COMPACT_INTERVAL_S", "3600"))
+
+log = logging.getLogger("procurementAgent.history")
+
+# Keys whose values identify a row; the first few are kept in summaries.
+_ID_KEYS = ("id", "po_id", "sku", "item_id", "reservation_id", "supplier", "name")
+_SAMPLE_IDS = 10
+_SMALL_CHARS = 200
+_NOTE = "Older tool result shortened to save context; call the tool again for the full data."
+
+_CHARS_PER_TOKEN = 4
+
+# -------------------- Summaries --------------------
+
+def _dumps(value: Any) -> str:
+  return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _column_keys(columns: Any) -> Optional[List[str]]:
+  if not isinstance(columns, list):
+    return None
+  return [c.get("key") if isinstance(c, dict) else c for c in columns]
+
+def _ids(rows: List[Any], columns: Optional[List[str]]) -> List[Any]:
+  """The first few identifying values of a list of row dicts or columnar rows."""
+  sample = rows[:_SAMPLE_IDS]
+  if sample and all(isinstance(r, dict) for r in sample):
+    key = next((k for k in _ID_KEYS if k in sample[0]), None)
+    return [r.get(key) for r in sample] if key else []
+  if sample and columns and all(isinstance(r, list) for r in sample):
+    i = next((columns.index(k) for k in _ID_KEYS if k in columns), None)
+    if i is None:
+      return []
+    i += max(0, len(sample[0]) - len(columns))  # paged rows lead with id even when the table columns omit it
+    return [r[i] for r in sample if i < len(r)]
+  return []
+
+def _summarize(value: Any, columns: Optional[List[str]] = None) -> Any:
+  if len(_dumps(value)) <= _SMALL_CHARS:
+    return value
+  if isinstance(value, dict):
+    cols = _column_keys(value.get("columns")) or columns
+    return {k: (cols if k == "columns" and cols else _summarize(v, cols)) for k, v in value.items()}
+  if isinstance(value, list):
+    out: Dict[str, Any] = {"count": len(value)}
+    ids = _ids(value, columns)
+    if ids:
+      out["first_ids"] = ids
+    return out
+  if isinstance(value, str):
+    return value[:_SMALL_CHARS] + "..."
+  return value
+
+def summarize_result(response: Dict[str, Any], max_chars: int = MAX_RESULT_CHARS) -> Optional[Dict[str, Any]]:
+  """
+  A compact stand-in for a tool result longer than max_chars, or None when it
+  is short enough (or the summary would not be shorter) to keep as is.
+  """
+  if not isinstance(response, dict) or response.get("summarized"):
+    return None
+  size = len(_dumps(response))
+  if size <= max_chars:
+    return None
+  summary = {**_summarize(response), "summarized": _NOTE}
+  return summary if len(_dumps(summary)) < size else None
+
+# -------------------- Trimming --------------------
+
+def _is_user_turn(content: types.Content) -> bool:
+  """A user message (not the tool results ADK also sends with role "user")."""
+  return content.role == "user" and any(p.text for p in content.parts or [])
+
+def _content_chars(content: types.Content) -> int:
+  n = 0
+  for p in content.parts or []:
+    if p.text:
+      n += len(p.text)
+    if p.function_call:
+      n += len(p.function_call.name or "") + len(_dumps(p.function_call.args or {}))
+    if p.function_response:
+      n += len(p.function_response.name or "") + len(_dumps(p.function_response.response or {}))
+  return n
+
+def estimate_tokens(contents: List[types.Content]) -> int:
+  return sum(_content_chars(c) for c in contents) // _CHARS_PER_TOKEN
+
+def _turn_starts(contents: List[types.Content]) -> List[int]:
+  return [i for i, c in enumerate(contents) if _is_user_turn(c)]
+
+def _shorten(content: types.Content) -> Tuple[types.Content, int]:
+  """content with its bulky tool results summarized (a copy; ADK's events are not modified)."""
+  parts, shortened = [], 0
+  for p in content.parts or []:
+    fr = p.function_response
+    summary = summarize_result(fr.response) if fr is not None else None
+    if summary is None:
+      parts.append(p)
+      continue
+    parts.append(types.Part(function_response=types.FunctionResponse(id=fr.id, name=fr.name, response=summary)))
+    shortened += 1
+  return (types.Content(role=content.role, parts=parts) if shortened else content), shortened
+
+def trim(contents: List[types.Content]) -> Tuple[List[types.Content], Dict[str, int]]:
+  """
+  contents cut to the last HISTORY_TURNS user turns, with bulky tool results
+  before the current turn summarized and then whole turns dropped until the
+  estimate fits MAX_TOKENS. Returns (contents, counts).
+  """
+  starts = _turn_starts(contents)
+  dropped_turns = max(0, len(starts) - HISTORY_TURNS)
+  cut = starts[dropped_turns] if dropped_turns else 0
+  kept = contents[cut:]
+  current = (starts[-1] - cut) if starts else 0
+
+  shortened = 0
+  out: List[types.Content] = []
+  for i, content in enumerate(kept):
+    if i < current:
+      content, n = _shorten(content)
+      shortened += n
+    out.append(content)
+
+  if MAX_TOKENS > 0:
+    turn_starts = _turn_starts(out)
+    while len(turn_starts) > 1 and estimate_tokens(out) > MAX_TOKENS:
+      out = out[turn_starts[1]:]
+      turn_starts = _turn_starts(out)
+      dropped_turns += 1
+  return out, {"dropped_turns": dropped_turns, "dropped_contents": len(contents) - len(out), "summarized_results": shortened}
+
+# -------------------- Stats --------------------
+
+_stats_lock = threading.Lock()
+_totals: Dict[str, int] = {}
+_last: Dict[str, int] = {}
+
+def _record(before: int, after: int, counts: Dict[str, int]) -> None:
+  with _stats_lock:
+    _last.clear()
+    _last.update(tokens_before=before, tokens_after=after, tokens_saved=before - after, **counts)
+    for k, v in _last.items():
+      _totals[k] = _totals.get(k, 0) + v
+    _totals["calls"] = _totals.get("calls", 0) + 1
+
+def stats() -> Dict[str, Any]:
+  """Estimated tokens sent to the model with and without trimming: totals, per-call average and the last call."""
+  with _stats_lock:
+    calls = _totals.get("calls", 0)
+    return {
+      "enabled": ENABLED,
+      "turns": HISTORY_TURNS,
+      "max_result_chars": MAX_RESULT_CHARS,
+      "max_tokens": MAX_TOKENS,
+      "totals": dict(_totals),
+      "avg_tokens_saved_per_call": round(_totals.get("tokens_saved", 0) / calls, 1) if calls else 0.0,
+      "last": dict(_last),
+    }
+
+def reset_stats() -> None:
+  with _stats_lock:
+    _totals.clear()
+    _last.clear()
+
+# -------------------- ADK callback --------------------
+
+_scheduled = False
+
+def _schedule_compaction() -> None:
+  global _scheduled
+  _scheduled = True
+  if SESSION_COMPACT_INTERVAL_S > 0 and os.path.exists(SESSION_DB):
+    maintenance.register("compact_sessions", SESSION_COMPACT_INTERVAL_S, compact_session_db)
+
+def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+  if not _scheduled:
+    _schedule_compaction()
+  if not ENABLED or not llm_request.contents:
+    return None
+  before = estimate_tokens(llm_request.contents)
+  llm_request.contents, counts = trim(llm_request.contents)
+  after = estimate_tokens(llm_request.contents)
+  _record(before, after, counts)
+  if before != after:
+    log.debug("history: %d -> %d tokens (%r)", before, after, counts)
+  return None  # never answers itself; the model (or the next callback) still runs
+
+# -------------------- Session DB compaction --------------------
+
+def _is_stored_user_turn(data: Dict[str, Any]) -> bool:
+  content = data.get("content") or {}
+  return data.get("author") == "user" and any(p.get("text") for p in content.get("parts") or [])
+
+def _shorten_event(data: Dict[str, Any]) -> bool:
+  """Summarize bulky function_response payloads of a stored event in place; True if any changed."""
+  changed = False
+  for part in (data.get("content") or {}).get("parts") or []:
+    fr = part.get("function_response")
+    summary = summarize_result(fr.get("response")) if fr else None
+    if summary is not None:
+      fr["response"] = summary
+      changed = True
+  return changed
+
+def compact_session_db(
+  path: Optional[str] = None,
+  keep_turns: Optional[int] = None,
+  max_age_days: Optional[float] = None,
+) -> Dict[str, Any]:
+  """
+  Shrink an ADK session DB: delete sessions idle for more than max_age_days,
+  drop events before each session's last keep_turns user turns, summarize
+  bulky tool results before its last HISTORY_TURNS turns, then VACUUM.
+  Registered as the "compact_sessions" maintenance task.
+  """
+  path = path or SESSION_DB
+  keep_turns = SESSION_KEEP_TURNS if keep_turns is None else max(1, keep_turns)
+  max_age_days = SESSION_MAX_AGE_DAYS if max_age_days is None else max_age_days
+  if not os.path.exists(path):
+    return {"status": "error", "error_message": f"Session DB not found: {path}"}
+  bytes_before = os.path.getsize(path)
+  conn = sqlite3.connect(path, timeout=30)
+  conn.row_factory = sqlite3.Row
+  try:
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(events)")}
+    if "event_data" not in cols:
+      return {"status": "error", "error_message": "Unsupported session DB schema (no events.event_data)."}
+    sessions_deleted = events_deleted = events_shortened = 0
+    with conn:
+      if max_age_days > 0:
+        cutoff = time.time() - max_age_days * 86400
+        idle = conn.execute(
+          "SELECT app_name, user_id, id FROM sessions WHERE update_time < ?", (cutoff,),
+        ).fetchall()
+        for s in idle:
+          events_deleted += conn.execute(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", tuple(s),
+          ).rowcount
+        sessions_deleted = conn.executemany(
+          "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", [tuple(s) for s in idle],
+        ).rowcount if idle else 0
+
+      for s in conn.execute("SELECT app_name, user_id, id FROM sessions").fetchall():
+        events = conn.execute(
+          "SELECT id, event_data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+          " ORDER BY timestamp, rowid",
+          tuple(s),
+        ).fetchall()
+        parsed = [(e["id"], json.loads(e["event_data"])) for e in events]
+        starts = [i for i, (_, d) in enumerate(parsed) if _is_stored_user_turn(d)]
+        if len(starts) > keep_turns:
+          cut = starts[-keep_turns]
+          events_deleted += conn.executemany(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND id = ?",
+            [(*tuple(s), eid) for eid, _ in parsed[:cut]],
+          ).rowcount
+          parsed, starts = parsed[cut:], [i - cut for i in starts if i >= cut]
+        old_end = starts[-HISTORY_TURNS] if len(starts) > HISTORY_TURNS else 0
+        updates = [(_dumps(d), *tuple(s), eid) for eid, d in parsed[:old_end] if _shorten_event(d)]
+        if updates:
+          conn.executemany(
+            "UPDATE events SET event_data = ? WHERE app_name = ? AND user_id = ? AND session_id = ? AND id = ?",
+            updates,
+          )
+          events_shortened += len(updates)
+    if sessions_deleted or events_deleted or events_shortened:
+      conn.execute("VACUUM")
+  finally:
+    conn.close()
+  return {
+    "status": "success",
+    "path": path,
+    "sessions_deleted": sessions_deleted,
+    "events_deleted": events_deleted,
+    "events_shortened": events_shortened,
+    "bytes_before": bytes_before,
+    "bytes_after": os.path.getsize(path),
+  }
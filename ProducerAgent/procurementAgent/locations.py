@@ -0,0 +1,463 @@
+"""
+Multi-warehouse inventory: one SQLite file per location, one shared catalog.
+
+  PROCUREMENT_LOCATIONS="north,south=/data/south.db"   # bare names: <PROCUREMENT_LOCATIONS_DIR>/<name>.db
+
+The default location (PROCUREMENT_DEFAULT_LOCATION, "main") is db.DB_PATH, so
+every function in db.py keeps working unchanged as the default location's API.
+The other files carry the same schema: each site has its own inventory,
+ledger, reservations and low_stock, and its own write lock, so one busy site
+does not block the rest. Their items / suppliers are a copy of the default
+location's, re-synced (same ids) whenever its catalog_version moves.
+
+Handles to the other files are kept in an LRU of at most
+PROCUREMENT_LOCATION_MAX_OPEN connections, each behind its own lock.
+Cross-location reads (total_stock, low_stock_by_location,
+network_recommendations) run on every location in parallel on a thread pool
+and are merged here.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import db
+
+DEFAULT_LOCATION = os.getenv("PROCUREMENT_DEFAULT_LOCATION", "main")
+LOCATIONS_DIR = os.getenv("PROCUREMENT_LOCATIONS_DIR", "")  # default: next to DB_PATH
+LOCATION_MAX_OPEN = int(os.getenv("PROCUREMENT_LOCATION_MAX_OPEN", "16"))
+LOCATION_WORKERS = int(os.getenv("PROCUREMENT_LOCATION_WORKERS", "8"))
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def _parse(spec: str) -> Dict[str, Optional[Path]]:
+  """'north,south=/data/south.db' -> {"north": None, "south": Path(...)}; None = default file name."""
+  locations: Dict[str, Optional[Path]] = {}
+  for part in spec.split(","):
+    name, _, path = part.strip().partition("=")
+    if name.strip():
+      locations[name.strip()] = Path(path.strip()).resolve() if path.strip() else None
+  return locations
+
+_locations = _parse(os.getenv("PROCUREMENT_LOCATIONS", ""))
+
+def _path(name: str) -> Path:
+  path = _locations[name]
+  if path is not None:
+    return path
+  return (Path(LOCATIONS_DIR).resolve() if LOCATIONS_DIR else db.DB_PATH.parent) / f"{name}.db"
+
+def location_names() -> List[str]:
+  return [DEFAULT_LOCATION, *(n for n in _locations if n != DEFAULT_LOCATION)]
+
+def _unknown(location: str) -> Optional[Dict[str, Any]]:
+  if location == DEFAULT_LOCATION or location in _locations:
+    return None
+  return {"status": "error", "error_message": f"Unknown location '{location}'. Use one of: {', '.join(location_names())}."}
+
+def add_location(name: str, path: Optional[str] = None) -> Dict[str, Any]:
+  """Register a location (its file is created and migrated on first use)."""
+  if not _NAME_RE.match(name or "") or name == DEFAULT_LOCATION:
+    return {"status": "error", "error_message": f"Invalid location name '{name}'."}
+  _locations[name] = Path(path).resolve() if path else None
+  _close(name)
+  return {"status": "success", "location": name, "path": str(_path(name))}
+
+def remove_location(name: str) -> Dict[str, Any]:
+  """Forget a location and close its handle; the file is left in place."""
+  if name not in _locations:
+    return _unknown(name) or {"status": "error", "error_message": "The default location cannot be removed."}
+  _close(name)
+  del _locations[name]
+  return {"status": "success", "location": name}
+
+# -------------------- Handles --------------------
+
+class _Handle:
+  __slots__ = ("name", "path", "conn", "lock", "closed", "catalog")
+
+  def __init__(self, name: str, path: Path):
+    self.name = name
+    self.path = path
+    self.conn: Optional[sqlite3.Connection] = None
+    self.lock = threading.Lock()
+    self.closed = False
+    self.catalog: Optional[tuple] = None  # (source DB path, catalog_version) last synced
+
+_handles: "OrderedDict[str, _Handle]" = OrderedDict()
+_handles_lock = threading.Lock()
+_stats = {"hits": 0, "opened": 0, "evicted": 0, "catalog_syncs": 0}
+
+# Which catalog a location file was last synced from, so a reopened handle
+# does not copy the catalog again.
+_LOCATION_SQL = """
+CREATE TABLE IF NOT EXISTS catalog_source (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  db_path TEXT NOT NULL,
+  version INTEGER NOT NULL
+);
+"""
+
+def _shut(h: _Handle) -> None:
+  h.closed = True
+  if h.conn is not None:
+    try:
+      h.conn.close()
+    except sqlite3.Error:
+      pass
+    h.conn = None
+
+def _evict_locked(keep: str) -> None:
+  """Close least recently used idle handles beyond LOCATION_MAX_OPEN (caller holds _handles_lock)."""
+  for name in list(_handles):
+    if len(_handles) <= LOCATION_MAX_OPEN:
+      return
+    h = _handles[name]
+    if name == keep or not h.lock.acquire(blocking=False):
+      continue  # busy handles stay open; the LRU shrinks again on a later call
+    try:
+      _shut(h)
+    finally:
+      h.lock.release()
+    del _handles[name]
+    _stats["evicted"] += 1
+
+def _close(name: str) -> None:
+  with _handles_lock:
+    h = _handles.pop(name, None)
+  if h is not None:
+    with h.lock:
+      _shut(h)
+
+def close_all() -> None:
+  """Close every location handle (they reopen on next use)."""
+  for name in list(_handles):
+    _close(name)
+
+def _open(h: _Handle) -> None:
+  conn = db._open_conn(h.path)
+  if db._schema_version(conn) != db.SCHEMA_VERSION:
+    db._migrate(conn, seed=False)
+    conn.commit()
+  conn.executescript(_LOCATION_SQL)
+  row = conn.execute("SELECT db_path, version FROM catalog_source WHERE id = 1").fetchone()
+  h.catalog = (row["db_path"], row["version"]) if row else None
+  h.conn = conn
+
+_ITEM_COLS = ["id", "sku", "name", "unit", "reorder_point", "min_level", "lead_time_days", "preferred_supplier_id"]
+_SUPPLIER_COLS = ["id", "name", "email", "phone"]
+
+def _upsert_sql(table: str, cols: List[str]) -> str:
+  # Rows that did not change are skipped, so a re-sync fires no triggers for them.
+  rest = cols[1:]
+  return (
+    f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+    f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in rest)} "
+    f"WHERE {' OR '.join(f'{table}.{c} IS NOT excluded.{c}' for c in rest)}"
+  )
+
+# What still points at an item / supplier in a location file. Stale rows (gone
+# from the shared catalog) that are referenced cannot be deleted, and deleting
+# an item would cascade its inventory away, so they stay: renamed if the
+# catalog reuses their sku / name, and skipped by the cross-location reads.
+_REFERENCES = {
+  "items": [("inventory", "item_id"), ("stock_moves", "item_id"), ("purchase_order_lines", "item_id"), ("stock_reservations", "item_id")],
+  "suppliers": [("items", "preferred_supplier_id"), ("purchase_orders", "supplier_id")],
+}
+
+def _drop_stale(conn: sqlite3.Connection, table: str, key: str, rows: List[tuple]) -> None:
+  """Delete the location's rows of `table` missing from `rows` (id first), or retire the referenced ones."""
+  keep = {r[0] for r in rows}
+  taken = {r[1] for r in rows}
+  stale = [r[0] for r in conn.execute(f"SELECT id FROM {table}") if r[0] not in keep]
+  used = " OR ".join(f"EXISTS (SELECT 1 FROM {t} WHERE {c} = x.id)" for t, c in _REFERENCES[table])
+  for chunk in db._chunks(stale):
+    for r in conn.execute(f"SELECT x.id, x.{key}, {used} FROM {table} x WHERE x.id IN ({','.join('?' * len(chunk))})", chunk).fetchall():
+      if not r[2]:
+        conn.execute(f"DELETE FROM {table} WHERE id = ?", (r[0],))
+      elif r[1] in taken:
+        conn.execute(f"UPDATE {table} SET {key} = ? WHERE id = ?", (f"{r[1]} (removed #{r[0]})", r[0]))
+
+def _sync_catalog(h: _Handle) -> None:
+  """Copy items / suppliers from the default location if its catalog_version moved."""
+  with db.get_conn() as src:
+    source = (str(db.DB_PATH), src.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0])
+    if source == h.catalog:
+      return
+    suppliers = [tuple(r) for r in src.execute(f"SELECT {', '.join(_SUPPLIER_COLS)} FROM suppliers")]
+    items = [tuple(r) for r in src.execute(f"SELECT {', '.join(_ITEM_COLS)} FROM items")]
+  conn = h.conn
+  conn.execute("BEGIN IMMEDIATE")
+  try:
+    _drop_stale(conn, "items", "sku", items)
+    _drop_stale(conn, "suppliers", "name", suppliers)
+    conn.executemany(_upsert_sql("suppliers", _SUPPLIER_COLS), suppliers)
+    conn.executemany(_upsert_sql("items", _ITEM_COLS), items)
+    conn.execute("INSERT OR REPLACE INTO catalog_source (id, db_path, version) VALUES (1, ?, ?)", source)
+    conn.commit()
+  except BaseException:
+    conn.rollback()
+    raise
+  h.catalog = source
+  _stats["catalog_syncs"] += 1
+
+@contextmanager
+def location_conn(location: str):
+  """
+  Connection for `location`, committed when the block succeeds. The default
+  location uses db.get_conn(); any other holds its handle's lock for the
+  block, so use one location at a time per thread.
+  """
+  if location == DEFAULT_LOCATION:
+    with db.get_conn() as conn:
+      yield conn
+    return
+  path = _path(location)
+  while True:
+    with _handles_lock:
+      h = _handles.get(location)
+      if h is None or h.path != path:
+        h = _handles[location] = _Handle(location, path)
+      else:
+        _stats["hits"] += 1
+      _handles.move_to_end(location)
+      _evict_locked(keep=location)
+    with h.lock:
+      if h.closed:  # evicted between lookup and lock
+        continue
+      if h.conn is None:
+        _open(h)
+        _stats["opened"] += 1
+      _sync_catalog(h)
+      try:
+        yield h.conn
+        h.conn.commit()
+      except BaseException:
+        h.conn.rollback()
+        raise
+    return
+
+def _write(location: str, fn: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+  """fn(conn, *args) in one write transaction at `location` (the writer thread for the default one)."""
+  if location == DEFAULT_LOCATION:
+    return db._run_write(fn, *args)
+  with location_conn(location) as conn:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      return fn(conn, *args)
+    except db._AbortTxn as e:
+      conn.rollback()
+      return e.result
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+  global _executor
+  if _executor is None:
+    with _executor_lock:
+      if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=LOCATION_WORKERS, thread_name_prefix="procurement-location")
+  return _executor
+
+def _fan_out(fn: Callable[[sqlite3.Connection], Any], locations: Optional[List[str]] = None) -> Dict[str, Any]:
+  """fn(conn) on every location in parallel -> {location: result}, in location order."""
+  names = locations or location_names()
+
+  def run(name: str) -> Any:
+    with location_conn(name) as conn:
+      return fn(conn)
+
+  if len(names) == 1:
+    return {names[0]: run(names[0])}
+  futures = {name: _get_executor().submit(run, name) for name in names}
+  return {name: f.result() for name, f in futures.items()}
+
+def _shared_catalog() -> "db._CatalogSnapshot":
+  with db.get_conn() as conn:
+    return db._catalog(conn)
+
+def list_locations() -> Dict[str, Any]:
+  with _handles_lock:
+    open_names = {n for n, h in _handles.items() if h.conn is not None}
+  return {
+    "status": "success",
+    "default": DEFAULT_LOCATION,
+    "locations": [
+      {"name": n, "path": str(db.DB_PATH if n == DEFAULT_LOCATION else _path(n)), "open": n == DEFAULT_LOCATION or n in open_names}
+      for n in location_names()
+    ],
+  }
+
+def handle_stats() -> Dict[str, Any]:
+  """LRU counters: hits, opened, evicted, catalog_syncs, plus open / max_open."""
+  with _handles_lock:
+    open_count = sum(1 for h in _handles.values() if h.conn is not None)
+    return {"status": "success", "open": open_count, "max_open": LOCATION_MAX_OPEN, **_stats}
+
+# -------------------- Stock at one location --------------------
+
+def _adjust_stock_txn(conn: sqlite3.Connection, location: str, lines: List[Dict[str, Any]], ref: str) -> Dict[str, Any]:
+  if not lines:
+    raise db._AbortTxn({"status": "error", "error_message": "No lines given."})
+  cat = _shared_catalog()
+  missing = sorted({ln["sku_or_name"] for ln in lines if cat.lookup(ln["sku_or_name"]) is None})
+  if missing:
+    raise db._AbortTxn({"status": "error", "error_message": f"Items not found: {', '.join(missing)}."})
+  delta: Dict[int, int] = {}
+  for ln in lines:
+    item_id = cat.lookup(ln["sku_or_name"])["id"]
+    delta[item_id] = delta.get(item_id, 0) + int(ln["qty"])
+
+  # Under BEGIN IMMEDIATE (or on the writer thread for the default location)
+  # nobody else writes this location between this read and the updates below.
+  stock = db._stock_by_item(conn, list(delta))
+  after = {i: (stock[i]["on_hand"] if i in stock else 0) + d for i, d in delta.items()}
+  short = [cat.by_id[i]["sku"] for i in delta if after[i] < (stock[i]["reserved"] if i in stock else 0)]
+  if short:
+    raise db._AbortTxn({
+      "status": "error",
+      "error_message": f"Adjustment would take {', '.join(short)} below zero or below the reserved quantity.",
+    })
+  now = db._now_iso()
+  conn.executemany("""
+    INSERT INTO inventory (item_id, on_hand, reserved, updated_at)
+    VALUES (?, ?, 0, ?)
+    ON CONFLICT(item_id) DO UPDATE SET
+      on_hand = on_hand + excluded.on_hand,
+      updated_at = excluded.updated_at
+  """, [(i, d, now) for i, d in delta.items()])
+  conn.executemany(
+    "INSERT INTO stock_moves (item_id, qty, type, ref, created_at) VALUES (?, ?, 'ADJUST', ?, ?)",
+    [(i, d, ref or None, now) for i, d in delta.items() if d],
+  )
+  return {
+    "status": "success",
+    "location": location,
+    "items": [{"sku": cat.by_id[i]["sku"], "on_hand": after[i]} for i in delta],
+  }
+
+def adjust_stock(location: str, lines: List[Dict[str, Any]], ref: str = "") -> Dict[str, Any]:
+  """
+  Add (qty > 0) or remove (qty < 0) stock at one location, all or nothing,
+  with one ADJUST ledger row per item. lines: [{"sku_or_name": "...", "qty": -3}, ...]
+  """
+  return _unknown(location) or _write(location, _adjust_stock_txn, location, lines, ref)
+
+# -------------------- Across locations --------------------
+
+_LOW_SQL = """
+  SELECT ls.item_id, inv.on_hand, inv.reserved, COALESCE(oo.qty, 0) AS on_order
+  FROM low_stock ls
+  JOIN inventory inv ON inv.item_id = ls.item_id
+  LEFT JOIN on_order oo ON oo.item_id = ls.item_id
+  ORDER BY ls.shortage DESC, ls.item_id
+"""
+
+TOTAL_STOCK_COLUMNS = ["sku", "name", "unit", "on_hand", "reserved", "on_order", "available"]
+LOW_STOCK_COLUMNS = ["sku", "name", "on_hand", "reserved", "on_order", "available", "reorder_point", "supplier"]
+
+def total_stock(limit: int = db.DEFAULT_PAGE_SIZE, after_id: Optional[int] = None) -> Dict[str, Any]:
+  """
+  Network stock per item (summed over all locations), one keyset page in id
+  order, plus on_hand per location in "on_hand_by_location" (same row order).
+  """
+  limit = db._clamp_limit(limit)
+  after = int(after_id or 0)
+
+  def page(conn: sqlite3.Connection) -> List[tuple]:
+    return [tuple(r) for r in conn.execute("""
+      SELECT inv.item_id, inv.on_hand, inv.reserved, COALESCE(oo.qty, 0)
+      FROM inventory inv
+      LEFT JOIN on_order oo ON oo.item_id = inv.item_id
+      WHERE inv.item_id > ?
+      ORDER BY inv.item_id
+      LIMIT ?
+    """, (after, limit + 1))]
+
+  pages = _fan_out(page)
+  # Each location returned its first limit+1 ids, so the smallest limit+1 of the union are exact.
+  ids = sorted({r[0] for rows in pages.values() for r in rows})[:limit + 1]
+  has_more = len(ids) > limit
+  next_after_id = ids[limit - 1] if has_more else None
+  # Items since removed from the shared catalog still count for paging, not in the rows.
+  cat = _shared_catalog()
+  ids = [i for i in ids[:limit] if i in cat.by_id]
+  wanted = set(ids)
+  totals = {i: [0, 0, 0] for i in ids}
+  by_location: Dict[str, List[int]] = {}
+  for name, rows in pages.items():
+    at = {r[0]: r for r in rows if r[0] in wanted}
+    for i, r in at.items():
+      totals[i][0] += r[1]
+      totals[i][1] += r[2]
+      totals[i][2] += r[3]
+    by_location[name] = [at[i][1] if i in at else 0 for i in ids]
+  rows = [
+    [cat.by_id[i]["sku"], cat.by_id[i]["name"], cat.by_id[i]["unit"], *totals[i], totals[i][0] - totals[i][1] + totals[i][2]]
+    for i in ids
+  ]
+  return {
+    "status": "success",
+    "columns": TOTAL_STOCK_COLUMNS,
+    "rows": rows,
+    "on_hand_by_location": by_location,
+    "next_after_id": next_after_id,
+  }
+
+def _low_by_location(limit: Optional[int]) -> Dict[str, List[sqlite3.Row]]:
+  sql = _LOW_SQL + ("" if limit is None else f" LIMIT {int(limit)}")
+  return _fan_out(lambda conn: conn.execute(sql).fetchall())
+
+def low_stock_by_location(limit: int = db.DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+  """Low stock (available <= reorder_point) at each location, largest shortage first, at most `limit` rows per site."""
+  cat = _shared_catalog()
+  sites = {}
+  for name, rows in _low_by_location(db._clamp_limit(limit)).items():
+    out = []
+    for r in rows:
+      item = cat.by_id.get(r["item_id"])
+      if item is None:
+        continue  # no longer in the shared catalog
+      out.append([item["sku"], item["name"], r["on_hand"], r["reserved"], r["on_order"],
+                  r["on_hand"] - r["reserved"] + r["on_order"], item["reorder_point"], item["supplier"]])
+    sites[name] = {"columns": LOW_STOCK_COLUMNS, "rows": out}
+  return {"status": "success", "locations": sites}
+
+def network_recommendations(notes: str = "") -> Dict[str, Any]:
+  """
+  The MVP reorder rule (target = reorder_point + min_level, order target -
+  available) applied at every location and merged per item: one
+  recommendation per SKU with the total quantity and the split per location
+  in "by_location". draft_orders groups them by preferred supplier, as
+  db.split_recommendations_by_supplier does, for one central order.
+  """
+  cat = _shared_catalog()
+  merged: Dict[int, Dict[str, Any]] = {}
+  for name, rows in _low_by_location(None).items():
+    for r in rows:
+      item = cat.by_id.get(r["item_id"])
+      if item is None:
+        continue
+      available = r["on_hand"] - r["reserved"] + r["on_order"]
+      qty = item["reorder_point"] + item["min_level"] - available
+      if qty <= 0:
+        continue
+      rec = merged.get(r["item_id"])
+      if rec is None:
+        rec = merged[r["item_id"]] = {
+          "sku": item["sku"], "name": item["name"], "unit": item["unit"],
+          "on_hand": 0, "available": 0, "recommended_qty": 0,
+          "supplier": item["supplier"], "lead_time_days": item["lead_time_days"], "by_location": {},
+        }
+      rec["on_hand"] += r["on_hand"]
+      rec["available"] += available
+      rec["recommended_qty"] += qty
+      rec["by_location"][name] = qty
+  recs = sorted(merged.values(), key=lambda x: (-x["recommended_qty"], x["sku"]))
+  return {"status": "success", "recommendations": recs, "draft_orders": db.split_recommendations_by_supplier(recs, notes)}
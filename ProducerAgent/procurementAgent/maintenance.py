@@ -0,0 +1,102 @@
+"""
+Background maintenance thread for periodic jobs (online backups and the like).
+
+  maintenance.register("backup", 300, lambda: db.backup_to("/var/backups/procurement.db"))
+
+Tasks run one at a time on a single daemon thread, off the request path. A
+task that raises is logged and retried at its next interval; status() reports
+runs, last result and last error per task.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("procurementAgent.maintenance")
+
+class _Task:
+  __slots__ = ("name", "interval_s", "fn", "next_run", "runs", "last_run", "last_seconds", "last_result", "last_error")
+
+  def __init__(self, name: str, interval_s: float, fn: Callable[[], Any], run_immediately: bool):
+    self.name = name
+    self.interval_s = interval_s
+    self.fn = fn
+    self.next_run = time.monotonic() + (0 if run_immediately else interval_s)
+    self.runs = 0
+    self.last_run: Optional[float] = None
+    self.last_seconds: Optional[float] = None
+    self.last_result: Any = None
+    self.last_error: Optional[str] = None
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_tasks: Dict[str, _Task] = {}
+_thread: Optional[threading.Thread] = None
+
+def register(name: str, interval_s: float, fn: Callable[[], Any], run_immediately: bool = False) -> None:
+  """Run fn every interval_s seconds (replacing any task of the same name) and start the thread."""
+  with _lock:
+    _tasks[name] = _Task(name, max(1.0, float(interval_s)), fn, run_immediately)
+  start()
+  _wake.set()
+
+def unregister(name: str) -> None:
+  with _lock:
+    _tasks.pop(name, None)
+
+def start() -> None:
+  global _thread
+  with _lock:
+    if _thread is None or not _thread.is_alive():
+      _thread = threading.Thread(target=_loop, name="procurement-maintenance", daemon=True)
+      _thread.start()
+
+def _run(task: _Task) -> None:
+  start = time.perf_counter()
+  try:
+    task.last_result = task.fn()
+    task.last_error = None
+  except Exception as e:
+    task.last_error = f"{type(e).__name__}: {e}"
+    log.exception("maintenance task %s failed", task.name)
+  task.runs += 1
+  task.last_run = time.time()
+  task.last_seconds = round(time.perf_counter() - start, 3)
+
+def _loop() -> None:
+  while True:
+    now = time.monotonic()
+    with _lock:
+      due = [t for t in _tasks.values() if t.next_run <= now]
+      for t in due:
+        t.next_run = now + t.interval_s
+      upcoming = min((t.next_run for t in _tasks.values()), default=now + 60)
+    for t in due:
+      _run(t)
+    _wake.wait(timeout=max(0.0, min(upcoming - time.monotonic(), 60)))
+    _wake.clear()
+
+def run_now(name: str) -> Dict[str, Any]:
+  """Run a registered task on the calling thread and return its status."""
+  with _lock:
+    task = _tasks.get(name)
+  if task is None:
+    return {"status": "error", "error_message": f"No maintenance task '{name}'."}
+  _run(task)
+  return {"status": "success", **_task_status(task)}
+
+def _task_status(t: _Task) -> Dict[str, Any]:
+  return {
+    "name": t.name,
+    "interval_s": t.interval_s,
+    "runs": t.runs,
+    "last_run": t.last_run,
+    "last_seconds": t.last_seconds,
+    "last_result": t.last_result,
+    "last_error": t.last_error,
+  }
+
+def status() -> Dict[str, Any]:
+  with _lock:
+    tasks = [_task_status(t) for t in _tasks.values()]
+  return {"status": "success", "running": _thread is not None and _thread.is_alive(), "tasks": tasks}
@@ -0,0 +1,57 @@
+"""
+Maintenance commands for the procurement database.
+
+  python -m procurementAgent.manage rebuild-low-stock
+  python -m procurementAgent.manage check-low-stock
+  python -m procurementAgent.manage rebuild-demand
+  python -m procurementAgent.manage rebuild-search
+  python -m procurementAgent.manage rebuild-analytics
+  python -m procurementAgent.manage compact-changes
+  python -m procurementAgent.manage expire-reservations
+  python -m procurementAgent.manage snapshot-stock
+  python -m procurementAgent.manage rebuild-stock-snapshots
+  python -m procurementAgent.manage compact-sessions [PATH]  # default: PROCUREMENT_SESSION_DB
+  python -m procurementAgent.manage snapshot PATH     # build/migrate the DB, then copy it to PATH
+  python -m procurementAgent.manage backup [PATH]     # default: PROCUREMENT_DB_BACKUP_PATH
+  python -m procurementAgent.manage restore PATH
+"""
+import argparse
+import json
+from typing import Any, Callable, Dict
+
+from . import db, history
+
+COMMANDS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+  "rebuild-low-stock": lambda args: db.rebuild_low_stock(),
+  "check-low-stock": lambda args: db.check_low_stock_consistency(),
+  "rebuild-demand": lambda args: db.rebuild_demand_weekly(),
+  "rebuild-search": lambda args: db.rebuild_search_index(),
+  "rebuild-analytics": lambda args: db.rebuild_analytics(),
+  "compact-changes": lambda args: db.compact_change_log(),
+  "expire-reservations": lambda args: db.expire_reservations(),
+  "snapshot-stock": lambda args: db.snapshot_stock(),
+  "rebuild-stock-snapshots": lambda args: db.rebuild_stock_snapshots(),
+  "compact-sessions": lambda args: history.compact_session_db(args.path),
+  "snapshot": lambda args: db.backup_to(args.path),
+  "backup": lambda args: db.backup_to(args.path),
+  "restore": lambda args: db.restore_from(args.path),
+}
+
+_NEEDS_PATH = {"snapshot", "backup", "restore"}
+
+def main() -> int:
+  parser = argparse.ArgumentParser(prog="python -m procurementAgent.manage", description=__doc__.strip().splitlines()[0])
+  parser.add_argument("command", choices=sorted(COMMANDS))
+  parser.add_argument("path", nargs="?", help="database file for snapshot / backup / restore / compact-sessions")
+  args = parser.parse_args()
+  if args.command == "backup":
+    args.path = args.path or db.DB_BACKUP_PATH
+  if args.command in _NEEDS_PATH and not args.path:
+    parser.error(f"{args.command} needs a PATH")
+  db.init_db_if_needed()
+  result = COMMANDS[args.command](args)
+  print(json.dumps(result, indent=2, default=str))
+  return 0 if result.get("status") == "success" else 1
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,316 @@
+"""
+In-process latency metrics for agent tools and SQL statements.
+
+  PROCUREMENT_METRICS=1            record tool and query histograms
+  PROCUREMENT_SLOW_QUERY_MS=200    log statements slower than this (logger
+                                   "procurementAgent.slow_query"), even with metrics off
+
+Tools are wrapped with instrument_tool(); queries are timed by the connection
+class db.py picks when either setting is on (see db._open_conn). With both off
+the tool wrapper costs one flag check and connections are not wrapped at all.
+Read the numbers with snapshot() (JSON-friendly dict) or prometheus_text().
+"""
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Upper bounds in seconds, Prometheus-style; the last bucket is +Inf.
+BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct query labels kept; further statements are counted under "other".
+MAX_SERIES = 500
+
+SLOW_QUERY_MS = float(os.getenv("PROCUREMENT_SLOW_QUERY_MS", "0"))
+_enabled = os.getenv("PROCUREMENT_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+slow_log = logging.getLogger("procurementAgent.slow_query")
+
+class _Series:
+  __slots__ = ("buckets", "count", "total", "max", "rows", "bytes", "errors")
+
+  def __init__(self):
+    self.buckets = [0] * (len(BUCKETS) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.rows = 0
+    self.bytes = 0
+    self.errors = 0
+
+  def observe(self, seconds: float, rows: int, nbytes: int, error: bool) -> None:
+    i = 0
+    while i < len(BUCKETS) and seconds > BUCKETS[i]:
+      i += 1
+    self.buckets[i] += 1
+    self.count += 1
+    self.total += seconds
+    self.max = max(self.max, seconds)
+    self.rows += rows
+    self.bytes += nbytes
+    self.errors += error
+
+  def quantile(self, q: float) -> float:
+    """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)."""
+    rank = q * self.count
+    seen = 0
+    for i, n in enumerate(self.buckets):
+      seen += n
+      if seen >= rank and n:
+        return BUCKETS[i] if i < len(BUCKETS) else self.max
+    return self.max
+
+  def as_dict(self) -> Dict[str, Any]:
+    cumulative, le = 0, {}
+    for bound, n in zip(BUCKETS + (float("inf"),), self.buckets):
+      cumulative += n
+      le["+Inf" if bound == float("inf") else f"{bound:g}"] = cumulative
+    return {
+      "count": self.count,
+      "errors": self.errors,
+      "sum_ms": round(self.total * 1000, 3),
+      "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+      "p50_ms": round(self.quantile(0.50) * 1000, 3),
+      "p95_ms": round(self.quantile(0.95) * 1000, 3),
+      "max_ms": round(self.max * 1000, 3),
+      "rows": self.rows,
+      "bytes": self.bytes,
+      "buckets": le,
+    }
+
+_lock = threading.Lock()
+_tools: Dict[str, _Series] = {}
+_queries: Dict[str, _Series] = {}
+_toggle_hooks: List[Callable[[], None]] = []
+
+def enabled() -> bool:
+  return _enabled
+
+def queries_instrumented() -> bool:
+  """Whether new connections should time their statements."""
+  return _enabled or SLOW_QUERY_MS > 0
+
+def enable(flag: bool = True, slow_query_ms: Optional[float] = None) -> None:
+  """Turn recording on or off at runtime (and optionally set the slow-query threshold)."""
+  global _enabled, SLOW_QUERY_MS
+  _enabled = bool(flag)
+  if slow_query_ms is not None:
+    SLOW_QUERY_MS = float(slow_query_ms)
+  for hook in list(_toggle_hooks):
+    hook()
+
+def on_toggle(hook: Callable[[], None]) -> None:
+  """Call hook after enable(); db.py uses it to reopen connections with or without timing."""
+  _toggle_hooks.append(hook)
+
+def reset() -> None:
+  with _lock:
+    _tools.clear()
+    _queries.clear()
+
+def _observe(table: Dict[str, _Series], key: str, seconds: float, rows: int, nbytes: int, error: bool) -> None:
+  with _lock:
+    series = table.get(key)
+    if series is None:
+      if len(table) >= MAX_SERIES:
+        key = "other"
+        series = table.get(key)
+      if series is None:
+        series = table[key] = _Series()
+    series.observe(seconds, rows, nbytes, error)
+
+# -------------------- Queries --------------------
+
+_IN_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=1024)
+def query_label(sql: str) -> str:
+  """Statement text with whitespace collapsed and placeholder lists folded to '?...'."""
+  label = _IN_LIST.sub("?...", _SPACE.sub(" ", sql).strip())
+  return label if len(label) <= 200 else label[:197] + "..."
+
+def record_query(sql: str, params: Any, seconds: float, rows: int, error: bool = False) -> None:
+  if _enabled:
+    _observe(_queries, query_label(sql), seconds, rows, 0, error)
+  if SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS:
+    slow_log.warning("slow query %.1f ms, %d rows: %s params=%.200r", seconds * 1000, rows, query_label(sql), params)
+
+class TimedCursor:
+  """
+  Wraps a SELECT cursor: rows are fetched lazily, so time and rows accumulate
+  over the fetches and are recorded once the cursor is exhausted or dropped.
+  """
+  __slots__ = ("_cur", "_sql", "_params", "_seconds", "_rows", "_done")
+
+  def __init__(self, cur, sql: str, params: Any, seconds: float):
+    self._cur = cur
+    self._sql = sql
+    self._params = params
+    self._seconds = seconds
+    self._rows = 0
+    self._done = False
+
+  def _finish(self) -> None:
+    if not self._done:
+      self._done = True
+      record_query(self._sql, self._params, self._seconds, self._rows)
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    t = time.perf_counter()
+    try:
+      row = next(self._cur)
+    except StopIteration:
+      self._seconds += time.perf_counter() - t
+      self._finish()
+      raise
+    self._seconds += time.perf_counter() - t
+    self._rows += 1
+    return row
+
+  def fetchone(self):
+    t = time.perf_counter()
+    row = self._cur.fetchone()
+    self._seconds += time.perf_counter() - t
+    if row is None:
+      self._finish()
+    else:
+      self._rows += 1
+    return row
+
+  def fetchmany(self, size: Optional[int] = None):
+    t = time.perf_counter()
+    rows = self._cur.fetchmany(self._cur.arraysize if size is None else size)
+    self._seconds += time.perf_counter() - t
+    self._rows += len(rows)
+    if not rows:
+      self._finish()
+    return rows
+
+  def fetchall(self):
+    t = time.perf_counter()
+    rows = self._cur.fetchall()
+    self._seconds += time.perf_counter() - t
+    self._rows += len(rows)
+    self._finish()
+    return rows
+
+  def close(self) -> None:
+    self._cur.close()
+    self._finish()
+
+  def __getattr__(self, name: str) -> Any:
+    return getattr(self._cur, name)
+
+  def __del__(self):
+    self._finish()
+
+def timed_execute(execute: Callable[..., Any], sql: str, params: Any = ()) -> Any:
+  """Run execute(sql, params); DML is recorded at once, SELECTs via TimedCursor."""
+  t = time.perf_counter()
+  try:
+    cur = execute(sql, params)
+  except Exception:
+    record_query(sql, params, time.perf_counter() - t, 0, error=True)
+    raise
+  seconds = time.perf_counter() - t
+  if cur.description is None:
+    record_query(sql, params, seconds, max(cur.rowcount, 0))
+    return cur
+  return TimedCursor(cur, sql, params, seconds)
+
+def timed_executemany(executemany: Callable[..., Any], sql: str, seq: Any) -> Any:
+  t = time.perf_counter()
+  try:
+    cur = executemany(sql, seq)
+  except Exception:
+    record_query(sql, None, time.perf_counter() - t, 0, error=True)
+    raise
+  record_query(sql, None, time.perf_counter() - t, max(cur.rowcount, 0))
+  return cur
+
+# -------------------- Tools --------------------
+
+def _result_rows(result: Any) -> int:
+  if isinstance(result, dict):
+    return sum(len(v) for v in result.values() if isinstance(v, list))
+  return len(result) if isinstance(result, list) else 0
+
+def instrument_tool(fn: Callable[..., T]) -> Callable[..., T]:
+  """
+  Record latency, rows (total length of list values in the result) and JSON
+  payload size per call. Results with status "error" count as errors.
+  """
+  name = fn.__name__
+
+  @functools.wraps(fn)
+  def wrapper(*args: Any, **kwargs: Any) -> T:
+    if not _enabled:
+      return fn(*args, **kwargs)
+    t = time.perf_counter()
+    try:
+      result = fn(*args, **kwargs)
+    except Exception:
+      _observe(_tools, name, time.perf_counter() - t, 0, 0, True)
+      raise
+    seconds = time.perf_counter() - t
+    error = isinstance(result, dict) and result.get("status") == "error"
+    _observe(_tools, name, seconds, _result_rows(result), len(json.dumps(result, default=str)), error)
+    return result
+
+  return wrapper
+
+# -------------------- Export --------------------
+
+def snapshot() -> Dict[str, Any]:
+  """All recorded series as plain dicts (milliseconds)."""
+  with _lock:
+    return {
+      "enabled": _enabled,
+      "slow_query_ms": SLOW_QUERY_MS,
+      "tools": {k: s.as_dict() for k, s in sorted(_tools.items())},
+      "queries": {k: s.as_dict() for k, s in sorted(_queries.items())},
+    }
+
+def _label(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prometheus_family(lines: List[str], prefix: str, label: str, series: Dict[str, _Series], what: str) -> None:
+  lines.append(f"# HELP {prefix}_duration_seconds {what} latency.")
+  lines.append(f"# TYPE {prefix}_duration_seconds histogram")
+  for key, s in sorted(series.items()):
+    lbl = f'{label}="{_label(key)}"'
+    cumulative = 0
+    for bound, n in zip(BUCKETS + (float("inf"),), s.buckets):
+      cumulative += n
+      le = "+Inf" if bound == float("inf") else f"{bound:g}"
+      lines.append(f'{prefix}_duration_seconds_bucket{{{lbl},le="{le}"}} {cumulative}')
+    lines.append(f"{prefix}_duration_seconds_sum{{{lbl}}} {s.total:.6f}")
+    lines.append(f"{prefix}_duration_seconds_count{{{lbl}}} {s.count}")
+  for metric, attr, help_text in (
+    ("rows_total", "rows", "Rows returned or affected."),
+    ("payload_bytes_total", "bytes", "JSON payload bytes returned."),
+    ("errors_total", "errors", "Calls that raised or returned an error."),
+  ):
+    if attr == "bytes" and prefix.endswith("query"):
+      continue
+    lines.append(f"# HELP {prefix}_{metric} {help_text}")
+    lines.append(f"# TYPE {prefix}_{metric} counter")
+    for key, s in sorted(series.items()):
+      lines.append(f'{prefix}_{metric}{{{label}="{_label(key)}"}} {getattr(s, attr)}')
+
+def prometheus_text() -> str:
+  """Prometheus text exposition of every series."""
+  lines: List[str] = []
+  with _lock:
+    _prometheus_family(lines, "procurement_tool", "tool", _tools, "Agent tool call")
+    _prometheus_family(lines, "procurement_query", "query", _queries, "SQL statement")
+  return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+"""
+Named table queries for the external UI.
+
+tool_emit_table(query_name, ...) builds the same "table" event that
+tool_emit_ui emits, straight from a query, so the model never has to copy
+rows into its own output. Rows are column-oriented: payload["columns"] lists
+{"key", "label"} once and every row is an array in that order
+(payload["meta"]["row_format"] == "columnar").
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import analytics, db
+from .forecast import POLICIES, recommend
+
+Columns = List[Tuple[str, str]]
+
+ITEM_COLUMNS: Columns = [
+  ("sku", "SKU"), ("name", "Name"), ("unit", "Unit"), ("on_hand", "On hand"),
+  ("reorder_point", "Reorder point"), ("min_level", "Min level"),
+  ("supplier", "Supplier"), ("lead_time_days", "Lead time (days)"),
+]
+LOW_STOCK_COLUMNS: Columns = [
+  ("sku", "SKU"), ("name", "Name"), ("unit", "Unit"), ("on_hand", "On hand"),
+  ("reserved", "Reserved"), ("on_order", "On order"), ("available", "Available"),
+  ("reorder_point", "Reorder point"), ("min_level", "Min level"),
+  ("supplier", "Supplier"), ("lead_time_days", "Lead time (days)"),
+]
+RECOMMENDATION_COLUMNS: Columns = [
+  ("sku", "SKU"), ("name", "Name"), ("unit", "Unit"), ("on_hand", "On hand"), ("available", "Available"),
+  ("reorder_point", "Reorder point"), ("min_level", "Min level"),
+  ("recommended_qty", "Recommended qty"), ("supplier", "Supplier"), ("lead_time_days", "Lead time (days)"),
+]
+PO_COLUMNS: Columns = [
+  ("id", "PO ID"), ("supplier", "Supplier"), ("status", "Status"),
+  ("created_at", "Created"), ("expected_at", "Expected"), ("line_count", "#Lines"),
+]
+PO_LINE_COLUMNS: Columns = [
+  ("sku", "SKU"), ("name", "Name"), ("qty", "Qty"), ("received_qty", "Received"), ("unit_price", "Unit price"),
+]
+
+SPEND_COLUMNS: Columns = list(zip(analytics.SPEND_COLUMNS, [
+  "Supplier", "Month", "#POs", "Ordered qty", "Ordered amount", "Received qty", "Received amount",
+]))
+AGING_COLUMNS: Columns = list(zip(analytics.AGING_COLUMNS, [
+  "Supplier", "Open POs", "Outstanding qty", "Outstanding amount",
+  "0-7 days", "8-30 days", "31-90 days", "90+ days", "Overdue", "Oldest",
+]))
+LEAD_TIME_COLUMNS: Columns = list(zip(analytics.LEAD_TIME_COLUMNS, [
+  "Supplier", "Receipts", "Avg actual (days)", "Avg promised (days)", "Mean abs. error (days)", "Late %",
+]))
+
+class _Table:
+  __slots__ = ("title", "columns", "load")
+
+  def __init__(self, title: str, columns: Columns, load: Callable[..., Dict[str, Any]]):
+    self.title = title
+    self.columns = columns
+    self.load = load
+
+def _keys(columns: Columns) -> List[str]:
+  return [k for k, _ in columns]
+
+def _items(limit: int, after_id: Optional[int], **_: Any) -> Dict[str, Any]:
+  page = db.list_items_page(limit=limit, after_id=after_id, fields=_keys(ITEM_COLUMNS), columnar=True)
+  return {**page, "rows": page.pop("items")}
+
+def _low_stock(**_: Any) -> Dict[str, Any]:
+  return {"status": "success", "rows": db.to_columnar(db.list_low_stock(), _keys(LOW_STOCK_COLUMNS))["rows"]}
+
+def _recommendations(policy: str = "mvp", **_: Any) -> Dict[str, Any]:
+  if policy not in POLICIES:
+    return {"status": "error", "error_message": f"Unknown policy '{policy}'. Use one of: {', '.join(POLICIES)}."}
+  return {"status": "success", "rows": db.to_columnar(recommend(policy), _keys(RECOMMENDATION_COLUMNS))["rows"]}
+
+def _purchase_orders(statuses: Optional[List[str]]) -> Callable[..., Dict[str, Any]]:
+  def load(limit: int, after_id: Optional[int], status: Optional[str] = None, **_: Any) -> Dict[str, Any]:
+    wanted = statuses if statuses is not None else ([status] if status else None)
+    if wanted and not set(wanted) <= {"DRAFT", "PLACED", "RECEIVED", "CANCELLED"}:
+      return {"status": "error", "error_message": "Invalid status. Use one of: DRAFT, PLACED, RECEIVED, CANCELLED (or omit)."}
+    page = db.list_purchase_orders_page(wanted, limit=limit, after_id=after_id, fields=_keys(PO_COLUMNS), columnar=True)
+    return {**page, "rows": page.pop("purchase_orders")}
+  return load
+
+def _po_lines(po_id: Optional[int] = None, **_: Any) -> Dict[str, Any]:
+  if po_id is None:
+    return {"status": "error", "error_message": "po_lines needs po_id."}
+  po = db.get_purchase_order(po_id)
+  if po["status"] != "success":
+    return po
+  return {"status": "success", "rows": db.to_columnar(po["lines"], _keys(PO_LINE_COLUMNS))["rows"], "po": po["po"]}
+
+def _report(run: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+  def load(supplier_name: Optional[str] = None, **_: Any) -> Dict[str, Any]:
+    result = run(supplier_name=supplier_name)
+    return result if result["status"] != "success" else {"status": "success", "rows": result["rows"]}
+  return load
+
+TABLES: Dict[str, _Table] = {
+  "items": _Table("Inventory", ITEM_COLUMNS, _items),
+  "low_stock": _Table("Low stock", LOW_STOCK_COLUMNS, _low_stock),
+  "recommendations": _Table("Reorder recommendations", RECOMMENDATION_COLUMNS, _recommendations),
+  "purchase_orders": _Table("Purchase orders", PO_COLUMNS, _purchase_orders(None)),
+  "open_purchase_orders": _Table("Open purchase orders", PO_COLUMNS, _purchase_orders(["DRAFT", "PLACED"])),
+  "received_purchase_orders": _Table("Received purchase orders", PO_COLUMNS, _purchase_orders(["RECEIVED"])),
+  "po_lines": _Table("Purchase order lines", PO_LINE_COLUMNS, _po_lines),
+  "spend_by_supplier": _Table("Spend by supplier and month", SPEND_COLUMNS, _report(analytics.spend_by_supplier)),
+  "open_po_aging": _Table("Open purchase order aging", AGING_COLUMNS, _report(analytics.open_po_aging)),
+  "lead_time_accuracy": _Table("Supplier lead-time accuracy", LEAD_TIME_COLUMNS, _report(analytics.lead_time_accuracy)),
+}
+
+def build_table(
+  query_name: str,
+  status: Optional[str] = None,
+  policy: str = "mvp",
+  po_id: Optional[int] = None,
+  limit: int = db.DEFAULT_PAGE_SIZE,
+  after_id: Optional[int] = None,
+  supplier_name: Optional[str] = None,
+) -> Dict[str, Any]:
+  """
+  Run the named query and return a "table" UI event with columnar rows.
+  Paged queries (items, *purchase_orders) carry next_after_id / total_hint in meta;
+  the reports (spend_by_supplier, open_po_aging, lead_time_accuracy) take supplier_name.
+  """
+  table = TABLES.get(query_name)
+  if table is None:
+    return {"status": "error", "error_message": f"Unknown table '{query_name}'. Use one of: {', '.join(TABLES)}."}
+  result = table.load(
+    status=status, policy=policy, po_id=po_id, limit=limit, after_id=after_id, supplier_name=supplier_name,
+  )
+  if result["status"] != "success":
+    return result
+  meta: Dict[str, Any] = {"query": query_name, "row_format": "columnar", "row_count": len(result["rows"])}
+  for key in ("next_after_id", "total_hint", "po"):
+    if key in result:
+      meta[key] = result[key]
+  title = table.title if query_name != "po_lines" else f"{table.title} - PO {po_id}"
+  return {
+    "status": "success",
+    "event_type": "table",
+    "payload": {
+      "title": title,
+      "columns": [{"key": k, "label": label} for k, label in table.columns],
+      "rows": result["rows"],
+      "meta": meta,
+    },
+  }
@@ -0,0 +1,101 @@
+"""
+Single writer thread with group commit.
+
+Every write submitted here runs on one thread, which owns the only
+connection that writes, so sessions never fight over SQLite's write lock
+("database is locked" / busy waits). Ops that queue up while a group is
+committing share the next transaction and commit (up to
+PROCUREMENT_WRITE_MAX_BATCH); PROCUREMENT_WRITE_BATCH_MS > 0 additionally
+waits that long for more ops, which pays off when commits are expensive
+(synchronous=FULL, slow disks). db._commit_group gives each op its own
+SAVEPOINT so one failure does not undo the others.
+
+When PROCUREMENT_WRITE_QUEUE_DEPTH ops are already waiting, submit() raises
+WriterBusy at once instead of queueing behind a lock timeout.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+WRITER_ENABLED = os.getenv("PROCUREMENT_WRITER", "1").lower() not in ("0", "false", "no", "off")
+WRITE_BATCH_MS = float(os.getenv("PROCUREMENT_WRITE_BATCH_MS", "0"))
+WRITE_MAX_BATCH = int(os.getenv("PROCUREMENT_WRITE_MAX_BATCH", "64"))
+WRITE_QUEUE_DEPTH = int(os.getenv("PROCUREMENT_WRITE_QUEUE_DEPTH", "256"))
+
+class WriterBusy(RuntimeError):
+  """The write queue is full; the caller should retry later."""
+
+class WriteOp:
+  __slots__ = ("fn", "args", "kwargs", "future")
+
+  def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+    self.fn = fn
+    self.args = args
+    self.kwargs = kwargs
+    self.future: Future = Future()
+
+class Writer:
+  """
+  Owns the writer thread. `commit_group(ops)` runs a list of WriteOps in one
+  transaction and resolves their futures; it is called on the writer thread only.
+  """
+
+  def __init__(self, commit_group: Callable[[List[WriteOp]], None]):
+    self._commit_group = commit_group
+    self._queue: "queue.Queue[WriteOp]" = queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+    self._thread: Optional[threading.Thread] = None
+    self._lock = threading.Lock()
+    self._stats = {"ops": 0, "batches": 0, "max_batch": 0, "rejected": 0}
+
+  def on_writer_thread(self) -> bool:
+    return threading.current_thread() is self._thread
+
+  def _ensure_thread(self) -> None:
+    if self._thread is None or not self._thread.is_alive():
+      with self._lock:
+        if self._thread is None or not self._thread.is_alive():
+          self._thread = threading.Thread(target=self._loop, name="procurement-writer", daemon=True)
+          self._thread.start()
+
+  def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Queue fn(conn, *args, **kwargs). Raises WriterBusy when the queue is full."""
+    self._ensure_thread()
+    op = WriteOp(fn, args, kwargs)
+    try:
+      self._queue.put_nowait(op)
+    except queue.Full:
+      with self._lock:
+        self._stats["rejected"] += 1
+      raise WriterBusy(f"Write queue is full ({WRITE_QUEUE_DEPTH} pending writes); try again shortly.") from None
+    return op.future
+
+  def _loop(self) -> None:
+    while True:
+      batch = [self._queue.get()]
+      deadline = time.monotonic() + WRITE_BATCH_MS / 1000
+      while len(batch) < WRITE_MAX_BATCH:
+        remaining = deadline - time.monotonic()
+        try:
+          batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+        except queue.Empty:
+          break
+      try:
+        self._commit_group(batch)
+      except BaseException as e:  # never let the writer thread die
+        for op in batch:
+          if not op.future.done():
+            op.future.set_exception(e)
+      with self._lock:
+        self._stats["ops"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      stats = dict(self._stats)
+    stats["queued"] = self._queue.qsize()
+    stats["avg_batch"] = round(stats["ops"] / stats["batches"], 2) if stats["batches"] else 0.0
+    return stats
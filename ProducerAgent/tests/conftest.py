@@ -0,0 +1,19 @@
+import pytest
+
+from procurementAgent import db
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+  """A new database with the seed rows (Acme / Mediterranean, COF-001 ... MIL-001), for one test."""
+  monkeypatch.setattr(db, "DB_BACKUP_PATH", "")
+  monkeypatch.setattr(db, "DB_SNAPSHOT", "")
+  monkeypatch.setattr(db, "DB_PATH", tmp_path / "procurement.db")
+  db.init_db_if_needed()
+  return db.DB_PATH
+
+def on_hand(sku: str) -> int:
+  return db.get_item_by_name_or_sku(sku)["on_hand"]
+
+def count(sql: str, *params) -> int:
+  with db.get_conn() as conn:
+    return conn.execute(sql, params).fetchone()[0]
@@ -0,0 +1,67 @@
+import pytest
+
+from procurementAgent import bulk_io, db, locations
+
+@pytest.fixture
+def sites(fresh_db, tmp_path, monkeypatch):
+  """The seed database as "main" plus north / south / east next to it, at most two handles open."""
+  monkeypatch.setattr(locations, "_locations", {"north": None, "south": None, "east": None})
+  monkeypatch.setattr(locations, "LOCATIONS_DIR", str(tmp_path))
+  monkeypatch.setattr(locations, "LOCATION_MAX_OPEN", 2)
+  monkeypatch.setattr(locations, "_stats", {"hits": 0, "opened": 0, "evicted": 0, "catalog_syncs": 0})
+  yield
+  locations.close_all()
+
+def _total(sku):
+  rows = locations.total_stock(limit=100)
+  return {r[0]: r for r in rows["rows"]}.get(sku), rows["on_hand_by_location"]
+
+def _remove_item(sku):
+  def txn(conn):
+    item_id = conn.execute("SELECT id FROM items WHERE sku = ?", (sku,)).fetchone()[0]
+    conn.execute("DELETE FROM inventory WHERE item_id = ?", (item_id,))
+    conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+    return {"status": "success"}
+  assert db._run_write(txn)["status"] == "success"
+
+def test_least_recently_used_handle_is_closed_and_reopens(sites):
+  for name in ("north", "south", "east"):
+    assert locations.adjust_stock(name, [{"sku_or_name": "COF-001", "qty": 2}])["status"] == "success"
+  stats = locations.handle_stats()
+  assert (stats["open"], stats["opened"], stats["evicted"]) == (2, 3, 1)
+  assert {l["name"]: l["open"] for l in locations.list_locations()["locations"]} == {"main": True, "north": False, "south": True, "east": True}
+
+  assert locations.adjust_stock("north", [{"sku_or_name": "COF-001", "qty": 1}])["items"][0]["on_hand"] == 3
+  stats = locations.handle_stats()
+  assert (stats["open"], stats["opened"], stats["evicted"]) == (2, 4, 2)
+
+def test_total_stock_sums_every_location(sites):
+  locations.adjust_stock("north", [{"sku_or_name": "COF-001", "qty": 5}, {"sku_or_name": "MIL-001", "qty": 4}])
+  locations.adjust_stock("south", [{"sku_or_name": "COF-001", "qty": 3}])
+  row, by_location = _total("COF-001")
+  assert row[3] == 7 + 5 + 3 and row[6] == row[3] - row[4] + row[5]
+  order = [r[0] for r in locations.total_stock(limit=100)["rows"]]
+  coffee = order.index("COF-001")
+  assert [by_location[n][coffee] for n in ("main", "north", "south", "east")] == [7, 5, 3, 0]
+
+  first = locations.total_stock(limit=2)
+  rest = locations.total_stock(limit=100, after_id=first["next_after_id"])
+  assert [r[0] for r in first["rows"] + rest["rows"]] == order
+
+def test_item_removed_from_catalog_is_skipped_at_every_location(sites):
+  bulk_io.import_rows("items", [{"sku": "TMP-001", "name": "Temp Item", "reorder_point": 10}])
+  locations.adjust_stock("north", [{"sku_or_name": "TMP-001", "qty": 4}])
+  assert "TMP-001" in [r[0] for r in locations.low_stock_by_location()["locations"]["north"]["rows"]]
+
+  old_id = db.get_item_by_name_or_sku("TMP-001")["id"]
+  _remove_item("TMP-001")
+  assert all("TMP-001" not in [r[0] for r in site["rows"]] for site in locations.low_stock_by_location()["locations"].values())
+  assert "TMP-001" not in [r["sku"] for r in locations.network_recommendations()["recommendations"]]
+  assert _total("TMP-001")[0] is None
+
+  # The retired row keeps north's stock and ledger and frees the sku for a new item.
+  bulk_io.import_rows("items", [{"sku": "TMP-001", "name": "Temp Item v2"}])
+  assert locations.adjust_stock("north", [{"sku_or_name": "TMP-001", "qty": 1}])["items"] == [{"sku": "TMP-001", "on_hand": 1}]
+  with locations.location_conn("north") as conn:
+    assert sorted(r[0] for r in conn.execute("SELECT sku FROM items WHERE sku LIKE 'TMP-001%'")) == ["TMP-001", f"TMP-001 (removed #{old_id})"]
+    assert conn.execute("SELECT on_hand FROM inventory WHERE item_id = ?", (old_id,)).fetchone()[0] == 4
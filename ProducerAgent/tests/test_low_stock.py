@@ -0,0 +1,42 @@
+from procurementAgent import bulk_io, db, locations
+
+def _low():
+  return {r["sku"]: r["available"] for r in db.list_low_stock()}
+
+def _check():
+  result = db.check_low_stock_consistency()
+  assert result["consistent"], result
+  return _low()
+
+def test_low_stock_set_follows_every_write(fresh_db):
+  # Seed: COF 7/12, TUN 9/24 (+12 on order), RCE 12/8, SUG 3/10, MIL 18/20.
+  assert _check() == {"COF-001": 7, "TUN-001": 21, "SUG-001": 3, "MIL-001": 18}
+
+  po = db.create_purchase_order("Acme Supplies", [{"sku_or_name": "SUG-001", "qty": 20}])
+  assert "SUG-001" not in _check()
+
+  db.receive_purchase_orders([{"po_id": 1, "lines": [{"sku_or_name": "TUN-001", "qty": 5}]}])
+  assert _check()["TUN-001"] == 21  # on hand +5, on order -5
+  db.receive_purchase_orders([{"po_id": po["po_id"]}])
+  assert "SUG-001" not in _check()
+
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 5}], ref="SO-1")
+  assert _check()["RCE-005"] == 7
+  db.release_reservations(ref="SO-1")
+  assert "RCE-005" not in _check()
+
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 6}], ref="old", ttl_minutes=30)
+  assert "RCE-005" in _check()
+  with db.get_conn() as conn:
+    conn.execute("UPDATE stock_reservations SET expires_at = '2000-01-01T00:00:00Z' WHERE ref = 'old'")
+  assert db.expire_reservations()["released"] == 1
+  assert "RCE-005" not in _check()
+
+  locations.adjust_stock(locations.DEFAULT_LOCATION, [{"sku_or_name": "COF-001", "qty": 10}, {"sku_or_name": "RCE-005", "qty": -6}])
+  low = _check()
+  assert "COF-001" not in low and low["RCE-005"] == 6
+
+  bulk_io.import_rows("items", [{"sku": "MIL-001", "name": "Milk 1L", "reorder_point": 5}])
+  assert "MIL-001" not in _check()
+  bulk_io.import_rows("inventory", [{"sku": "MIL-001", "on_hand": 2}])
+  assert _check()["MIL-001"] == 2
@@ -0,0 +1,119 @@
+from procurementAgent import db
+
+from conftest import count, on_hand
+
+def test_create_many_in_one_transaction(fresh_db):
+  before = count("SELECT COUNT(*) FROM purchase_orders")
+  result = db.create_purchase_orders([
+    {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 10}, {"sku_or_name": "sugar 1kg", "qty": "5"}]},
+    {"supplier_name": "mediterranean wholesale", "lines": [{"sku_or_name": "TUN-001", "qty": 24, "unit_price": 4.2}]},
+  ])
+  assert result["status"] == "success"
+  assert [po["line_count"] for po in result["purchase_orders"]] == [2, 1]
+  assert count("SELECT COUNT(*) FROM purchase_orders") == before + 2
+  po = db.get_purchase_order(result["purchase_orders"][0]["po_id"])
+  assert po["po"]["status"] == "PLACED"
+  assert [(ln["sku"], ln["qty"]) for ln in po["lines"]] == [("COF-001", 10), ("SUG-001", 5)]
+
+def test_unknown_item_writes_nothing(fresh_db):
+  pos, lines = count("SELECT COUNT(*) FROM purchase_orders"), count("SELECT COUNT(*) FROM purchase_order_lines")
+  result = db.create_purchase_orders([
+    {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 10}]},
+    {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "NOPE-404", "qty": 1}]},
+  ])
+  assert result == {"status": "error", "error_message": "Item 'NOPE-404' not found."}
+  assert count("SELECT COUNT(*) FROM purchase_orders") == pos
+  assert count("SELECT COUNT(*) FROM purchase_order_lines") == lines
+
+def test_unknown_supplier_writes_nothing(fresh_db):
+  pos = count("SELECT COUNT(*) FROM purchase_orders")
+  result = db.create_purchase_orders([
+    {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 10}]},
+    {"supplier_name": "Nobody Ltd", "lines": [{"sku_or_name": "COF-001", "qty": 1}]},
+  ])
+  assert result["status"] == "error" and "Nobody Ltd" in result["error_message"]
+  assert count("SELECT COUNT(*) FROM purchase_orders") == pos
+
+def test_malformed_input_is_an_error_not_an_exception(fresh_db):
+  ok = {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 1}]}
+  cases = [
+    ([ok, {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001"}]}], "Order 2 line 1: qty must be an integer."),
+    ([ok, {"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": "ten"}]}], "Order 2 line 1: qty must be an integer."),
+    ([{"lines": [{"sku_or_name": "COF-001", "qty": 1}]}], "Order 1: supplier_name is required."),
+    ([{"supplier_name": "Acme Supplies"}], "Order 1: lines must be a list."),
+    ([{"supplier_name": "Acme Supplies", "lines": [{"qty": 1}]}], "Order 1 line 1: sku_or_name is required."),
+    ([{"supplier_name": "Acme Supplies", "lines": ["COF-001"]}], "Order 1 line 1: must be an object with sku_or_name and qty."),
+    ([{"supplier_name": "Acme Supplies", "lines": [{"sku_or_name": "COF-001", "qty": 1, "unit_price": "cheap"}]}],
+     "Order 1 line 1: unit_price must be a number."),
+    ([ok, "Acme"], "Order 2: must be an object with supplier_name and lines."),
+  ]
+  pos = count("SELECT COUNT(*) FROM purchase_orders")
+  for orders, message in cases:
+    assert db.create_purchase_orders(orders) == {"status": "error", "error_message": message}
+  assert count("SELECT COUNT(*) FROM purchase_orders") == pos
+
+def _place_order() -> int:
+  result = db.create_purchase_orders([{"supplier_name": "Acme Supplies", "lines": [
+    {"sku_or_name": "COF-001", "qty": 10}, {"sku_or_name": "SUG-001", "qty": 20},
+  ]}])
+  return result["purchase_orders"][0]["po_id"]
+
+def _received_qty(po_id: int, sku: str) -> int:
+  return count("""
+    SELECT pol.received_qty FROM purchase_order_lines pol JOIN items i ON i.id = pol.item_id
+    WHERE pol.po_id = ? AND i.sku = ?
+  """, po_id, sku)
+
+def _moves(po_id: int) -> int:
+  return count("SELECT COALESCE(SUM(qty), 0) FROM stock_moves WHERE ref = ? AND type = 'RECEIVE'", f"PO:{po_id}")
+
+def test_partial_receipt(fresh_db):
+  po_id = _place_order()
+  coffee = on_hand("COF-001")
+  result = db.receive_purchase_orders([{"po_id": po_id, "lines": [{"sku_or_name": "coffee beans 1kg", "qty": 4}]}])
+  assert result["status"] == "success"
+  (received,) = result["received"]
+  assert received["status"] == "PARTIAL"
+  assert {ln["sku"]: (ln["received_now"], ln["outstanding_qty"]) for ln in received["lines"]} == {"COF-001": (4, 6), "SUG-001": (0, 20)}
+  assert _received_qty(po_id, "COF-001") == 4
+  assert on_hand("COF-001") == coffee + 4
+  assert _moves(po_id) == 4
+  assert db.get_purchase_order(po_id)["po"]["status"] == "PLACED"  # still open
+
+def test_over_receipt_writes_nothing(fresh_db):
+  po_id = _place_order()
+  db.receive_purchase_orders([{"po_id": po_id, "lines": [{"sku_or_name": "COF-001", "qty": 4}]}])
+  coffee, sugar = on_hand("COF-001"), on_hand("SUG-001")
+  result = db.receive_purchase_orders([{"po_id": po_id, "lines": [
+    {"sku_or_name": "SUG-001", "qty": 5}, {"sku_or_name": "COF-001", "qty": 7},
+  ]}])
+  assert result["status"] == "error" and "excess 1" in result["error_message"]
+  assert (_received_qty(po_id, "COF-001"), _received_qty(po_id, "SUG-001")) == (4, 0)
+  assert (on_hand("COF-001"), on_hand("SUG-001")) == (coffee, sugar)
+  assert _moves(po_id) == 4
+
+def test_receive_rest_then_again(fresh_db):
+  po_id = _place_order()
+  db.receive_purchase_orders([{"po_id": po_id, "lines": [{"sku_or_name": "COF-001", "qty": 4}]}])
+  coffee = on_hand("COF-001")
+  result = db.receive_purchase_orders([{"po_id": po_id}])
+  assert result["received"][0]["status"] == "RECEIVED" and result["already_received"] == []
+  assert on_hand("COF-001") == coffee + 6
+  assert db.get_purchase_order(po_id)["po"]["status"] == "RECEIVED"
+
+  again = db.receive_purchase_orders([{"po_id": po_id}])
+  assert again == {"status": "success", "received": [], "already_received": [po_id]}
+  assert on_hand("COF-001") == coffee + 6
+  assert _moves(po_id) == 30
+
+def test_malformed_receipts_are_errors(fresh_db):
+  po_id = _place_order()
+  cases = [
+    ([{}], "Receipt 1: po_id must be an integer."),
+    ([{"po_id": "twelve"}], "Receipt 1: po_id must be an integer."),
+    ([{"po_id": po_id, "lines": [{"sku_or_name": "COF-001"}]}], "Receipt 1 line 1: qty must be an integer."),
+    ([{"po_id": po_id}, {"po_id": po_id, "lines": {"COF-001": 1}}], "Receipt 2: lines must be a list."),
+  ]
+  for receipts, message in cases:
+    assert db.receive_purchase_orders(receipts) == {"status": "error", "error_message": message}
+  assert _moves(po_id) == 0
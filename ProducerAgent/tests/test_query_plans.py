@@ -0,0 +1,116 @@
+"""
+EXPLAIN QUERY PLAN checks for the indexed lookup paths (items by SKU/name,
+suppliers by name, PO headers by status, PO lines). Each test traces the SQL a
+real call runs on a temp DB and fails on any full scan of the core tables.
+"""
+import re
+from typing import Callable, List
+
+import pytest
+
+from procurementAgent import db
+
+# Core tables and the aliases db.py gives them in joins.
+CORE_TABLES = {
+  "items": "items", "i": "items",
+  "suppliers": "suppliers", "s": "suppliers",
+  "purchase_orders": "purchase_orders", "po": "purchase_orders",
+  "purchase_order_lines": "purchase_order_lines", "pol": "purchase_order_lines",
+}
+
+SUPPLIERS, ITEMS, POS, LINES_PER_PO = 50, 2_000, 2_000, 3
+# Mostly open orders, as in a live system: the case where IN (...) scans.
+STATUSES = ("DRAFT", "PLACED", "PLACED", "RECEIVED", "RECEIVED", "CANCELLED")
+
+@pytest.fixture(scope="module")
+def sample_db(tmp_path_factory):
+  old_path = db.DB_PATH
+  db.DB_PATH = tmp_path_factory.mktemp("plans") / "plans.db"
+  db.reset_connections()
+  db.init_db_if_needed()
+  now = "2025-01-01T00:00:00Z"
+  with db.get_conn() as conn:
+    base_s = conn.execute("SELECT COALESCE(MAX(id), 0) FROM suppliers").fetchone()[0]
+    base_i = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+    base_po = conn.execute("SELECT COALESCE(MAX(id), 0) FROM purchase_orders").fetchone()[0]
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO suppliers (id, name) VALUES (?, ?)",
+                     [(base_s + n, f"Plan Supplier {n}") for n in range(1, SUPPLIERS + 1)])
+    conn.executemany("INSERT INTO items (id, sku, name, preferred_supplier_id) VALUES (?, ?, ?, ?)",
+                     [(base_i + n, f"PLN-{n:05d}", f"Plan item {n}", base_s + 1 + n % SUPPLIERS) for n in range(1, ITEMS + 1)])
+    conn.executemany("INSERT INTO inventory (item_id, on_hand, reserved, updated_at) VALUES (?, ?, 0, ?)",
+                     [(base_i + n, n % 40, now) for n in range(1, ITEMS + 1)])
+    conn.executemany("INSERT INTO purchase_orders (id, supplier_id, status, created_at) VALUES (?, ?, ?, ?)",
+                     [(base_po + n, base_s + 1 + n % SUPPLIERS, STATUSES[n % len(STATUSES)], now) for n in range(1, POS + 1)])
+    conn.executemany("INSERT INTO purchase_order_lines (po_id, item_id, qty, unit_price) VALUES (?, ?, ?, 1.0)",
+                     [(base_po + n, base_i + 1 + (n * 7 + k) % ITEMS, 5) for n in range(1, POS + 1) for k in range(LINES_PER_PO)])
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")  # on this thread's connection, which _plans explains with
+  yield db.DB_PATH
+  db.DB_PATH = old_path
+
+def _plans(call: Callable[[], object]) -> List[List[str]]:
+  """Run `call` and return the query plan of every SELECT it issued on this thread."""
+  statements: List[str] = []
+  with db.get_conn() as conn:
+    conn.set_trace_callback(statements.append)
+    try:
+      call()
+    finally:
+      conn.set_trace_callback(None)
+    selects = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+    return [[row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)] for sql in selects]
+
+def _core_scans(plans: List[List[str]]) -> List[str]:
+  """Core tables that some plan step reads in full (SCAN, with or without an index)."""
+  scans = []
+  for steps in plans:
+    for step in steps:
+      m = re.match(r"SCAN (\w+)", step)
+      if m and m.group(1) in CORE_TABLES:
+        scans.append(CORE_TABLES[m.group(1)])
+  return scans
+
+def test_item_by_sku_or_name(sample_db):
+  db.get_item_by_name_or_sku("PLN-00007")  # warm up any per-process cache
+  for key in ("pln-00007", "PLAN ITEM 7"):
+    found = []
+    plans = _plans(lambda: found.append(db.get_item_by_name_or_sku(key)))
+    assert found[0] is not None and found[0]["sku"] == "PLN-00007"
+    assert _core_scans(plans) == []
+
+def test_supplier_by_name(sample_db):
+  with db.get_conn() as conn:
+    steps = [row[3] for row in conn.execute(
+      "EXPLAIN QUERY PLAN SELECT id FROM suppliers WHERE name = ? COLLATE NOCASE", ("PLAN SUPPLIER 3",))]
+  assert _core_scans([steps]) == []
+  assert any("idx_suppliers_name_nocase" in step for step in steps)
+
+@pytest.mark.parametrize("status", ["DRAFT", "PLACED", "RECEIVED", "CANCELLED"])
+def test_po_headers_by_status(sample_db, status):
+  rows = []
+  plans = _plans(lambda: rows.extend(db.list_purchase_orders(status=status)))
+  assert rows and {r["status"] for r in rows} == {status}
+  assert _core_scans(plans) == []
+
+def test_open_po_headers(sample_db):
+  rows = []
+  plans = _plans(lambda: rows.extend(db.list_open_purchase_orders()))
+  ids = [r["id"] for r in rows]
+  assert {r["status"] for r in rows} == {"DRAFT", "PLACED"}
+  assert ids == sorted(ids, reverse=True)
+  assert all(r["line_count"] == LINES_PER_PO for r in rows if r["supplier"].startswith("Plan"))
+  assert _core_scans(plans) == []
+
+def test_received_po_headers(sample_db):
+  plans = _plans(db.list_received_purchase_orders)
+  assert plans
+  assert _core_scans(plans) == []
+
+def test_po_lines_join(sample_db):
+  with db.get_conn() as conn:
+    po_id = conn.execute("SELECT MAX(po_id) FROM purchase_order_lines").fetchone()[0]
+  found = []
+  plans = _plans(lambda: found.append(db.get_purchase_order(po_id)))
+  assert found[0]["status"] == "success" and len(found[0]["lines"]) == LINES_PER_PO
+  assert _core_scans(plans) == []
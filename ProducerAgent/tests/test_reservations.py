@@ -0,0 +1,76 @@
+from procurementAgent import db
+
+from conftest import count
+
+def _available(sku: str) -> int:
+  return db.get_item_by_name_or_sku(sku)["available"]
+
+def _low_skus():
+  return {r["sku"] for r in db.list_low_stock()}
+
+def _consistent() -> bool:
+  return db.check_low_stock_consistency()["consistent"]
+
+def test_reserve_lowers_available_and_joins_low_stock(fresh_db):
+  # RCE-005: 12 on hand, reorder point 8, nothing on order.
+  assert _available("RCE-005") == 12 and "RCE-005" not in _low_skus()
+  result = db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 3}, {"sku_or_name": "rice 5kg", "qty": 2}], ref="SO-1")
+  assert result["status"] == "success"
+  assert [(r["sku"], r["qty"]) for r in result["reservations"]] == [("RCE-005", 5)]  # repeated items are summed
+  item = db.get_item_by_name_or_sku("RCE-005")
+  assert (item["on_hand"], item["reserved"], item["available"]) == (12, 5, 7)
+  low = {r["sku"]: r for r in db.list_low_stock()}
+  assert low["RCE-005"]["available"] == 7 and low["RCE-005"]["reserved"] == 5
+  assert _consistent()
+
+def test_short_line_reserves_nothing(fresh_db):
+  result = db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 5}, {"sku_or_name": "TUN-001", "qty": 10}])
+  assert result["status"] == "error"
+  assert result["short"] == [{"sku": "TUN-001", "requested": 10, "available": 9}]
+  assert _available("RCE-005") == 12
+  assert count("SELECT COUNT(*) FROM stock_reservations") == 0
+  assert count("SELECT SUM(reserved) FROM inventory") == 0
+
+def test_release_by_ref_and_by_id(fresh_db):
+  first = db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 5}], ref="SO-1")
+  db.reserve_stock([{"sku_or_name": "MIL-001", "qty": 4}], ref="SO-2")
+  assert db.release_reservations(ref="SO-2") == {"status": "success", "released": 1, "items": 1}
+  assert _available("MIL-001") == 18
+  ids = [r["reservation_id"] for r in first["reservations"]]
+  assert db.release_reservations(reservation_ids=ids + [999])["released"] == 1
+  assert db.release_reservations(reservation_ids=ids)["released"] == 0  # already released
+  assert _available("RCE-005") == 12 and "RCE-005" not in _low_skus()
+  assert count("SELECT COUNT(*) FROM stock_reservations WHERE status = 'RELEASED'") == 2
+  assert _consistent()
+
+def test_expired_reservations_are_returned(fresh_db):
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 5}], ref="old", ttl_minutes=30)
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 2}], ref="new", ttl_minutes=30)
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 1}], ref="forever", ttl_minutes=0)
+  with db.get_conn() as conn:
+    conn.execute("UPDATE stock_reservations SET expires_at = '2000-01-01T00:00:00Z' WHERE ref = 'old'")
+  assert db.expire_reservations()["released"] == 1
+  assert db.get_item_by_name_or_sku("RCE-005")["reserved"] == 3
+  assert count("SELECT COUNT(*) FROM stock_reservations WHERE status = 'EXPIRED'") == 1
+  assert db.expire_reservations()["released"] == 0
+  assert _consistent()
+
+def test_malformed_lines_are_errors(fresh_db):
+  cases = [
+    ([{"sku_or_name": "RCE-005"}], "Reservation line 1: qty must be an integer."),
+    ([{"sku_or_name": "RCE-005", "qty": "x"}], "Reservation line 1: qty must be an integer."),
+    ([{"qty": 1}], "Reservation line 1: sku_or_name is required."),
+  ]
+  for lines, message in cases:
+    assert db.reserve_stock(lines) == {"status": "error", "error_message": message}
+  assert db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 0}])["status"] == "error"
+  assert count("SELECT COUNT(*) FROM stock_reservations") == 0
+
+def test_inventory_import_keeps_reserved(fresh_db):
+  from procurementAgent import bulk_io
+  db.reserve_stock([{"sku_or_name": "RCE-005", "qty": 5}])
+  result = bulk_io.import_rows("inventory", [{"sku": "RCE-005", "on_hand": 30, "reserved": 0}, {"sku": "SUG-001", "on_hand": 2}])
+  assert result["written"] == 2
+  item = db.get_item_by_name_or_sku("RCE-005")
+  assert (item["on_hand"], item["reserved"], item["available"]) == (30, 5, 25)
+  assert _consistent()
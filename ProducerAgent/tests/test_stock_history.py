@@ -0,0 +1,47 @@
+from procurementAgent import bulk_io, db
+
+from conftest import count
+
+def _moves(sku, days, qty, kind="RECEIVE"):
+  return [{"sku": sku, "qty": qty, "type": kind, "created_at": f"2026-01-{d:02d}T10:00:00Z"} for d in days]
+
+def _checkpoints():
+  with db.get_conn() as conn:
+    return conn.execute("SELECT item_id, at, qty FROM stock_snapshots ORDER BY item_id, at").fetchall()
+
+def _ledger(sku, before):
+  return count("""
+    SELECT COALESCE(SUM(CASE WHEN m.type = 'ISSUE' THEN -ABS(m.qty) ELSE m.qty END), 0)
+    FROM stock_moves m JOIN items i ON i.id = m.item_id WHERE i.sku = ? AND m.created_at < ?
+  """, sku, before)
+
+def test_backdated_import_rebuilds_only_the_items_written(fresh_db):
+  first = bulk_io.import_rows("stock_moves", _moves("COF-001", range(10, 30, 2), 5) + _moves("TUN-001", range(10, 30, 3), 4))
+  assert first["written"] == 17
+  horizon = db.snapshot_stock()["horizon"]
+  assert horizon is not None
+  tuna = db.get_item_by_name_or_sku("TUN-001")["id"]
+  tuna_before = [tuple(r) for r in _checkpoints() if r["item_id"] == tuna]
+
+  backdated = bulk_io.import_rows("stock_moves", _moves("COF-001", [11, 15], 2, "ISSUE") + _moves("COF-001", [12], 7))
+  assert backdated["written"] == 3
+  assert db.snapshot_stock()["horizon"] == horizon
+  # Untouched items keep their checkpoints; the rest match a from-scratch rebuild.
+  assert [tuple(r) for r in _checkpoints() if r["item_id"] == tuna] == tuna_before
+  scoped = [tuple(r) for r in _checkpoints()]
+  db.rebuild_stock_snapshots()
+  assert scoped == [tuple(r) for r in _checkpoints()]
+  for day, end in (("2026-01-11", "2026-01-12"), ("2026-01-14", "2026-01-15"), ("2026-01-31", "2026-02-01")):
+    result = db.stock_at("COF-001", day)
+    assert result["on_hand"] - result["on_hand_now"] == _ledger("COF-001", end) - _ledger("COF-001", "9999")
+
+def test_import_that_writes_nothing_leaves_checkpoints_alone(fresh_db, monkeypatch):
+  bulk_io.import_rows("stock_moves", _moves("COF-001", range(10, 20), 5))
+  before = [tuple(r) for r in _checkpoints()]
+  assert before
+  calls = []
+  monkeypatch.setattr(db, "snapshot_stock", lambda: calls.append(1))
+  result = bulk_io.import_rows("stock_moves", _moves("NOPE-404", [12], 1))
+  assert result["written"] == 0 and result["skipped_count"] == 1
+  assert calls == []
+  assert [tuple(r) for r in _checkpoints()] == before